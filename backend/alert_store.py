@@ -0,0 +1,178 @@
+import os
+import queue
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from can_ids.metrics import registry
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DB_PATH = Path(os.environ.get("IDS_EVENT_DB", BASE_DIR / "ids_events.db"))
+
+BATCH_SIZE = 500 # Max events per insert transaction
+FLUSH_INTERVAL = 0.25 # Seconds a partial batch may wait
+MAX_QUEUE = 100000 # Events buffered before add() starts dropping
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    type TEXT,
+    source TEXT,
+    volume INTEGER,
+    details TEXT,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_source_ts ON events (source, ts);
+"""
+
+COLUMNS = ("id", "ts", "kind", "type", "source", "volume", "details", "raw")
+
+class AlertStore:
+    """
+    Append-only alert/event store on SQLite in WAL mode.
+
+    add() only enqueues, so the ingest thread never waits on disk. A writer
+    thread drains the queue and inserts in batched transactions; queries open
+    their own read connections, which WAL lets run alongside the writer.
+    The database file is only created once the store is started or queried.
+    """
+
+    def __init__(self, path=DB_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self.running = False
+        self.written = 0
+        self.dropped = 0
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        if self._ready:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        self._ready = True
+
+    def start(self):
+        if self.running:
+            return
+        self._init_db()
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the writer after flushing everything already queued."""
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join(timeout=5)
+
+    def add(self, event: Dict, kind: str = "alert"):
+        """Queues an event for writing. Never blocks; drops (and counts) when full."""
+        row = (event.get("ts"), kind, event.get("type"), event.get("source"),
+               _to_int(event.get("volume")), event.get("details"), event.get("raw"))
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _writer(self):
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL") # Safe with WAL, far fewer fsyncs
+        try:
+            while self.running or not self.queue.empty():
+                try:
+                    batch = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO events (ts, kind, type, source, volume, details, raw) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            batch
+                        )
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    print(f"Alert store write error: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(start, end, type, source, kind):
+        clauses, params = [], []
+        for column, op, value in (("ts", ">=", start), ("ts", "<=", end), ("type", "=", type),
+                                  ("source", "=", source), ("kind", "=", kind)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None, type: Optional[str] = None,
+              source: Optional[str] = None, kind: Optional[str] = None, before_id: Optional[int] = None,
+              limit: int = 100) -> Dict:
+        """
+        Newest-first page of events. Pass the returned next_before_id back as
+        before_id to fetch the next page (keyset pagination, no OFFSET scans).
+        """
+        where, params = self._where(start, end, type, source, kind)
+        if before_id is not None:
+            where += (" AND " if where else " WHERE ") + "id < ?"
+            params.append(before_id)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM events{where} ORDER BY id DESC LIMIT ?"
+        self._init_db()
+        conn = self._connect()
+        try:
+            rows = [dict(r) for r in conn.execute(sql, params + [limit + 1])]
+        finally:
+            conn.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "events": rows,
+            "next_before_id": rows[-1]["id"] if has_more else None
+        }
+
+    def counts(self, start: Optional[float] = None, end: Optional[float] = None, bucket: float = 60.0,
+               type: Optional[str] = None, source: Optional[str] = None, kind: Optional[str] = None) -> List[Dict]:
+        """Event counts per time bucket (bucket start in epoch seconds) and type."""
+        where, params = self._where(start, end, type, source, kind)
+        sql = (f"SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, type, COUNT(*) AS count "
+               f"FROM events{where} GROUP BY bucket, type ORDER BY bucket")
+        self._init_db()
+        conn = self._connect()
+        try:
+            return [dict(r) for r in conn.execute(sql, [bucket, bucket] + params)]
+        finally:
+            conn.close()
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+alert_store = AlertStore()
+registry.gauge("alert_store_queue_depth", "Events waiting for the SQLite writer", fn=lambda: alert_store.queue.qsize())
+registry.counter("alert_store_dropped_total", "Events dropped because the write queue was full", fn=lambda: alert_store.dropped)
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import List, Optional, Set, Tuple
+from backend.process_manager import process_manager
+from backend.can_listener import can_listener
+from can_ids.metrics import registry
+
+TICK_INTERVAL = 0.1 # 10Hz update rate
+CLIENT_QUEUE_SIZE = 4 # Frames buffered per client before we start dropping
+HISTORY_SIZE = 100 # Deltas kept for resume (~10s at full tick rate)
+MAX_LOGS = 50 # Log lines the dashboard shows
+MAX_ALERTS = 10 # Alerts the dashboard shows
+
+TICK_SECONDS = registry.histogram("ws_tick_seconds", "Time to build and fan out one dashboard tick")
+FRAME_BYTES = registry.histogram("ws_frame_bytes", "Serialized size of delta/snapshot frames",
+                                 buckets=(256, 1024, 4096, 16384, 65536, 262144))
+
+class DashboardBroadcaster:
+    """
+    Single producer for the dashboard stream.
+
+    Each tick the broadcaster diffs the dashboard state against the previous
+    tick and, if anything changed, serializes one delta frame carrying only the
+    new log lines, new alerts and changed fields. Every frame has a sequence
+    number; the same string is handed to every subscriber's bounded queue.
+    Clients start from a snapshot, and a client that fell behind (dropped frames
+    or reconnected with ?cursor=N) is caught up from the recent delta history,
+    or with a fresh snapshot if its cursor is too old.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DashboardBroadcaster, cls).__new__(cls)
+            cls._instance.subscribers: Set[asyncio.Queue] = set()
+            cls._instance.task: Optional[asyncio.Task] = None
+            cls._instance.frames_sent = 0
+            cls._instance.frames_dropped = 0
+            cls._instance._reset_stream()
+            hub = cls._instance
+            registry.counter("ws_frames_sent_total", "Frames fanned out to WebSocket clients", fn=lambda: hub.frames_sent)
+            registry.counter("ws_frames_dropped_total", "Frames dropped from full client queues", fn=lambda: hub.frames_dropped)
+            registry.gauge("ws_clients", "Connected dashboard clients", fn=lambda: len(hub.subscribers))
+            registry.gauge("ws_client_queue_depth_max", "Deepest client queue",
+                           fn=lambda: max((q.qsize() for q in list(hub.subscribers)), default=0))
+        return cls._instance
+
+    def _reset_stream(self):
+        # Start from the wall clock so cursors from a previous server run never match
+        self.seq = int(time.time() * 1000)
+        self.history = deque(maxlen=HISTORY_SIZE) # (seq, serialized delta)
+        self._logs = deque(maxlen=MAX_LOGS)
+        self._alerts = deque(maxlen=MAX_ALERTS)
+        self._view = {"can": {}, "vehicle_state": "Unknown", "status": {}, "dos_active": False, "ids": None}
+        self._log_seq = 0
+        self._alert_seq = 0
+        self._epoch = process_manager.log_epoch
+        self._snapshot = None # (seq, serialized snapshot), built lazily
+        self._ids_state = None # Latest structured verdict from the embedded IDS
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, data: str, seq: Optional[int] = None):
+        """Fans one serialized frame out to every subscriber without blocking."""
+        for queue in self.subscribers:
+            if queue.full():
+                # Slow client: drop its oldest frame, it will be caught up from history
+                queue.get_nowait()
+                self.frames_dropped += 1
+            queue.put_nowait((seq, data))
+        self.frames_sent += 1
+
+    async def broadcast(self, message: dict):
+        # Out-of-band messages carry no sequence number and don't affect cursors
+        self.publish(json.dumps(message))
+
+    def set_ids_state(self, state: Optional[dict]):
+        """Latest IDS verdict; call from the event loop (use call_soon_threadsafe from threads)."""
+        self._ids_state = state
+
+    def _current_view(self) -> dict:
+        is_dos_active = process_manager.is_dos_active()
+        return {
+            "can": dict(can_listener.latest_data) if not is_dos_active else {"RPM": 0, "Speed": 0, "Gear": 0}, # Block data if DoS
+            "vehicle_state": process_manager.get_vehicle_state() if not is_dos_active else "Connection Lost",
+            "status": process_manager.get_status(),
+            "dos_active": is_dos_active, # Flag for Frontend
+            "ids": self._ids_state
+        }
+
+    def snapshot(self) -> str:
+        """Full dashboard state at the current sequence number (cached per seq)."""
+        if self._snapshot is None or self._snapshot[0] != self.seq:
+            payload = {"type": "snapshot", "seq": self.seq}
+            payload.update(self._view)
+            payload["alerts"] = list(self._alerts)
+            payload["logs"] = list(self._logs)
+            self._snapshot = (self.seq, json.dumps(payload))
+        return self._snapshot[1]
+
+    def catch_up(self, cursor: Optional[int]) -> Tuple[List[str], int]:
+        """
+        Frames a client at `cursor` needs to reach the current seq: the missed
+        deltas if they are still in history, otherwise one snapshot.
+        Returns (frames, new_cursor).
+        """
+        if cursor is not None and cursor == self.seq:
+            return [], self.seq
+        if cursor is not None and self.history and self.history[0][0] <= cursor + 1 <= self.seq:
+            return [data for seq, data in self.history if seq > cursor], self.seq
+        return [self.snapshot()], self.seq
+
+    def build_delta(self) -> Optional[dict]:
+        """Diffs the dashboard state against the last tick. None if nothing changed."""
+        delta = {}
+        view = self._current_view()
+
+        changed_can = {k: v for k, v in view["can"].items() if self._view["can"].get(k) != v}
+        if changed_can:
+            delta["can"] = changed_can
+        for key in ("vehicle_state", "status", "dos_active", "ids"):
+            if view[key] != self._view[key]:
+                delta[key] = view[key]
+        self._view = view
+
+        # The tail mirrors what the client holds, so snapshots match the delta cursor
+        logs, self._log_seq = process_manager.get_logs_since(self._log_seq)
+        if logs:
+            delta["logs"] = logs[-MAX_LOGS:]
+            self._logs.extend(delta["logs"])
+        alerts, self._alert_seq = process_manager.get_alerts_since(self._alert_seq)
+        if alerts:
+            delta["alerts"] = alerts[-MAX_ALERTS:]
+            self._alerts.extend(delta["alerts"])
+        return delta or None
+
+    def tick(self):
+        if process_manager.log_epoch != self._epoch:
+            # Logs were cleared: deltas can't express removals, so everyone resyncs
+            self._epoch = process_manager.log_epoch
+            self._logs.clear()
+            self._alerts.clear()
+            self.build_delta()
+            self.seq += 1
+            self.history.clear()
+            data = self.snapshot()
+            FRAME_BYTES.observe(len(data))
+            self.publish(data, self.seq)
+            return
+
+        delta = self.build_delta()
+        if delta is None:
+            return
+        self.seq += 1
+        delta["type"] = "delta"
+        delta["seq"] = self.seq
+        data = json.dumps(delta)
+        FRAME_BYTES.observe(len(data))
+        self.history.append((self.seq, data))
+        self.publish(data, self.seq)
+
+    async def _run(self):
+        next_tick = time.monotonic()
+        while True:
+            try:
+                t0 = time.perf_counter()
+                self.tick()
+                TICK_SECONDS.observe(time.perf_counter() - t0)
+            except Exception as e:
+                print(f"Broadcaster error: {e}")
+
+            next_tick += TICK_INTERVAL
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # We fell behind (e.g. a GC pause); skip missed ticks instead of bursting
+                next_tick = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
+
+broadcaster = DashboardBroadcaster()
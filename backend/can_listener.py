@@ -1,103 +1,226 @@
 import can
-import threading
-import time
 import asyncio
-import json
-from typing import List, Callable
+import time
+import numpy as np
+from collections import deque
+from types import MappingProxyType
+from typing import Optional
+from backend.timeseries import SignalHistory
+from can_ids.bus_mux import open_bus
+from can_ids.metrics import registry
+
+TICK_INTERVAL = 0.1 # Matches the dashboard broadcaster
+MAX_PENDING = 50000 # Frames buffered between drains before the oldest are dropped
+
+# IDs the dashboard displays (based on run_simulation_v2.py)
+RPM_ID = 0x123
+GEAR_ID = 0x310
+BRAKE_ID = 0x240
+DASHBOARD_IDS = frozenset((RPM_ID, GEAR_ID, BRAKE_ID))
+HISTORY_SIGNALS = ("RPM", "Gear", "Speed", "Brake")
+
+DRAIN_SECONDS = registry.histogram("can_listener_drain_seconds", "Time to drain and decode one batch")
+DRAIN_BATCH = registry.histogram("can_listener_drain_batch_frames", "Frames per drained batch",
+                                 buckets=(1, 10, 100, 1000, 10000, 50000))
 
 class CANListener:
+    """
+    Asyncio-native CAN listener.
+
+    python-can's Notifier thread only appends frames to a bounded deque. An
+    asyncio task drains that deque in one batch per tick, decodes just the
+    newest frame of each ID the dashboard shows, and publishes an immutable
+    snapshot. Nothing is decoded per frame, so a flood costs one deque append
+    per frame instead of a full decode. Dashboard signals are also recorded at
+    full rate into fixed-size NumPy history rings, decoded per batch.
+    """
     _instance = None
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(CANListener, cls).__new__(cls)
             cls._instance.running = False
-            cls._instance.thread = None
-            cls._instance.subscribers: List[Callable] = []
-            cls._instance.latest_data = {
+            cls._instance.bus = None
+            cls._instance.notifier = None
+            cls._instance.task: Optional[asyncio.Task] = None
+            cls._instance._pending = deque(maxlen=MAX_PENDING)
+            cls._instance._values = {
                 "RPM": 0,
                 "Gear": 0,
                 "Speed": 0, # Derived or direct
                 "Throttle": 0,
                 "Brake": 0
             }
+            cls._instance.snapshot = MappingProxyType(dict(cls._instance._values))
+            # Appended and queried from the event loop only, so no lock is needed
+            cls._instance.history = SignalHistory(HISTORY_SIGNALS)
+            cls._instance.frames_received = 0
+            cls._instance.frames_drained = 0
+            cls._instance.fps = 0.0
+            # Read at scrape time, so the per-frame hook stays a bare append
+            registry.counter("can_frames_received_total", "Frames received from the bus", fn=lambda: cls._instance.frames_received)
+            registry.counter("can_frames_dropped_total", "Frames dropped before decoding", fn=lambda: cls._instance.frames_dropped)
+            registry.gauge("can_listener_pending_frames", "Frames waiting to be drained", fn=lambda: len(cls._instance._pending))
+            registry.gauge("can_listener_fps", "Received frames per second", fn=lambda: cls._instance.fps)
         return cls._instance
 
+    @property
+    def latest_data(self):
+        """Read-only view of the latest decoded values (replaced, never mutated)."""
+        return self.snapshot
+
+    @property
+    def frames_dropped(self) -> int:
+        return self.frames_received - self.frames_drained - len(self._pending)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "fps": round(self.fps, 1),
+            "received": self.frames_received,
+            "dropped": self.frames_dropped,
+            "pending": len(self._pending)
+        }
+
     def start(self, interface="vcan0"):
         if self.running:
             return
+        print(f"Starting CAN listener on {interface}")
+        try:
+            # Shares the CAN mux capture when one is running, else opens its own socket
+            self.bus = open_bus(interface, name="backend")
+        except Exception as e:
+            print(f"Failed to connect to CAN bus: {e}")
+            return
+
         self.running = True
-        self.thread = threading.Thread(target=self._listen, args=(interface,), daemon=True)
-        self.thread.start()
+        # No loop argument: the Notifier reads in its own thread, we batch into asyncio
+        self.notifier = can.Notifier(self.bus, [self._on_frame], timeout=0.1)
+        self.task = asyncio.get_running_loop().create_task(self._drain_loop())
 
-    def stop(self):
+    async def stop(self):
+        if not self.running:
+            return
         self.running = False
-        if self.thread:
-            self.thread.join(timeout=1)
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.notifier.stop()
+        self.bus.shutdown()
+        print("CAN listener stopped")
 
-    def subscribe(self, callback: Callable):
-        self.subscribers.append(callback)
+    def add_consumer(self, callback):
+        """
+        Registers an extra per-frame callback on the shared Notifier, so other
+        in-process consumers (the embedded IDS) reuse this socket. Callbacks run
+        in the Notifier thread and must be cheap.
+        """
+        if self.notifier is None:
+            raise RuntimeError("CAN listener is not running")
+        self.notifier.add_listener(callback)
 
-    def unsubscribe(self, callback: Callable):
-        if callback in self.subscribers:
-            self.subscribers.remove(callback)
+    def remove_consumer(self, callback):
+        if self.notifier is not None:
+            try:
+                self.notifier.remove_listener(callback)
+            except ValueError:
+                pass
 
-    async def broadcast(self, message: dict):
-        # Notify all subscribers (WebSocket handlers)
-        # We need to run this in the event loop of the subscribers
-        for callback in self.subscribers:
-            await callback(message)
+    def _on_frame(self, msg: can.Message):
+        # Runs in the Notifier thread: keep it to an append
+        self._pending.append(msg)
+        self.frames_received += 1
 
-    def _listen(self, interface):
-        print(f"Starting CAN listener on {interface}")
+    def _drain(self):
+        """Takes every pending frame and decodes only the newest of each dashboard ID."""
+        pending = self._pending
+        batch = [pending.popleft() for _ in range(len(pending))]
+        self.frames_drained += len(batch)
+        if not batch:
+            return batch
+
+        latest = {}
+        for msg in reversed(batch):
+            can_id = msg.arbitration_id
+            if can_id in DASHBOARD_IDS and can_id not in latest:
+                latest[can_id] = msg
+                if len(latest) == len(DASHBOARD_IDS):
+                    break
+
+        values = self._values
+        prev_gear = values["Gear"]
         try:
-            bus = can.ThreadSafeBus(channel=interface, interface='socketcan')
-        except Exception as e:
-            print(f"Failed to connect to CAN bus: {e}")
-            self.running = False
-            return
+            if GEAR_ID in latest:
+                values["Gear"] = int(latest[GEAR_ID].data[0])
+            if BRAKE_ID in latest:
+                values["Brake"] = 1 if latest[BRAKE_ID].data[0] == 1 else 0
+            if RPM_ID in latest:
+                raw = int.from_bytes(latest[RPM_ID].data, byteorder='big')
+                values["RPM"] = int(raw * 0.25)
+                # Rough speed estimation based on RPM and Gear (just for visuals)
+                gear = values["Gear"] or 1 # Avoid div by zero logic if neutral
+                values["Speed"] = int(values["RPM"] * gear * 0.005)
+        except IndexError:
+            pass # Malformed (empty) payload
+
+        if latest:
+            self.snapshot = MappingProxyType(dict(values))
+            self._record_history(batch, prev_gear)
+        return batch
 
+    def _record_history(self, batch, prev_gear: int):
+        """Appends every dashboard frame in the batch to the signal history."""
+        rpm_frames, gear_frames, brake_frames = [], [], []
+        for msg in batch:
+            can_id = msg.arbitration_id
+            if can_id == RPM_ID:
+                rpm_frames.append((msg.timestamp, int.from_bytes(msg.data, byteorder='big')))
+            elif can_id == GEAR_ID and msg.data:
+                gear_frames.append((msg.timestamp, msg.data[0]))
+            elif can_id == BRAKE_ID and msg.data:
+                brake_frames.append((msg.timestamp, 1 if msg.data[0] == 1 else 0))
+
+        gear_ts = np.array([f[0] for f in gear_frames], dtype=np.float64)
+        gears = np.array([f[1] for f in gear_frames], dtype=np.float32)
+        if gear_frames:
+            self.history.append("Gear", gear_ts, gears)
+        if brake_frames:
+            brake = np.array(brake_frames, dtype=np.float64)
+            self.history.append("Brake", brake[:, 0], brake[:, 1])
+        if rpm_frames:
+            rpm = np.array(rpm_frames, dtype=np.float64)
+            rpm_ts, rpm_vals = rpm[:, 0], np.floor(rpm[:, 1] * 0.25)
+            # Gear in effect at each RPM frame: last gear frame at or before it
+            idx = np.searchsorted(gear_ts, rpm_ts, side='right') - 1
+            if len(gears):
+                gear_at = np.where(idx >= 0, gears[np.maximum(idx, 0)], prev_gear)
+            else:
+                gear_at = np.full(len(rpm_ts), prev_gear, dtype=np.float32)
+            gear_at = np.maximum(gear_at, 1) # Avoid div by zero logic if neutral
+            self.history.append("RPM", rpm_ts, rpm_vals)
+            self.history.append("Speed", rpm_ts, np.floor(rpm_vals * gear_at * 0.005))
+
+    async def _drain_loop(self):
+        last_rate_time = time.monotonic()
+        last_rate_count = self.frames_received
         while self.running:
             try:
-                msg = bus.recv(timeout=0.1)
-                if not msg:
-                    continue
-
-                # Parse known messages (based on run_simulation_v2.py)
-                updated = False
-                
-                # RPM (0x123)
-                if msg.arbitration_id == 0x123:
-                    raw = int.from_bytes(msg.data, byteorder='big')
-                    self.latest_data["RPM"] = int(raw * 0.25)
-                    # Rough speed estimation based on RPM and Gear (just for visuals)
-                    # Assuming some ratios
-                    gear = self.latest_data.get("Gear", 1)
-                    if gear == 0: gear = 1 # Avoid div by zero logic if neutral
-                    self.latest_data["Speed"] = int(self.latest_data["RPM"] * gear * 0.005) 
-                    updated = True
-                
-                # Gear (0x310)
-                elif msg.arbitration_id == 0x310:
-                    self.latest_data["Gear"] = int(msg.data[0])
-                    updated = True
-                
-                # Brake (0x240)
-                elif msg.arbitration_id == 0x240:
-                    self.latest_data["Brake"] = 1 if msg.data[0] == 1 else 0
-                    updated = True
-
-                # Notify subscribers if data changed (or periodically)
-                # For high freq CAN, maybe throttle this?
-                # For now, let's just update latest_data and have a separate broadcaster or broadcast on change
-                # To avoid flooding WS, let's just update state here.
-                # The WebSocket endpoint can poll this state or we can broadcast throttled.
-                
+                t0 = time.perf_counter()
+                batch = self._drain()
+                DRAIN_SECONDS.observe(time.perf_counter() - t0)
+                DRAIN_BATCH.observe(len(batch))
             except Exception as e:
                 print(f"Error in CAN listener: {e}")
-                time.sleep(1)
 
-        bus.shutdown()
-        print("CAN listener stopped")
+            now = time.monotonic()
+            if now - last_rate_time >= 1.0:
+                self.fps = (self.frames_received - last_rate_count) / (now - last_rate_time)
+                last_rate_count = self.frames_received
+                last_rate_time = now
+            await asyncio.sleep(TICK_INTERVAL)
 
 can_listener = CANListener()
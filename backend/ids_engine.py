@@ -0,0 +1,201 @@
+import asyncio
+import threading
+import time
+import warnings
+from collections import deque
+from typing import Optional
+from backend.can_listener import can_listener
+from backend.process_manager import process_manager
+from backend.broadcaster import broadcaster
+from can_ids.detection.features import WINDOW_SIZE
+from can_ids.detection.detector import IDSDetector, MODEL_DIR
+from can_ids.detection.verdict_ipc import VerdictSubscriber
+
+MAX_BACKLOG = 5.0 # Seconds of closed windows the worker will still catch up on
+
+class IDSEngine:
+    """
+    Runs the IDS detector inside the backend process.
+
+    Frames come straight from CANListener's Notifier (the same socket the
+    dashboard reads), windows are cut by frame timestamp in a worker thread,
+    and every verdict goes to the broadcaster as a structured "ids" object.
+    Alerts are recorded directly with ProcessManager; nothing is printed and
+    re-parsed.
+
+    When the IDS runs as a separate process instead, attach() subscribes to
+    its binary verdict socket and feeds those verdicts through the same path.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IDSEngine, cls).__new__(cls)
+            cls._instance.running = False
+            cls._instance.thread = None
+            cls._instance.detector: Optional[IDSDetector] = None
+            cls._instance._model_dir = None
+            cls._instance.loop = None
+            cls._instance._frames = deque()
+            cls._instance._stop = threading.Event()
+            cls._instance.windows_scored = 0
+            cls._instance.subscriber_thread = None
+            cls._instance._detach = threading.Event()
+            cls._instance.last_error = None
+            process_manager.register_service("IDS", lambda: cls._instance.running)
+        return cls._instance
+
+    def start(self, model_dir=MODEL_DIR):
+        if self.running:
+            return False, "IDS already running" if not self._stop.is_set() else "IDS is still stopping"
+        if not can_listener.running:
+            return False, "CAN listener is not connected"
+        self.loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._frames.clear()
+        self.running = True
+        self.last_error = None
+        # deque.append is thread-safe and the cheapest possible per-frame hook
+        can_listener.add_consumer(self._frames.append)
+        self.thread = threading.Thread(target=self._run, args=(model_dir,), daemon=True)
+        self.thread.start()
+        return True, "Started successfully"
+
+    def stop(self):
+        if not self.running:
+            return False, "IDS not running"
+        self._stop.set()
+        can_listener.remove_consumer(self._frames.append)
+        broadcaster.set_ids_state(None)
+        if self.thread:
+            self.thread.join(timeout=2)
+            if self.thread.is_alive():
+                # Still inside IDSDetector.load(): the worker exits (and clears running) once it returns,
+                # and start() refuses until then, so two workers never share the frames and detector
+                return True, "Stopping once the models have loaded"
+        self.running = False
+        return True, "Stopped successfully"
+
+    def attach(self, socket_path: str):
+        """Consumes verdicts published by an external main_live_ids.py --publish."""
+        self.detach()
+        self.loop = asyncio.get_running_loop()
+        self._detach.clear()
+        self.subscriber_thread = threading.Thread(target=self._subscribe, args=(socket_path,), daemon=True)
+        self.subscriber_thread.start()
+
+    def detach(self):
+        if self.subscriber_thread is None:
+            return
+        self._detach.set()
+        self.subscriber_thread.join(timeout=2)
+        self.subscriber_thread = None
+        broadcaster.set_ids_state(None)
+
+    def _subscribe(self, socket_path: str):
+        subscriber = None
+        # The process needs a few seconds to load its models before the socket exists
+        while subscriber is None and not self._detach.is_set():
+            try:
+                subscriber = VerdictSubscriber(socket_path, connect_timeout=0.5)
+            except OSError:
+                pass
+        try:
+            while subscriber is not None and not self._detach.is_set():
+                try:
+                    verdict = subscriber.recv(timeout=0.5)
+                    if verdict is not None:
+                        self._publish(verdict)
+                except (EOFError, OSError):
+                    raise
+                except Exception as e:
+                    # One bad record (or a bug handling it) must not end the subscription
+                    self.last_error = str(e)
+                    self._log(f"❌ Verdict Error: {e}")
+        except (EOFError, OSError):
+            pass
+        finally:
+            if subscriber is not None:
+                subscriber.close()
+
+    def _log(self, line: str):
+        process_manager.add_log(f"[IDS] {line}")
+
+    def _run(self, model_dir):
+        try:
+            self._detect(model_dir)
+        finally:
+            self.running = False
+
+    def _detect(self, model_dir):
+        self._log("🛡️  RESEARCH-GRADE IDS: DETECTION & DIAGNOSIS ACTIVE (embedded)...")
+        try:
+            if self.detector is None or self._model_dir != model_dir:
+                # Model loading is slow (TensorFlow); keep it off the event loop
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    self.detector = IDSDetector.load(model_dir)
+                self._model_dir = model_dir
+            else:
+                # Restart: the models are still loaded, only the streak starts over
+                self.detector.anomaly_streak = 0
+        except Exception as e:
+            self.last_error = str(e)
+            self._log(f"❌ Setup Error: {e}")
+            can_listener.remove_consumer(self._frames.append)
+            return
+        self._log(f"✅ Loaded AI Models. Autoencoder Threshold: {self.detector.ae_threshold:.5f}")
+
+        # Frames buffered while the models were loading belong to no window
+        self._frames.clear()
+        carry = []
+        window_end = time.time() + WINDOW_SIZE
+        while not self._stop.wait(max(0.0, window_end - time.time())):
+            frames = carry
+            for _ in range(len(self._frames)):
+                frames.append(self._frames.popleft())
+
+            # Normally one window has closed; after a stall (GC, a flood) several have,
+            # and they are cut by frame timestamp and scored in one batched call
+            now = time.time()
+            if now - window_end > MAX_BACKLOG:
+                # Too far behind to be worth scoring: drop the backlog and realign
+                frames = [m for m in frames if m.timestamp > now - WINDOW_SIZE]
+                window_end = now
+            windows, start = [], 0
+            while window_end <= now:
+                end = start
+                while end < len(frames) and frames[end].timestamp <= window_end:
+                    end += 1
+                if end > start:
+                    windows.append((frames[start:end], window_end))
+                start = end
+                window_end += WINDOW_SIZE
+            carry = frames[start:]
+
+            if windows:
+                try:
+                    for verdict in self.detector.process_windows(windows):
+                        if verdict is not None:
+                            self.windows_scored += 1
+                            self._publish(verdict)
+                except Exception as e:
+                    self.last_error = str(e)
+                    self._log(f"❌ Scoring Error: {e}")
+
+    def _publish(self, verdict):
+        if verdict is None:
+            return
+        state = verdict.to_dict()
+        state["status"] = "ALERT" if verdict.alert else ("CHECKING" if verdict.streak > 0 else "NORMAL")
+        self.loop.call_soon_threadsafe(broadcaster.set_ids_state, state)
+        if verdict.alert:
+            process_manager.record_alert({
+                "ts": verdict.window_end,
+                "type": verdict.attack,
+                "volume": str(verdict.msg_count),
+                "details": verdict.debug_str,
+                "source": "IDS"
+            })
+
+ids_engine = IDSEngine()
@@ -1,49 +1,67 @@
 import re
+import time
 from typing import List, Dict, Optional
 
+# Regex to match the alert format in main_live_ids.py
+# Web Mode: print(f"🚨 ALERT: {attack_name} | Vol: {count} | {debug_str}")
+ALERT_PATTERN = re.compile(r"🚨 ALERT:\s*(.*?)\s*\|\s*Vol:\s*(\d+)\s*\|(.*)")
+
 class LogParser:
+    @staticmethod
+    def parse_alert(line: str, ts: Optional[float] = None) -> Optional[Dict]:
+        """Parses a single log line into an alert record, or None if it isn't one."""
+        if "🚨 ALERT" not in line:
+            return None
+
+        # Remove [IDS] prefix if present
+        source = None
+        clean_line = line
+        if line.startswith("[") and "]" in line:
+            source, clean_line = line[1:].split("]", 1)
+
+        match = ALERT_PATTERN.search(clean_line)
+        if not match:
+            return None
+
+        ts = time.time() if ts is None else ts
+        return {
+            "timestamp": time.strftime("%H:%M:%S", time.localtime(ts)),
+            "ts": ts,
+            "type": match.group(1).strip(),
+            "volume": match.group(2).strip(),
+            "details": match.group(3).strip(),
+            "source": source,
+            "raw": line
+        }
+
+    @staticmethod
+    def parse_state(line: str) -> Optional[str]:
+        # Web Mode: print(f"STATE:{state_name}|RPM:{dashboard_view['RPM']}|GEAR:{gear_str}|RATE:{rate}")
+        if "STATE:" not in line:
+            return None
+        # Extract STATE:Cruising
+        for part in line.split("|"):
+            if "STATE:" in part:
+                value = part.split("STATE:", 1)[1].strip()
+                return value or None
+        return None
+
     @staticmethod
     def parse_alerts(logs: List[str]) -> List[Dict]:
         alerts = []
-        # Regex to match the alert format in main_live_ids.py
-        # Web Mode: print(f"🚨 ALERT: {attack_name} | Vol: {count} | {debug_str}")
-        
-        pattern = re.compile(r"🚨 ALERT:\s*(.*?)\s*\|\s*Vol:\s*(\d+)\s*\|(.*)")
-        
         for line in logs:
-            if "🚨 ALERT" in line:
-                # Remove [IDS] prefix if present
-                clean_line = line.split("]", 1)[1] if "]" in line else line
-                
-                match = pattern.search(clean_line)
-                if match:
-                    attack_type = match.group(1).strip()
-                    volume = match.group(2).strip()
-                    debug_info = match.group(3).strip()
-                    
-                    alerts.append({
-                        "timestamp": "Now", 
-                        "type": attack_type,
-                        "volume": volume,
-                        "details": debug_info,
-                        "raw": line
-                    })
+            alert = LogParser.parse_alert(line)
+            if alert:
+                alerts.append(alert)
         return alerts
 
     @staticmethod
     def parse_vehicle_state(logs: List[str]) -> str:
-        # Web Mode: print(f"STATE:{state_name}|RPM:{dashboard_view['RPM']}|GEAR:{gear_str}|RATE:{rate}")
         # We look for the LATEST state log
         for line in reversed(logs):
-            if "STATE:" in line:
-                try:
-                    # Extract STATE:Cruising
-                    parts = line.split("|")
-                    for part in parts:
-                        if "STATE:" in part:
-                            return part.split(":")[1].strip()
-                except:
-                    pass
+            state = LogParser.parse_state(line)
+            if state:
+                return state
         return "Unknown"
 
     @staticmethod
@@ -0,0 +1,287 @@
+import bisect
+import gzip
+import os
+import queue
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from backend.ring_buffer import SequencedRing
+from can_ids.metrics import registry
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+LOG_DIR = Path(os.environ.get("IDS_LOG_DIR", BASE_DIR / "logs"))
+
+TAIL_SIZE = 1000 # Lines kept in memory for the live view
+BLOCK_LINES = 1024 # Lines per compressed block (the unit of random access)
+FLUSH_INTERVAL = 1.0 # Seconds a partial block may wait before being written
+SEGMENT_BYTES = 8 << 20 # Rotate to a new segment file after this many compressed bytes
+MAX_SEGMENTS = 32 # Oldest segments are deleted beyond this
+MAX_QUEUE = 200000 # Lines buffered for the writer before append() starts dropping
+
+class Block:
+    """Index entry for one gzip member inside a segment file."""
+    __slots__ = ("first_seq", "last_seq", "t_start", "t_end", "path", "offset", "length")
+
+    def __init__(self, first_seq, last_seq, t_start, t_end, path, offset, length):
+        self.first_seq, self.last_seq = first_seq, last_seq
+        self.t_start, self.t_end = t_start, t_end
+        self.path, self.offset, self.length = path, offset, length
+
+    def to_line(self) -> str:
+        return f"{self.first_seq} {self.last_seq} {self.t_start:.6f} {self.t_end:.6f} {self.offset} {self.length}\n"
+
+    @classmethod
+    def from_line(cls, line: str, path: str) -> "Block":
+        first_seq, last_seq, t_start, t_end, offset, length = line.split()
+        return cls(int(first_seq), int(last_seq), float(t_start), float(t_end), path, int(offset), int(length))
+
+    def read(self) -> List[Tuple[int, float, str]]:
+        """Decompresses just this block: one seek, one read, one member."""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = zlib.decompress(f.read(self.length), wbits=31)
+        records = []
+        for raw in data.decode("utf-8").splitlines():
+            seq, ts, line = raw.split("\t", 2)
+            records.append((int(seq), float(ts), line))
+        return records
+
+class LogStore:
+    """
+    Process log storage: an O(1) in-memory ring for the live tail, plus
+    rotating segment files on disk.
+
+    Each segment is a concatenation of gzip members of up to BLOCK_LINES lines
+    (still a valid .gz file for zcat). A sidecar .idx file records every
+    block's sequence range, time range and byte offset, so "lines N..M" or a
+    time-range search only decompresses the blocks it touches.
+
+    append() never touches the disk: lines are queued for a writer thread, so
+    callers can hold their own locks while appending. The directory is only
+    created (and the index read back) by start().
+    """
+
+    def __init__(self, directory=LOG_DIR, tail_size=TAIL_SIZE, block_lines=BLOCK_LINES,
+                 segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS, flush_interval=FLUSH_INTERVAL):
+        self.directory = Path(directory)
+        self.block_lines = block_lines
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+
+        self.tail = SequencedRing(tail_size) # (ts, line)
+        self.lock = threading.Lock() # Guards the tail ring
+        self.index_lock = threading.Lock() # Guards the block index, never held during I/O
+        self.blocks: List[Block] = []
+        self.block_starts: List[int] = [] # first_seq of each block, for bisect
+        self.queue = queue.Queue(maxsize=MAX_QUEUE)
+        self.dropped = 0
+        self.thread = None
+        self.running = False
+        self._segment = None # (path, index path, bytes written)
+        self._loaded = False
+
+    # === Live tail ===
+
+    def append(self, line: str, ts: Optional[float] = None) -> int:
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            seq = self.tail.append((ts, line))
+        try:
+            self.queue.put_nowait((seq, ts, line))
+        except queue.Full:
+            self.dropped += 1
+        return seq
+
+    @property
+    def last_seq(self) -> int:
+        return self.tail.last_seq
+
+    def __len__(self):
+        return len(self.tail)
+
+    def latest(self, n: Optional[int] = None) -> List[str]:
+        with self.lock:
+            return [line for _, line in self.tail.latest(n)]
+
+    def since(self, seq: int) -> Tuple[List[str], bool]:
+        with self.lock:
+            items, complete = self.tail.since(seq)
+        return [line for _, line in items], complete
+
+    def clear(self):
+        """Clears the live tail only; history on disk is kept."""
+        with self.lock:
+            self.tail.clear()
+
+    # === Disk ===
+
+    def _load_index(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for idx_path in sorted(self.directory.glob("segment_*.idx")):
+            seg_path = str(idx_path.with_suffix(".log.gz"))
+            if not os.path.exists(seg_path):
+                continue
+            with open(idx_path) as f:
+                for line in f:
+                    try:
+                        self.blocks.append(Block.from_line(line, seg_path))
+                    except ValueError:
+                        pass # Torn write at the end of the index
+        self.blocks.sort(key=lambda b: b.first_seq)
+        self.block_starts = [b.first_seq for b in self.blocks]
+        if self.blocks and not len(self.tail):
+            # Keep numbering after a restart so stored ranges stay unambiguous (lines appended
+            # before start() already carry their numbers, so those are left as they are)
+            self.tail.last_seq = max(self.tail.last_seq, self.blocks[-1].last_seq)
+
+    def start(self):
+        if self.running:
+            return
+        self._load_index()
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the writer after flushing everything already queued."""
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join(timeout=5)
+
+    def _writer(self):
+        pending = []
+        deadline = None
+        while self.running or not self.queue.empty():
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                pending.append(self.queue.get(timeout=timeout))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+            if pending and (len(pending) >= self.block_lines or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending, deadline = [], None
+        if pending:
+            self._flush(pending)
+
+    def _flush(self, records):
+        try:
+            payload = "".join(f"{seq}\t{ts:.6f}\t{line}\n" for seq, ts, line in records)
+            member = gzip.compress(payload.encode("utf-8"), compresslevel=6)
+
+            if self._segment is None or self._segment[2] >= self.segment_bytes:
+                self._rotate(records[0][0])
+            seg_path, idx_path, offset = self._segment
+
+            with open(seg_path, "ab") as f:
+                f.write(member)
+            block = Block(records[0][0], records[-1][0], records[0][1], records[-1][1],
+                          seg_path, offset, len(member))
+            with open(idx_path, "a") as f:
+                f.write(block.to_line())
+            self._segment = (seg_path, idx_path, offset + len(member))
+
+            with self.index_lock:
+                self.blocks.append(block)
+                self.block_starts.append(block.first_seq)
+        except OSError as e:
+            print(f"Log store write error: {e}")
+
+    def _rotate(self, first_seq: int):
+        name = f"segment_{first_seq:012d}"
+        self._segment = (str(self.directory / f"{name}.log.gz"), str(self.directory / f"{name}.idx"), 0)
+
+        segments = sorted(self.directory.glob("segment_*.log.gz"))
+        expired = segments[:max(0, len(segments) + 1 - self.max_segments)]
+        if expired:
+            expired_paths = {str(p) for p in expired}
+            with self.index_lock:
+                self.blocks = [b for b in self.blocks if b.path not in expired_paths]
+                self.block_starts = [b.first_seq for b in self.blocks]
+            for path in expired:
+                for victim in (path, path.with_name(path.name.replace(".log.gz", ".idx"))):
+                    try:
+                        os.remove(victim)
+                    except OSError:
+                        pass
+
+    def _blocks_snapshot(self) -> Tuple[List[Block], List[int]]:
+        with self.index_lock:
+            return list(self.blocks), list(self.block_starts)
+
+    def read_range(self, start_seq: int, end_seq: int, limit: int = 5000) -> List[Dict]:
+        """Lines with start_seq <= seq <= end_seq (at most `limit`), oldest first."""
+        end_seq = min(end_seq, start_seq + limit - 1)
+        records = []
+        blocks, starts = self._blocks_snapshot()
+        i = max(0, bisect.bisect_right(starts, start_seq) - 1)
+        while i < len(blocks) and blocks[i].first_seq <= end_seq:
+            if blocks[i].last_seq >= start_seq:
+                records.extend(r for r in blocks[i].read() if start_seq <= r[0] <= end_seq)
+            i += 1
+
+        # Whatever isn't on disk yet comes from the tail
+        on_disk = records[-1][0] if records else start_seq - 1
+        with self.lock:
+            tail_items, _ = self.tail.since(max(on_disk, start_seq - 1))
+            tail_first = self.tail.last_seq - len(tail_items) + 1
+        for offset, (ts, line) in enumerate(tail_items):
+            seq = tail_first + offset
+            if seq > end_seq:
+                break
+            records.append((seq, ts, line))
+        return [{"seq": s, "ts": t, "line": l} for s, t, l in records]
+
+    def search(self, text: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+               source: Optional[str] = None, limit: int = 500) -> List[Dict]:
+        """Newest-first lines matching a substring, source process and/or time range."""
+        prefix = f"[{source}]" if source else None
+
+        def match(ts, line):
+            return ((since is None or ts >= since) and (until is None or ts <= until)
+                    and (prefix is None or line.startswith(prefix))
+                    and (text is None or text in line))
+
+        results = []
+        with self.lock:
+            tail_items = self.tail.latest()
+            tail_first = self.tail.first_seq
+        newest_on_disk = 0
+        blocks, _ = self._blocks_snapshot()
+        if blocks:
+            newest_on_disk = blocks[-1].last_seq
+
+        # Unflushed lines first (newest), then blocks newest to oldest
+        for offset in range(len(tail_items) - 1, -1, -1):
+            seq = tail_first + offset
+            if seq <= newest_on_disk:
+                break
+            ts, line = tail_items[offset]
+            if match(ts, line):
+                results.append({"seq": seq, "ts": ts, "line": line})
+                if len(results) >= limit:
+                    return results
+
+        for block in reversed(blocks):
+            if since is not None and block.t_end < since:
+                break
+            if until is not None and block.t_start > until:
+                continue
+            for seq, ts, line in reversed(block.read()):
+                if match(ts, line):
+                    results.append({"seq": seq, "ts": ts, "line": line})
+                    if len(results) >= limit:
+                        return results
+        return results
+
+log_store = LogStore()
+registry.gauge("log_store_queue_depth", "Log lines waiting for the segment writer", fn=lambda: log_store.queue.qsize())
+registry.counter("log_store_dropped_total", "Log lines not persisted because the write queue was full", fn=lambda: log_store.dropped)
@@ -1,11 +1,14 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import asyncio
-import json
-from backend.routers import control
+from fastapi.responses import PlainTextResponse
+from backend.routers import control, history, alerts
 from backend.process_manager import process_manager
 from backend.can_listener import can_listener
-from backend.log_parser import log_parser
+from backend.broadcaster import broadcaster
+from backend.alert_store import alert_store
+from backend.log_store import log_store
+from backend.ids_engine import ids_engine
+from can_ids.metrics import registry, CONTENT_TYPE
 
 app = FastAPI(title="CAN IDS Dashboard API")
 
@@ -20,54 +23,72 @@ app.add_middleware(
 
 # Include Routers
 app.include_router(control.router, prefix="/api")
+app.include_router(history.router, prefix="/api")
+app.include_router(alerts.router, prefix="/api")
+
+# Prometheus scrape endpoint (text exposition format)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
 
 # Start CAN Listener on startup
 @app.on_event("startup")
 async def startup_event():
+    alert_store.start()
+    log_store.start()
     can_listener.start()
+    broadcaster.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    can_listener.stop()
+    if ids_engine.running:
+        ids_engine.stop()
+    ids_engine.detach()
+    await broadcaster.stop()
+    await can_listener.stop()
     # Stop all processes
     process_manager.stop_process("Simulator")
     process_manager.stop_process("IDS")
     process_manager.stop_process("Attacker")
+    process_manager.stop_process("ModelServer")
+    alert_store.stop()
+    log_store.stop()
 
 # WebSocket for Dashboard Data (CAN + Alerts)
+# Protocol: the first frame is a snapshot (or the missed deltas when the client
+# reconnects with ?cursor=<last seq>), followed by deltas with consecutive seqs.
 @app.websocket("/ws/dashboard")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     try:
-        while True:
-            # 1. Get CAN Data
-            can_data = can_listener.latest_data
-            
-            # 2. Get Logs & Parse Alerts
-            logs = process_manager.get_logs()
-            alerts = log_parser.parse_alerts(logs)
-            vehicle_state = log_parser.parse_vehicle_state(logs)
-            
-            # 3. Get System Status
-            status = process_manager.get_status()
-            
-            # 4. Check for DoS Attack
-            is_dos_active = log_parser.check_dos_status(logs)
+        cursor = int(websocket.query_params["cursor"])
+    except (KeyError, ValueError):
+        cursor = None
 
-            # Send combined update
-            payload = {
-                "can": can_data if not is_dos_active else {"RPM": 0, "Speed": 0, "Gear": 0}, # Block data if DoS
-                "vehicle_state": vehicle_state if not is_dos_active else "Connection Lost",
-                "alerts": alerts[-10:], # Send last 10 alerts
-                "status": status,
-                "logs": logs[-50:], # Send last 50 logs for live view
-                "dos_active": is_dos_active # Flag for Frontend
-            }
-            
-            await websocket.send_json(payload)
-            await asyncio.sleep(0.1) # 10Hz update rate
+    queue = broadcaster.subscribe()
+    try:
+        frames, cursor = broadcaster.catch_up(cursor)
+        for data in frames:
+            await websocket.send_text(data)
+
+        while True:
+            # Frames are built and serialized once by the broadcaster
+            seq, data = await queue.get()
+            if seq is not None:
+                if seq <= cursor:
+                    continue
+                if seq != cursor + 1:
+                    # We dropped frames while this client was slow
+                    frames, cursor = broadcaster.catch_up(cursor)
+                    for frame in frames:
+                        await websocket.send_text(frame)
+                    continue
+                cursor = seq
+            await websocket.send_text(data)
             
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"WebSocket error: {e}")
+    finally:
+        broadcaster.unsubscribe(queue)
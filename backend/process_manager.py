@@ -5,7 +5,12 @@ import os
 import signal
 import sys
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
+from backend.log_parser import log_parser
+from backend.alert_store import alert_store
+from backend.log_store import log_store
+from backend.ring_buffer import SequencedRing
+from can_ids.metrics import registry
 
 # Define paths to scripts based on exploration
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,6 +18,14 @@ SIM_SCRIPT = BASE_DIR / "run_simulation_v2.py"
 IDS_SCRIPT = BASE_DIR / "main_live_ids.py"
 ATTACK_DIR = BASE_DIR / "can_ids" / "attacks"
 
+MAX_ALERTS = 500
+DOS_WINDOW = 20 # Lines of history a FLOODING report stays valid for
+ECHO_LOGS = bool(os.environ.get("IDS_ECHO_LOGS")) # Mirror process output to the backend console
+
+LOG_LINES = registry.counter("backend_log_lines_total", "Log lines ingested")
+ALERTS = registry.counter("backend_alerts_total", "Alerts recorded, by attack type", ("type",))
+INGEST_SECONDS = registry.histogram("backend_ingest_seconds", "Time to parse and store one log line")
+
 class ProcessManager:
     _instance = None
     
@@ -20,22 +33,84 @@ class ProcessManager:
         if cls._instance is None:
             cls._instance = super(ProcessManager, cls).__new__(cls)
             cls._instance.processes = {}
-            cls._instance.logs = []
+            cls._instance.services = {} # In-process components reported alongside processes
             cls._instance.lock = threading.Lock()
+            cls._instance._reset_state()
+            registry.gauge("backend_component_running", "1 while a process or service is running", ("name",),
+                           fn=lambda: {name: int(up) for name, up in cls._instance.get_status().items()})
         return cls._instance
 
+    def _reset_state(self):
+        # Everything below is derived from log lines once, at ingest time
+        self.logs = log_store # Live tail in memory, history on disk
+        self.alerts = SequencedRing(MAX_ALERTS)
+        self.vehicle_state = "Unknown"
+        self.log_epoch = 0 # Bumped on clear so stream readers know to resync
+        self._last_flood_seq = 0
+        self._last_normal_seq = 0
+
+    def _ingest(self, log_entry: str):
+        """Parses a log line into typed events and appends everything under the lock."""
+        t0 = time.perf_counter()
+        alert = log_parser.parse_alert(log_entry)
+        state = log_parser.parse_state(log_entry)
+        is_flood = "FLOODING" in log_entry
+        is_normal = not is_flood and "NORMAL" in log_entry
+
+        with self.lock:
+            seq = self.logs.append(log_entry)
+            if alert:
+                alert["seq"] = seq
+                self.alerts.append(alert)
+            if state:
+                self.vehicle_state = state
+            if is_flood:
+                self._last_flood_seq = seq
+            elif is_normal:
+                self._last_normal_seq = seq
+
+        if alert:
+            # Persisted by the store's writer thread; add() only enqueues
+            alert_store.add(alert)
+            ALERTS.labels(alert["type"]).inc()
+        LOG_LINES.inc()
+        INGEST_SECONDS.observe(time.perf_counter() - t0)
+
+    def add_log(self, log_entry: str):
+        """Appends a line from an in-process component; it goes through the same ingest."""
+        self._ingest(log_entry)
+
+    def record_alert(self, alert: Dict):
+        """
+        Records an already-structured alert (e.g. from the embedded IDS) without
+        a print/regex round trip. A readable line is still added to the log.
+        """
+        ts = alert.get("ts") or time.time()
+        alert = dict(alert, ts=ts, timestamp=time.strftime("%H:%M:%S", time.localtime(ts)))
+        log_entry = f"[{alert.get('source', 'IDS')}] 🚨 ALERT: {alert['type']} | Vol: {alert.get('volume')} | {alert.get('details', '')}"
+        alert["raw"] = log_entry
+        with self.lock:
+            seq = self.logs.append(log_entry)
+            alert["seq"] = seq
+            self.alerts.append(alert)
+            if "FLOODING" in alert["type"]:
+                self._last_flood_seq = seq
+        alert_store.add(alert)
+        ALERTS.labels(alert["type"]).inc()
+        LOG_LINES.inc()
+
+    def register_service(self, name: str, is_running):
+        self.services[name] = is_running
+
     def _log_reader(self, name: str, process: subprocess.Popen):
         """Reads stdout from a process and appends to logs."""
         for line in iter(process.stdout.readline, b''):
             decoded_line = line.decode('utf-8', errors='replace').strip()
             if decoded_line:
-                with self.lock:
-                    log_entry = f"[{name}] {decoded_line}"
-                    self.logs.append(log_entry)
-                    # Keep log size manageable
-                    if len(self.logs) > 1000:
-                        self.logs.pop(0)
-                print(log_entry) # Also print to backend console
+                log_entry = f"[{name}] {decoded_line}"
+                self._ingest(log_entry)
+                if ECHO_LOGS:
+                    print(log_entry) # Also print to backend console
 
     def start_process(self, name: str, command: list):
         with self.lock:
@@ -92,14 +167,48 @@ class ProcessManager:
             status = {}
             for name, process in self.processes.items():
                 status[name] = process.poll() is None
-            return status
+        for name, is_running in self.services.items():
+            status[name] = status.get(name, False) or bool(is_running())
+        return status
+
+    def get_logs(self, n: Optional[int] = None) -> List[str]:
+        with self.lock:
+            return self.logs.latest(n)
+
+    def get_alerts(self, n: Optional[int] = None) -> List[Dict]:
+        with self.lock:
+            return self.alerts.latest(n)
+
+    def get_logs_since(self, seq: int) -> Tuple[List[str], int]:
+        """Returns (lines newer than seq, latest seq)."""
+        with self.lock:
+            lines, _ = self.logs.since(seq)
+            return lines, self.logs.last_seq
+
+    def get_alerts_since(self, seq: int) -> Tuple[List[Dict], int]:
+        with self.lock:
+            alerts, _ = self.alerts.since(seq)
+            return alerts, self.alerts.last_seq
+
+    def get_vehicle_state(self) -> str:
+        return self.vehicle_state
 
-    def get_logs(self):
+    def is_dos_active(self) -> bool:
+        """
+        A FLOODING attack is active if one of the last DOS_WINDOW log lines
+        reported FLOODING and no NORMAL line has been seen since.
+        """
         with self.lock:
-            return list(self.logs)
+            flood_seq = self._last_flood_seq
+            return (flood_seq > self._last_normal_seq
+                    and self.logs.last_seq - flood_seq < DOS_WINDOW)
 
     def clear_logs(self):
         with self.lock:
-            self.logs = []
+            self.logs.clear()
+            self.alerts.clear()
+            self.vehicle_state = "Unknown"
+            self.log_epoch += 1
+            self._last_flood_seq = self._last_normal_seq = 0
 
 process_manager = ProcessManager()
@@ -0,0 +1,52 @@
+from collections import deque
+from itertools import islice
+from typing import Any, List, Tuple
+
+class SequencedRing:
+    """
+    Fixed-capacity ring buffer where every appended item gets a monotonically
+    increasing sequence number. Old items fall off the front in O(1), and
+    readers can ask for "everything after seq N" without rescanning.
+    """
+
+    def __init__(self, capacity: int):
+        self._items = deque(maxlen=capacity)
+        self.last_seq = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest retained item (last_seq + 1 when empty)."""
+        return self.last_seq - len(self._items) + 1
+
+    def append(self, item: Any) -> int:
+        self.last_seq += 1
+        self._items.append(item)
+        return self.last_seq
+
+    def latest(self, n: int = None) -> List[Any]:
+        """Returns the newest n items (all retained items if n is None), oldest first."""
+        if n is None or n >= len(self._items):
+            return list(self._items)
+        if n <= 0:
+            return []
+        tail = list(islice(reversed(self._items), n))
+        tail.reverse()
+        return tail
+
+    def since(self, seq: int) -> Tuple[List[Any], bool]:
+        """
+        Returns (items with sequence > seq, complete). `complete` is False when
+        some of the requested items have already been evicted.
+        """
+        missing = self.last_seq - seq
+        if missing <= 0:
+            return [], True
+        complete = missing <= len(self._items)
+        return self.latest(missing), complete
+
+    def clear(self):
+        # Sequence numbers keep counting so cursors held by readers stay valid
+        self._items.clear()
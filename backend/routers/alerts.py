@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Query
+from ..alert_store import alert_store
+
+router = APIRouter()
+
+# Plain def: FastAPI runs these in its threadpool, so SQLite queries don't block the event loop
+@router.get("/alerts")
+def get_alerts(
+    start: float = Query(None, description="Start time (epoch seconds)"),
+    end: float = Query(None, description="End time (epoch seconds)"),
+    type: str = Query(None, description="Alert type, e.g. 'FLOODING / DOS'"),
+    source: str = Query(None, description="Source process, e.g. 'IDS'"),
+    before_id: int = Query(None, description="Cursor from the previous page's next_before_id"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return alert_store.query(start, end, type, source, before_id=before_id, limit=limit)
+
+@router.get("/alerts/counts")
+def get_alert_counts(
+    start: float = Query(None),
+    end: float = Query(None),
+    bucket: float = Query(60.0, gt=0, description="Bucket width in seconds"),
+    type: str = Query(None),
+    source: str = Query(None)
+):
+    return {"bucket": bucket, "counts": alert_store.counts(start, end, bucket, type, source)}
+
+@router.get("/alerts/stats")
+async def get_alert_store_stats():
+    return {
+        "written": alert_store.written,
+        "dropped": alert_store.dropped,
+        "queued": alert_store.queue.qsize()
+    }
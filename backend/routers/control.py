@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from ..process_manager import process_manager, SIM_SCRIPT, IDS_SCRIPT, ATTACK_DIR
+from ..can_listener import can_listener
+from ..log_store import log_store
+from ..ids_engine import ids_engine
+from can_ids.detection.verdict_ipc import DEFAULT_SOCKET as VERDICT_SOCKET
+from can_ids.detection.model_server import DEFAULT_SOCKET as MODEL_SOCKET
 import sys
 
 router = APIRouter()
 
 class AttackRequest(BaseModel):
-    type: str # "replay", "spoof", "flood"
+    type: str # "replay", "spoof", "flood", "stress"
 
 @router.post("/start/simulator")
 async def start_simulator():
@@ -24,16 +29,44 @@ async def stop_simulator():
     return {"status": "stopped", "message": msg}
 
 @router.post("/start/ids")
-async def start_ids():
-    cmd = [sys.executable, str(IDS_SCRIPT)]
-    success, msg = process_manager.start_process("IDS", cmd)
+async def start_ids(mode: str = Query("embedded", pattern="^(embedded|process)$")):
+    """embedded: run the detector in the backend on the shared CAN stream. process: spawn main_live_ids.py."""
+    if mode == "embedded":
+        success, msg = ids_engine.start()
+    else:
+        cmd = [sys.executable, str(IDS_SCRIPT), "--publish", VERDICT_SOCKET]
+        if process_manager.get_status().get("ModelServer"):
+            # Skip the TensorFlow import and model load: score on the warm server
+            cmd += ["--model-server", MODEL_SOCKET]
+        success, msg = process_manager.start_process("IDS", cmd)
+        if success:
+            ids_engine.attach(VERDICT_SOCKET)
     if not success:
         raise HTTPException(status_code=400, detail=msg)
-    return {"status": "started", "message": msg}
+    return {"status": "started", "mode": mode, "message": msg}
 
 @router.post("/stop/ids")
 async def stop_ids():
-    success, msg = process_manager.stop_process("IDS")
+    if ids_engine.running:
+        success, msg = ids_engine.stop()
+    else:
+        success, msg = process_manager.stop_process("IDS")
+        ids_engine.detach()
+    if not success:
+        raise HTTPException(status_code=400, detail=msg)
+    return {"status": "stopped", "message": msg}
+
+@router.post("/start/model-server")
+async def start_model_server():
+    cmd = [sys.executable, "-m", "can_ids.detection.model_server", "--socket", MODEL_SOCKET]
+    success, msg = process_manager.start_process("ModelServer", cmd)
+    if not success:
+        raise HTTPException(status_code=400, detail=msg)
+    return {"status": "started", "message": msg}
+
+@router.post("/stop/model-server")
+async def stop_model_server():
+    success, msg = process_manager.stop_process("ModelServer")
     if not success:
         raise HTTPException(status_code=400, detail=msg)
     return {"status": "stopped", "message": msg}
@@ -43,7 +76,8 @@ async def start_attack(request: AttackRequest):
     script_map = {
         "replay": "replay.py",
         "spoof": "context_spoof.py",
-        "flood": "flood.py"
+        "flood": "flood.py",
+        "stress": "stress.py"
     }
     
     script_name = script_map.get(request.type)
@@ -72,8 +106,31 @@ async def stop_attack():
 async def get_status():
     return process_manager.get_status()
 
+@router.get("/can/stats")
+async def get_can_stats():
+    return can_listener.get_stats()
+
 @router.get("/logs")
-async def get_logs():
+def get_logs(
+    start_seq: int = Query(None, description="First line number (inclusive)"),
+    end_seq: int = Query(None, description="Last line number (inclusive)"),
+    q: str = Query(None, description="Substring to search for"),
+    source: str = Query(None, description="Process name, e.g. 'IDS'"),
+    since: float = Query(None, description="Start time (epoch seconds)"),
+    until: float = Query(None, description="End time (epoch seconds)"),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    """
+    Without parameters: the live tail, as plain lines.
+    With start_seq/end_seq: lines N..M from memory and disk, oldest first.
+    With q/source/since/until: a newest-first search over stored history.
+    """
+    # Plain def: FastAPI runs this in its threadpool, so disk reads don't block the event loop
+    if start_seq is not None:
+        end_seq = start_seq + limit - 1 if end_seq is None else end_seq
+        return {"records": log_store.read_range(start_seq, end_seq, limit)}
+    if any(v is not None for v in (q, source, since, until)):
+        return {"records": log_store.search(q, since, until, source, limit)}
     return {"logs": process_manager.get_logs()}
 
 @router.post("/logs/clear")
@@ -0,0 +1,35 @@
+import time
+from fastapi import APIRouter, HTTPException, Query
+from ..can_listener import can_listener
+
+router = APIRouter()
+
+@router.get("/history/signals")
+async def list_signals():
+    signals = {}
+    for name, ring in can_listener.history.rings.items():
+        time_range = ring.time_range()
+        signals[name] = {
+            "samples": len(ring),
+            "start": time_range[0] if time_range else None,
+            "end": time_range[1] if time_range else None
+        }
+    return signals
+
+@router.get("/history/{signal}")
+async def get_history(
+    signal: str,
+    start: float = Query(None, description="Start time (epoch seconds), default end - 300"),
+    end: float = Query(None, description="End time (epoch seconds), default now"),
+    points: int = Query(500, ge=3, le=10000, description="Maximum points/buckets to return"),
+    method: str = Query("minmax", pattern="^(minmax|lttb)$")
+):
+    if signal not in can_listener.history.rings:
+        raise HTTPException(status_code=404, detail=f"Unknown signal: {signal}")
+    end = time.time() if end is None else end
+    start = end - 300 if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    data = can_listener.history.query(signal, start, end, points, method)
+    return {"signal": signal, "start": start, "end": end, "method": method, **data}
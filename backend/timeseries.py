@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+HISTORY_CAPACITY = 1 << 20 # Samples per signal (~5.8h of 50Hz RPM, 12MB)
+
+class SignalRing:
+    """
+    Fixed-size time-series ring for one decoded signal. Timestamps and values
+    live in preallocated NumPy arrays, so appending a batch is two slice copies
+    and memory never grows. Samples are assumed to arrive in time order.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.written = 0 # Total samples ever appended
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append_many(self, ts: np.ndarray, values: np.ndarray):
+        n = len(ts)
+        if n == 0:
+            return
+        if n > self.capacity:
+            ts, values = ts[-self.capacity:], values[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+
+        head = self.written % self.capacity
+        first = min(n, self.capacity - head)
+        self.ts[head:head + first] = ts[:first]
+        self.values[head:head + first] = values[:first]
+        if first < n:
+            self.ts[:n - first] = ts[first:]
+            self.values[:n - first] = values[first:]
+        self.written += n
+
+    def _segments(self):
+        """The ring as up to two chronologically ordered slices."""
+        if self.written <= self.capacity:
+            return [slice(0, self.written)]
+        head = self.written % self.capacity
+        return [slice(head, self.capacity), slice(0, head)]
+
+    def time_range(self) -> Optional[Tuple[float, float]]:
+        if not self.written:
+            return None
+        segments = self._segments()
+        return float(self.ts[segments[0]][0]), float(self.ts[segments[-1]][-1])
+
+    def query(self, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns copies of (timestamps, values) with start <= t <= end."""
+        ts_parts, value_parts = [], []
+        for seg in self._segments():
+            seg_ts = self.ts[seg]
+            lo = np.searchsorted(seg_ts, start, side='left')
+            hi = np.searchsorted(seg_ts, end, side='right')
+            if hi > lo:
+                ts_parts.append(seg_ts[lo:hi])
+                value_parts.append(self.values[seg][lo:hi])
+        if not ts_parts:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        return np.concatenate(ts_parts), np.concatenate(value_parts)
+
+def downsample_minmax(ts: np.ndarray, values: np.ndarray, points: int) -> Dict[str, list]:
+    """
+    Splits the range into `points` equal time buckets and returns each
+    non-empty bucket's center time with its min and max, so spikes survive
+    any zoom level.
+    """
+    if len(ts) <= points:
+        return {"t": ts.tolist(), "min": values.tolist(), "max": values.tolist()}
+
+    t0, t1 = ts[0], ts[-1]
+    width = (t1 - t0) / points or 1.0
+    bucket = np.minimum(((ts - t0) / width).astype(np.int64), points - 1)
+    # Samples are sorted, so each bucket is a contiguous run
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    centers = t0 + (bucket[starts] + 0.5) * width
+    return {
+        "t": centers.tolist(),
+        "min": np.minimum.reduceat(values, starts).tolist(),
+        "max": np.maximum.reduceat(values, starts).tolist()
+    }
+
+def downsample_lttb(ts: np.ndarray, values: np.ndarray, points: int) -> Dict[str, list]:
+    """Largest-Triangle-Three-Buckets: keeps the points that best preserve the visual shape."""
+    n = len(ts)
+    if n <= points or points < 3:
+        return {"t": ts.tolist(), "v": values.tolist()}
+
+    values = values.astype(np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    prev = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_t = ts[nlo:nhi].mean()
+        avg_v = values[nlo:nhi].mean()
+
+        bucket_t, bucket_v = ts[lo:hi], values[lo:hi]
+        area = np.abs((ts[prev] - avg_t) * (bucket_v - values[prev])
+                      - (ts[prev] - bucket_t) * (avg_v - values[prev]))
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return {"t": ts[selected].tolist(), "v": values[selected].tolist()}
+
+class SignalHistory:
+    """Named SignalRings for every signal the listener decodes."""
+
+    def __init__(self, signals, capacity: int = HISTORY_CAPACITY):
+        self.rings = {name: SignalRing(capacity) for name in signals}
+
+    def append(self, name: str, ts: np.ndarray, values: np.ndarray):
+        self.rings[name].append_many(ts, values)
+
+    def query(self, name: str, start: float, end: float, points: int, method: str = "minmax") -> Dict[str, list]:
+        ts, values = self.rings[name].query(start, end)
+        if method == "lttb":
+            return downsample_lttb(ts, values, points)
+        return downsample_minmax(ts, values, points)
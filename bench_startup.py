@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(ROOT)
+
+# (name, argv run from the project root); "-c import x" measures the import alone
+ENTRY_POINTS = [
+    ("main_live_ids import", ["-c", "import main_live_ids"]),
+    ("main_live_ids --help", ["main_live_ids.py", "--help"]),
+    ("backend.main import", ["-c", "import backend.main"]),
+    ("generate_thesis_plots import", ["-c", "import generate_thesis_plots"]),
+    ("train_ocsvm --help", ["can_ids/models/train_ocsvm.py", "--help"]),
+    ("train_autoencoder --help", ["can_ids/models/train_autoencoder.py", "--help"]),
+    ("model_server --help", ["-m", "can_ids.detection.model_server", "--help"]),
+]
+
+# Time to the first verdict on a synthetic window, in a fresh interpreter each time
+FIRST_VERDICT = """
+import time, sys
+t0 = time.perf_counter()
+sys.path.append({root!r})
+import can
+from can_ids.detection.detector import IDSDetector, MODEL_DIR
+from can_ids.detection.model_server import RemoteIDSDetector
+mode, arg = {mode!r}, {arg!r}
+if mode == "full":
+    detector = IDSDetector.load(arg or MODEL_DIR, prefer_bundle=False)
+elif mode == "bundle":
+    detector = IDSDetector.load_bundle(arg) if arg else IDSDetector.load_bundle()
+else:
+    detector = RemoteIDSDetector.connect(arg) if arg else RemoteIDSDetector.connect()
+t_load = time.perf_counter()
+window = [can.Message(timestamp=i * 0.002, arbitration_id=0x123 if i % 2 else 0x310,
+                      data=bytes([i % 256, 0x80, 0, 0]), is_extended_id=False) for i in range(50)]
+detector.process_window(window)
+t_end = time.perf_counter()
+print(t_load - t0, t_end - t_load)
+"""
+
+def run(argv, repeat):
+    """Median wall time (s) of `python argv...` from the project root, or None if it failed."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + argv, cwd=ROOT, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1:] or ["exit " + str(result.returncode)]
+    return statistics.median(times), None
+
+def first_verdict(mode, arg, repeat):
+    """Median (load_s, first_window_s, total_s) for one detector path, or None."""
+    loads, windows = [], []
+    for _ in range(repeat):
+        code = FIRST_VERDICT.format(root=ROOT, mode=mode, arg=arg)
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        total = time.perf_counter() - start
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1:]
+        load, window = map(float, result.stdout.split()[-2:])
+        loads.append(load)
+        windows.append(window)
+    return (statistics.median(loads), statistics.median(windows), total), None
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of every entry point and the IDS model paths")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the median is reported (default 3)")
+    parser.add_argument("--model-dir", default=None, help="Artifact directory for the full path (default IDS_MODEL_DIR)")
+    parser.add_argument("--bundle", default=None, help="Bundle for the bundle path (default <model-dir>/ids_model.bundle)")
+    parser.add_argument("--model-server", default=None, help="Socket of a running model server for the remote path")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    results = {"entry_points": {}, "first_verdict": {}}
+    print("⏱️  STARTUP BENCHMARK")
+    print(f"   {'Entry point':<32} {'Wall s':>8}")
+    for name, argv in ENTRY_POINTS:
+        seconds, error = run(argv, args.repeat)
+        results["entry_points"][name] = seconds
+        print(f"   {name:<32} {seconds:>8.3f}" if seconds is not None else f"   {name:<32} {'failed':>8}  {error[0]}")
+
+    print(f"\n   {'Detector path':<32} {'Load s':>8} {'Window ms':>10} {'Total s':>8}")
+    for mode, arg in (("full", args.model_dir), ("bundle", args.bundle), ("remote", args.model_server)):
+        timing, error = first_verdict(mode, arg, args.repeat)
+        if timing is None:
+            results["first_verdict"][mode] = None
+            print(f"   {mode:<32} {'skipped':>8}  {error[0] if error else ''}")
+            continue
+        load, window, total = timing
+        results["first_verdict"][mode] = {"load_s": load, "first_window_s": window, "total_s": total}
+        print(f"   {mode:<32} {load:>8.3f} {window * 1000:>10.2f} {total:>8.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Saved to {args.json}")
+
+if __name__ == "__main__":
+    main()
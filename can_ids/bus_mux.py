@@ -0,0 +1,497 @@
+import os
+import sys
+import time
+import select
+import socket
+import struct
+import argparse
+from collections import deque
+
+import numpy as np
+import can
+from multiprocessing import shared_memory, resource_tracker
+
+BUS_INTERFACE = 'vcan0'
+
+# Ring of fixed-size frame records, written by one daemon and read by any number of consumers
+RING_CAPACITY = 1 << 18 # 262144 records * 24 B = 6 MiB (~26 s at 10k fps)
+MAX_BATCH = 1024
+MAX_CONSUMERS = 16
+HEARTBEAT_PERIOD = 0.1
+STALE_AFTER = 1.0 # Daemon is considered gone after this long without a heartbeat
+SLOT_EXPIRY = 60.0 # Consumer slots unused this long can be reclaimed by a new name
+POLL_INTERVAL = 0.0005 # First sleep of the back-off when a consumer has no wake-up socket
+MAX_WAIT = 0.05 # Longest a waiting consumer goes without re-checking the ring (bounds a missed wake-up)
+ECHO_TIMEOUT = 1.0 # A MuxBus stops waiting for its own frame to come back through the mux after this long
+
+MAGIC = 0x584D4143 # "CAMX"
+VERSION = 3 # 2: write_reserve, 3: consumer waiting flag
+
+FLAG_EXTENDED = 0x01
+FLAG_REMOTE = 0x02
+FLAG_ERROR = 0x04
+
+FRAME_DTYPE = np.dtype([
+    ("ts", "<f8"), ("id", "<u4"), ("dlc", "u1"), ("flags", "u1"), ("pad", "<u2"), ("data", "u1", (8,))
+])
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u4"), ("version", "<u4"), ("capacity", "<u8"), ("write_seq", "<u8"),
+    ("heartbeat", "<f8"), ("pid", "<u8"), ("write_reserve", "<u8"), ("pad", "<u8", (2,))
+])
+CONSUMER_DTYPE = np.dtype([
+    ("name", "S32"), ("cursor", "<u8"), ("lost", "<u8"), ("seen", "<f8"), ("waiting", "<u8")
+])
+
+# Raw SocketCAN frame for the TX side of MuxBus
+CAN_FRAME_FMT = "=IB3x8s"
+
+# Segments created by this process (the daemon), which stay registered with the resource tracker
+_OWNED = set()
+
+def shm_name(interface):
+    return f"can_mux_{interface}"
+
+def wake_address(interface, slot):
+    """Abstract Unix socket a consumer in `slot` waits on; the mux sends it a byte after each batch."""
+    return f"\0{shm_name(interface)}.{slot}"
+
+def _ring_size(capacity):
+    return HEADER_DTYPE.itemsize + MAX_CONSUMERS * CONSUMER_DTYPE.itemsize + capacity * FRAME_DTYPE.itemsize
+
+class _RingView:
+    """numpy views over the shared segment: header, consumer table and frame records."""
+
+    def __init__(self, shm, capacity=None):
+        self.shm = shm
+        buf = shm.buf
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        if capacity is None:
+            if int(self.header["magic"]) != MAGIC or int(self.header["version"]) != VERSION:
+                raise RuntimeError(f"{shm.name} is not a v{VERSION} CAN mux ring")
+            capacity = int(self.header["capacity"])
+        self.capacity = capacity
+        offset = HEADER_DTYPE.itemsize
+        self.consumers = np.ndarray((MAX_CONSUMERS,), CONSUMER_DTYPE, buffer=buf, offset=offset)
+        offset += MAX_CONSUMERS * CONSUMER_DTYPE.itemsize
+        self.records = np.ndarray((capacity,), FRAME_DTYPE, buffer=buf, offset=offset)
+
+    def release(self):
+        # Views must be dropped before the mmap can be closed
+        self.header = self.consumers = self.records = None
+        self.shm.close()
+
+def messages_to_records(messages):
+    """Packs can.Messages into a FRAME_DTYPE array."""
+    n = len(messages)
+    out = np.zeros(n, FRAME_DTYPE)
+    out["ts"] = [m.timestamp for m in messages]
+    out["id"] = [m.arbitration_id for m in messages]
+    out["dlc"] = [m.dlc for m in messages]
+    out["flags"] = [(FLAG_EXTENDED if m.is_extended_id else 0) | (FLAG_REMOTE if m.is_remote_frame else 0) |
+                    (FLAG_ERROR if m.is_error_frame else 0) for m in messages]
+    out["data"] = np.frombuffer(b"".join(bytes(m.data[:8]).ljust(8, b"\x00") for m in messages),
+                                dtype=np.uint8).reshape(n, 8)
+    return out
+
+def echo_key(msg):
+    """What a transmitted frame looks like once it comes back from the ring."""
+    return (msg.arbitration_id, msg.is_extended_id, msg.is_remote_frame, msg.dlc,
+            bytes(msg.data[:8]).ljust(8, b"\x00")[:msg.dlc])
+
+def record_to_message(rec, channel=None):
+    ts, can_id, dlc, flags, _, data = rec
+    return can.Message(timestamp=ts, arbitration_id=can_id, is_extended_id=bool(flags & FLAG_EXTENDED),
+                       is_remote_frame=bool(flags & FLAG_REMOTE), is_error_frame=bool(flags & FLAG_ERROR),
+                       dlc=dlc, data=bytes(data[:dlc]), channel=channel)
+
+class CANMux:
+    """
+    Capture daemon: reads the interface once and writes every frame into a
+    shared-memory ring of 24-byte records. Consumers (MuxConsumer/MuxBus) read
+    the ring with their own cursors, so adding one costs no extra kernel copy
+    or socket. The ring never blocks the writer; a consumer that falls more
+    than `capacity` frames behind skips ahead and counts the frames as lost.
+    Consumers with nothing to read sleep on a wake-up socket, which gets one
+    datagram per batch only while they are waiting.
+    """
+
+    def __init__(self, interface=BUS_INTERFACE, capacity=RING_CAPACITY):
+        self.interface = interface
+        name = shm_name(interface)
+        if mux_available(interface):
+            raise RuntimeError(f"A CAN mux is already serving {interface}")
+        try:
+            # Left behind by a daemon that died
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=_ring_size(capacity))
+        _OWNED.add(name)
+        self.ring = _RingView(self.shm, capacity)
+        self.ring.consumers[:] = np.zeros(MAX_CONSUMERS, CONSUMER_DTYPE)
+        h = self.ring.header
+        h["capacity"] = capacity
+        h["write_seq"] = 0
+        h["write_reserve"] = 0
+        h["pid"] = os.getpid()
+        h["heartbeat"] = time.time()
+        h["version"] = VERSION
+        h["magic"] = MAGIC
+        self.frames_written = 0
+        self._wake = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._wake.setblocking(False)
+
+    def publish(self, messages):
+        """
+        Appends a batch of frames, then advances write_seq once for the whole
+        batch. write_reserve is advanced first (seqlock style): a reader that
+        sees it moved past a record's slot during its copy knows the copy may
+        be torn.
+        """
+        if not messages:
+            return
+        records = messages_to_records(messages)
+        cap = self.ring.capacity
+        seq = int(self.ring.header["write_seq"])
+        n = len(records)
+        if n > cap:
+            records = records[-cap:]
+            seq += n - cap
+            n = cap
+        self.ring.header["write_reserve"] = seq + n
+        start = seq % cap
+        first = min(n, cap - start)
+        self.ring.records[start:start + first] = records[:first]
+        if first < n:
+            self.ring.records[:n - first] = records[first:]
+        self.ring.header["write_seq"] = seq + n
+        self.frames_written += n
+        self._notify()
+
+    def _notify(self):
+        for slot in np.flatnonzero(self.ring.consumers["waiting"]):
+            try:
+                self._wake.sendto(b"\x01", wake_address(self.interface, int(slot)))
+            except OSError:
+                pass # Consumer gone, or a wake-up is already queued for it
+
+    def heartbeat(self):
+        self.ring.header["heartbeat"] = time.time()
+
+    def run(self, stop_event=None, report=True):
+        bus = can.Bus(channel=self.interface, interface='socketcan')
+        last_report = time.time()
+        last_written = 0
+        try:
+            while stop_event is None or not stop_event.is_set():
+                msg = bus.recv(timeout=HEARTBEAT_PERIOD)
+                batch = []
+                while msg is not None:
+                    batch.append(msg)
+                    if len(batch) >= MAX_BATCH:
+                        break
+                    msg = bus.recv(timeout=0)
+                self.publish(batch)
+                self.heartbeat()
+
+                now = time.time()
+                if report and now - last_report >= 1.0:
+                    fps = (self.frames_written - last_written) / (now - last_report)
+                    lags = ", ".join(f"{c['name']}:{c['lag']}" for c in self.consumer_stats()) or "none"
+                    print(f"\r📡 Mux {self.interface} | {fps:7.0f} fps | Consumers (lag): {lags}      ", end="", flush=True)
+                    last_report, last_written = now, self.frames_written
+        finally:
+            bus.shutdown()
+
+    def consumer_stats(self):
+        return read_consumer_stats(self.ring)
+
+    def close(self):
+        self.ring.header["heartbeat"] = 0.0
+        self._wake.close()
+        self.ring.release()
+        self.shm.unlink()
+        _OWNED.discard(self.shm.name)
+
+def read_consumer_stats(ring):
+    head = int(ring.header["write_seq"])
+    stats = []
+    for slot in ring.consumers:
+        name = bytes(slot["name"]).rstrip(b"\x00").decode(errors="replace")
+        if name:
+            stats.append({"name": name, "lag": head - int(slot["cursor"]), "lost": int(slot["lost"]),
+                          "seen": float(slot["seen"])})
+    return stats
+
+def _attach(interface):
+    name = shm_name(interface)
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _OWNED:
+        # Attaching registers the segment with this process's resource tracker,
+        # which would unlink it (out from under the daemon) when we exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return _RingView(shm)
+
+def mux_available(interface=BUS_INTERFACE):
+    """True when a live mux daemon is serving `interface`."""
+    try:
+        ring = _attach(interface)
+    except (FileNotFoundError, RuntimeError, ValueError):
+        return False
+    try:
+        return time.time() - float(ring.header["heartbeat"]) < STALE_AFTER
+    finally:
+        ring.release()
+
+class MuxConsumer:
+    """
+    A named reader on a CAN mux ring.
+
+    The cursor lives in the ring's consumer table, so the daemon can report
+    per-consumer lag, and re-attaching with the same name resumes where the
+    previous reader stopped (if those frames are still in the ring).
+    `ids` filters to a set of arbitration IDs.
+    """
+
+    def __init__(self, interface=BUS_INTERFACE, name=None, ids=None):
+        self.interface = interface
+        self.name = (name or f"pid{os.getpid()}")[:32]
+        self.ids = np.array(sorted(ids), dtype=np.uint32) if ids else None
+        self.ring = _attach(interface)
+        self.slot = self._claim_slot()
+        self.lost = 0
+        self._pending = deque()
+        self._backoff = POLL_INTERVAL
+        self._wake = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            self._wake.bind(wake_address(interface, self.slot))
+            self._wake.setblocking(False)
+        except OSError:
+            # Slot reclaimed from a reader that is still alive: fall back to polling
+            self._wake.close()
+            self._wake = None
+
+    def _claim_slot(self):
+        consumers = self.ring.consumers
+        key = self.name.encode()
+        head = int(self.ring.header["write_seq"])
+        now = time.time()
+        names = [bytes(n).rstrip(b"\x00") for n in consumers["name"]]
+        if key in names:
+            index = names.index(key)
+            cursor = int(consumers[index]["cursor"])
+            if not (head - self.ring.capacity <= cursor <= head):
+                cursor = head
+        else:
+            free = [i for i, n in enumerate(names) if not n or now - float(consumers[i]["seen"]) > SLOT_EXPIRY]
+            if not free:
+                raise RuntimeError(f"No free consumer slots on the {self.interface} mux")
+            index = free[0]
+            cursor = head
+            consumers[index]["lost"] = 0
+            consumers[index]["waiting"] = 0
+            consumers[index]["name"] = key
+        self.cursor = cursor
+        consumers[index]["cursor"] = cursor
+        consumers[index]["seen"] = now
+        return index
+
+    @property
+    def lag(self):
+        return int(self.ring.header["write_seq"]) - self.cursor
+
+    def read(self, max_records=MAX_BATCH * 4):
+        """Returns the next batch of (ID-filtered) records as a FRAME_DTYPE array, possibly empty."""
+        ring = self.ring
+        cap = ring.capacity
+        head = int(ring.header["write_seq"])
+        cursor = self.cursor
+        if head - cursor > cap:
+            self.lost += head - cap - cursor
+            cursor = head - cap
+        end = min(head, cursor + max_records)
+        n = end - cursor
+        start = cursor % cap
+        if start + n <= cap:
+            out = ring.records[start:start + n].copy()
+        else:
+            out = np.concatenate((ring.records[start:], ring.records[:start + n - cap]))
+
+        # The writer may have lapped us while we were copying. It reserves a batch before writing
+        # it, so any record it has started to overwrite is below write_reserve - cap.
+        overrun = int(ring.header["write_reserve"]) - cap - cursor
+        if overrun > 0:
+            out = out[min(overrun, n):]
+            self.lost += min(overrun, n)
+
+        self.cursor = end
+        slot = ring.consumers[self.slot]
+        slot["cursor"] = end
+        slot["lost"] = self.lost
+        slot["seen"] = time.time()
+        if self.ids is not None and len(out):
+            out = out[np.isin(out["id"], self.ids)]
+        return out
+
+    def recv(self, timeout=None):
+        """Returns the next can.Message, or None after `timeout` seconds."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self._pending:
+            batch = self.read()
+            if len(batch):
+                self._pending.extend(batch.tolist())
+                self._backoff = POLL_INTERVAL
+                break
+            wait = MAX_WAIT if deadline is None else min(MAX_WAIT, deadline - time.perf_counter())
+            if wait <= 0:
+                return None
+            self._wait(wait)
+        return record_to_message(self._pending.popleft(), self.interface)
+
+    def _wait(self, timeout):
+        """Sleeps until the mux publishes a batch or `timeout` passes."""
+        if self._wake is None:
+            time.sleep(min(timeout, self._backoff))
+            self._backoff = min(self._backoff * 2, MAX_WAIT)
+            return
+        slot = self.ring.consumers[self.slot]
+        slot["waiting"] = 1
+        # Re-check after raising the flag: a batch published just before it would send no wake-up
+        if int(self.ring.header["write_seq"]) == self.cursor:
+            select.select([self._wake], [], [], timeout)
+        slot["waiting"] = 0
+        try:
+            while self._wake.recv(64):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self, keep_slot=False):
+        if self.ring is None:
+            return
+        if not keep_slot:
+            self.ring.consumers[self.slot]["name"] = b""
+        self.ring.consumers[self.slot]["waiting"] = 0
+        if self._wake is not None:
+            self._wake.close()
+            self._wake = None
+        self.ring.release()
+        self.ring = None
+
+class MuxBus(can.BusABC):
+    """
+    python-can bus backed by the CAN mux, so existing code (bus.recv, Notifier)
+    works unchanged. Transmits go straight to the interface on a raw socket
+    that receives nothing; the mux picks them up like any other frame, and
+    recv() drops them again, as a direct SocketCAN bus (receive_own_messages
+    off) would never deliver them. Own frames are matched by content, so an
+    identical frame from another node within ECHO_TIMEOUT is dropped too.
+    """
+
+    def __init__(self, channel=BUS_INTERFACE, name=None, ids=None, can_filters=None, **kwargs):
+        self.consumer = MuxConsumer(channel, name, ids)
+        self.channel_info = f"mux:{channel} ({self.consumer.name})"
+        self._tx = None
+        self._sent = deque() # (expiry, echo_key) of transmitted frames not seen in the ring yet
+        super().__init__(channel=channel, can_filters=can_filters, **kwargs)
+
+    def _recv_internal(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            msg = self.consumer.recv(remaining)
+            if msg is None or not self._is_echo(msg):
+                return msg, False
+
+    def _is_echo(self, msg):
+        sent = self._sent
+        if not sent:
+            return False
+        now = time.monotonic()
+        while sent and sent[0][0] < now:
+            sent.popleft()
+        key = echo_key(msg)
+        for i, (_, sent_key) in enumerate(sent):
+            if sent_key == key:
+                del sent[i]
+                return True
+        return False
+
+    def send(self, msg, timeout=None):
+        if self._tx is None:
+            sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+            sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, b"")
+            sock.bind((self.consumer.interface,))
+            self._tx = sock
+        can_id = msg.arbitration_id
+        if msg.is_extended_id:
+            can_id |= socket.CAN_EFF_FLAG
+        if msg.is_remote_frame:
+            can_id |= socket.CAN_RTR_FLAG
+        data = bytes(msg.data[:8])
+        try:
+            self._tx.send(struct.pack(CAN_FRAME_FMT, can_id, msg.dlc, data.ljust(8, b"\x00")))
+        except OSError as e:
+            raise can.CanOperationError(f"Failed to transmit: {e}") from e
+        ids = self.consumer.ids
+        if ids is None or msg.arbitration_id in ids: # Filtered-out frames never come back
+            self._sent.append((time.monotonic() + ECHO_TIMEOUT, echo_key(msg)))
+
+    def shutdown(self):
+        super().shutdown()
+        self.consumer.close()
+        if self._tx is not None:
+            self._tx.close()
+
+def open_bus(interface=BUS_INTERFACE, name=None, ids=None):
+    """
+    Opens a receive bus for `interface`: a MuxBus when a mux daemon is serving
+    it, otherwise a direct SocketCAN socket (with `ids` as kernel filters).
+    Set IDS_CAN_MUX=0 to always use a direct socket.
+    """
+    if os.environ.get("IDS_CAN_MUX", "1") != "0" and mux_available(interface):
+        return MuxBus(interface, name=name, ids=ids)
+    filters = None
+    if ids:
+        filters = [{"can_id": i, "can_mask": 0x1FFFFFFF if i > 0x7FF else 0x7FF, "extended": i > 0x7FF} for i in ids]
+    return can.ThreadSafeBus(channel=interface, interface='socketcan', can_filters=filters)
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared CAN capture daemon (one socket, many consumers)")
+    parser.add_argument("--interface", default=BUS_INTERFACE)
+    parser.add_argument("--capacity", type=int, default=RING_CAPACITY, help="Ring size in frames")
+    parser.add_argument("--status", action="store_true", help="Show the consumers of a running mux and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        if not mux_available(args.interface):
+            print(f"❌ No CAN mux running on {args.interface}.")
+            sys.exit(1)
+        ring = _attach(args.interface)
+        print(f"📡 Mux {args.interface}: {int(ring.header['write_seq'])} frames written")
+        for c in read_consumer_stats(ring):
+            print(f"   {c['name']:<20} lag: {c['lag']:<8} lost: {c['lost']}")
+        ring.release()
+        return
+
+    try:
+        mux = CANMux(args.interface, args.capacity)
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print(f"📡 CAN mux capturing {args.interface} into /dev/shm/{shm_name(args.interface)} "
+          f"({args.capacity} frames). Press Ctrl+C to stop.")
+    try:
+        mux.run()
+    except KeyboardInterrupt:
+        print("\n🛑 Mux Stopped.")
+    except OSError as e:
+        print(f"❌ Error: Could not bind to {args.interface} ({e}).")
+    finally:
+        mux.close()
+
+if __name__ == "__main__":
+    main()
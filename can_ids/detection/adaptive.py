@@ -0,0 +1,290 @@
+import os
+import sys
+import argparse
+from collections import deque
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/adaptive.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.detection.lite_model import LiteScaler
+from can_ids.detection.cascade import STAGE_MODELS, STAGE_DRIFT, STAGE_BOUNDS
+from can_ids.metrics import registry
+
+# === DEFAULTS ===
+QUANTILE = 0.999 # Same percentile train_autoencoder.py sets the threshold at
+REFRESH_WINDOWS = 3000 # Benign windows per refresh (5 minutes of 100 ms windows)
+HOLDOFF_WINDOWS = 10 # Benign windows wait this long before they count; an anomaly discards them
+MAX_ANOMALOUS_SHARE = 0.5 # Periods with more attack windows than this are not learned from
+MAX_STEP = 0.5 # Per refresh: mean moves at most this many scaler std, scale and threshold a factor 1 + this
+MAX_DRIFT = 3.0 # In total: mean within this many scaler std, scale and threshold within this factor
+SMOOTHING = 0.5 # Weight of a new period's estimate against the values in use
+
+REFRESHES = registry.counter("ids_adaptive_refreshes_total", "Baseline refreshes by outcome", ("outcome",))
+THRESHOLD = registry.gauge("ids_adaptive_ae_threshold", "AE threshold in use after adaptation")
+
+class RunningMoments:
+    """Welford's per-feature mean and variance: O(features) memory however many windows are added."""
+
+    def __init__(self, dim):
+        self.count = 0
+        self.mean = np.zeros(dim)
+        self.m2 = np.zeros(dim)
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.zeros_like(self.mean)
+
+class P2Quantile:
+    """
+    Jain & Chlamtac's P-square estimate of one quantile from a stream: five
+    markers whose heights are adjusted with a piecewise-parabolic fit as
+    values arrive, so memory and time per value are constant.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.q = np.zeros(5) # Marker heights
+        self.n = np.arange(5, dtype=np.float64) # Marker positions
+        self.desired = np.array([0, 2 * p, 4 * p, 2 + 2 * p, 4])
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if self.count < 5:
+            q[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                q.sort()
+            return
+        self.count += 1
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = int(np.searchsorted(q, x, side="right")) - 1
+        n[k + 1:] += 1
+        self.desired += self.increments
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1.0 if d > 0 else -1.0
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    j = i + int(d)
+                    q[i] += d * (q[j] - q[i]) / (n[j] - n[i])
+                n[i] += d
+
+    def value(self):
+        if self.count < 5:
+            return float(np.quantile(self.q[:self.count], self.p)) if self.count else 0.0
+        return float(self.q[2])
+
+def scaler_params(scaler):
+    """(mean, scale) of a fitted StandardScaler or LiteScaler, or None (e.g. a remote model server)."""
+    if hasattr(scaler, "mean_"):
+        return np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scaler.scale_, dtype=np.float64)
+    if hasattr(scaler, "mean"):
+        return np.asarray(scaler.mean, dtype=np.float64).copy(), np.asarray(scaler.scale, dtype=np.float64).copy()
+    return None
+
+class AdaptiveBaseline:
+    """
+    Follows slow changes in benign traffic (a new ECU, different driving)
+    by refreshing the scaler and the AE threshold from live windows, instead
+    of a false-alarm storm until the next offline retrain.
+
+    Every benign window adds its raw features to running moments and its AE
+    error to a P-square estimate of the QUANTILE. Benign means what the IDS
+    itself does not treat as an attack: no alert streak and no frame-level
+    check (rule, timing, sequence, payload, physics). Isolated OCSVM/AE
+    flags are learned too; excluding them would cut the very tail the
+    threshold is estimated from and shrink it at every refresh. Every
+    REFRESH_WINDOWS such windows the threshold in use moves towards the new
+    estimate, the scaler compensates for how far the benign moments moved
+    since the first period (see _compensate()), and the estimators start
+    over (all state is O(features)). Windows the cascade passed without the
+    models count as an error of 0: they are known to sit below the
+    threshold, and leaving them out would bias the quantile towards the tail.
+
+    A refreshed set gets a derived version ("<trained>+a<n>"), so the
+    detector drops a cascade whose benign box was calibrated against the
+    trained scaler and threshold instead of letting it keep deciding windows.
+
+    Guard rails against an attacker teaching the IDS its traffic:
+      - benign windows wait HOLDOFF_WINDOWS in a fixed-size delay line, and
+        an attack window discards the line (the first windows of an attack
+        come before its streak reaches the alert threshold)
+      - a period in which more than MAX_ANOMALOUS_SHARE of the windows were
+        attack windows is dropped
+      - each refresh moves the mean at most MAX_STEP scaler std and the
+        scale and threshold at most a factor 1 + MAX_STEP, and the total
+        stays within MAX_DRIFT of the trained baseline
+    With a remote model server the scaler lives in the server, so only the
+    threshold adapts.
+    """
+
+    def __init__(self, models, quantile=QUANTILE, refresh_windows=REFRESH_WINDOWS, holdoff=HOLDOFF_WINDOWS,
+                 max_anomalous_share=MAX_ANOMALOUS_SHARE, max_step=MAX_STEP, max_drift=MAX_DRIFT,
+                 smoothing=SMOOTHING):
+        self.quantile = quantile
+        self.refresh_windows = int(refresh_windows)
+        self.holdoff = int(holdoff)
+        self.max_anomalous_share = max_anomalous_share
+        self.max_step = max_step
+        self.max_drift = max_drift
+        self.smoothing = smoothing
+        self.refreshes = self.rejected = 0
+        self.anchor(models)
+
+    def anchor(self, models):
+        """Takes `models` as the trained baseline the guard rails are measured from."""
+        self.trained_version = models.version
+        self.version = models.version # Of the set in use, to tell a reload from our own refreshes
+        self.trained = scaler_params(models.scaler)
+        self.trained_threshold = float(models.ae_threshold)
+        self.reference = None # Benign (mean, std) of the first period: the traffic the trained scaler fits
+        self._reset_period()
+        self.pending = deque(maxlen=self.holdoff + 1)
+        THRESHOLD.set(self.trained_threshold)
+
+    def _reset_period(self):
+        self.moments = RunningMoments(len(FEATURE_COLS))
+        self.errors = P2Quantile(self.quantile)
+        self.seen = self.anomalous = 0 # Windows this period, to check the anomalous share
+
+    @staticmethod
+    def is_attack(verdict):
+        return verdict.attack is not None or verdict.rule_anomaly or verdict.timing_anomaly or \
+            verdict.sequence_anomaly or verdict.payload_anomaly or verdict.physics_anomaly
+
+    def observe(self, verdict, vector, mse, stage, models):
+        """
+        Feeds one verdict with the features and AE error behind it. Returns
+        the ModelSet to swap in when a refresh happened, otherwise None.
+        """
+        if models.version != self.version: # Reloaded: new trained baseline
+            self.anchor(models)
+        self.seen += 1
+        if self.is_attack(verdict) or stage not in (STAGE_MODELS, STAGE_DRIFT, STAGE_BOUNDS):
+            self.anomalous += 1
+            self.pending.clear()
+            return None
+        self.pending.append((np.asarray(vector, dtype=np.float64), mse if stage != STAGE_BOUNDS else 0.0))
+        if len(self.pending) <= self.holdoff:
+            return None
+        x, error = self.pending.popleft()
+        self.moments.add(x)
+        self.errors.add(error)
+        if self.errors.count < self.refresh_windows:
+            return None
+        return self._refresh(models)
+
+    def _compensate(self, current, std):
+        """
+        Scaler that maps this period's benign traffic where the reference
+        period's went under the trained scaler: scale' = scale * std/std_ref,
+        mean' = mean_now - (mean_ref - mean) * std/std_ref (the trained
+        scaler while nothing has changed). The models learned their geometry
+        in the trained scaled space, so the scaler must not just re-standardize.
+        """
+        a = self.smoothing
+        factor = 1 + self.max_step
+        mean, scale = current
+        trained_mean, trained_scale = self.trained
+        ref_mean, ref_std = self.reference
+        ratio = np.divide(std, ref_std, out=np.ones_like(std), where=(ref_std > 0) & (std > 0))
+        target_mean = self.moments.mean - (ref_mean - trained_mean) * ratio
+        target_scale = trained_scale * ratio
+
+        step = self.max_step * trained_scale
+        new_mean = np.clip((1 - a) * mean + a * target_mean, mean - step, mean + step)
+        new_mean = np.clip(new_mean, trained_mean - self.max_drift * trained_scale,
+                           trained_mean + self.max_drift * trained_scale)
+        new_scale = np.clip((1 - a) * scale + a * target_scale, scale / factor, scale * factor)
+        new_scale = np.clip(new_scale, trained_scale / self.max_drift, trained_scale * self.max_drift)
+        return LiteScaler(new_mean, new_scale)
+
+    def _refresh(self, models):
+        if self.anomalous > self.max_anomalous_share * self.seen:
+            self.rejected += 1
+            REFRESHES.labels("rejected").inc()
+            self._reset_period()
+            return None
+
+        a = self.smoothing
+        threshold = models.ae_threshold
+        target = (1 - a) * threshold + a * self.errors.value()
+        factor = 1 + self.max_step
+        threshold = float(np.clip(target, threshold / factor, threshold * factor))
+        threshold = float(np.clip(threshold, self.trained_threshold / self.max_drift,
+                                  self.trained_threshold * self.max_drift))
+        update = {"ae_threshold": threshold}
+
+        current = scaler_params(models.scaler)
+        if current is not None and self.trained is not None:
+            std = self.moments.std
+            if self.reference is None:
+                self.reference = (self.moments.mean.copy(), std)
+            else:
+                update["scaler"] = self._compensate(current, std)
+
+        self.refreshes += 1
+        self.version = update["version"] = f"{self.trained_version}+a{self.refreshes}"
+        REFRESHES.labels("applied").inc()
+        THRESHOLD.set(threshold)
+        self._reset_period()
+        return models._replace(**update)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a feature matrix through the IDS with online adaptation")
+    parser.add_argument("features_csv", help="Windowed features (build_features.py output) with a label column")
+    parser.add_argument("--shift", action="append", default=[], metavar="COL=DELTA",
+                        help="Add DELTA to feature COL after the first pass (e.g. msg_count=1 unique_ids=1 "
+                             "for a new ECU), to see the baseline follow; repeatable")
+    parser.add_argument("--refresh", type=int, default=REFRESH_WINDOWS)
+    parser.add_argument("--passes", type=int, default=5, help="Shifted passes after the unshifted one")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from can_ids.detection.detector import IDSDetector, MODEL_DIR, WindowSummary
+    df = pd.read_csv(args.features_csv)
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    labels = df["label"].to_numpy() > 0
+    shifted = X.copy()
+    for shift in args.shift:
+        col, delta = shift.split("=")
+        shifted[:, FEATURE_COLS.index(col)] += float(delta)
+
+    for adaptive in (False, True):
+        detector = IDSDetector.load(MODEL_DIR, periodicity=False, transitions=False, payload=False, physics=False)
+        if adaptive:
+            detector.attach_adaptive(refresh_windows=args.refresh)
+        for row in X: # The traffic the models were trained on, then the drifted traffic
+            detector.process_summary(WindowSummary(row, 0.0))
+        passes = []
+        for _ in range(args.passes):
+            flagged = np.array([detector.process_summary(WindowSummary(row, 0.0)).is_anomaly for row in shifted])
+            passes.append(f"{flagged[~labels].mean():.2%}/{flagged[labels].mean():.1%}")
+        name = "adaptive" if adaptive else "frozen  "
+        print(f"📊 {name}: benign/attack windows flagged per shifted pass: {' '.join(passes)}, "
+              f"threshold {detector.ae_threshold:.4f}"
+              + (f", {detector.adaptive.refreshes} refreshes ({detector.adaptive.rejected} rejected)" if adaptive else ""))
+
+if __name__ == "__main__":
+    main()
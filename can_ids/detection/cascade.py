@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/cascade.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.metrics import registry
+
+CASCADE_FILENAME = "ids_cascade.json"
+
+# Where a window was decided, cheapest first
+STAGE_RULE = "rule" # O(1) volume/IAT rule: certainly an attack, models skipped
+STAGE_BOUNDS = "bounds" # Inside the calibrated benign box: certainly normal, models skipped
+STAGE_MODELS = "models" # Uncertain band: scored by the OCSVM + autoencoder
+STAGE_DRIFT = "drift" # Inside the box but scored anyway, to check the box still agrees with the models
+CASCADE_STAGES = (STAGE_RULE, STAGE_BOUNDS, STAGE_MODELS, STAGE_DRIFT)
+
+_MSG_COUNT = FEATURE_COLS.index("msg_count")
+_IAT_MEAN = FEATURE_COLS.index("iat_mean")
+
+CASCADE_WINDOWS = registry.counter("ids_cascade_windows_total", "Windows decided at each cascade stage", ("stage",))
+DRIFT_MISSES = registry.counter("ids_cascade_drift_misses_total",
+                                "Drift samples inside the benign box that the models flagged")
+
+@dataclass
+class CascadeConfig:
+    """
+    Thresholds for the cheap stages. `lower`/`upper` are the benign box in
+    FEATURE_COLS order, calibrated against the models it stands in for
+    (model_version records which ones).
+    """
+    lower: List[float]
+    upper: List[float]
+    flood_count: int = 100 # Same lines diagnose_attack() draws for FLOODING / DOS
+    flood_iat: float = 0.001
+    drift_every: int = 50 # Every Nth in-box window still goes to the models; 0 disables
+    model_version: str = ""
+    calibration: dict = field(default_factory=dict) # Where the box came from, for the record
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if len(data["lower"]) != len(FEATURE_COLS) or len(data["upper"]) != len(FEATURE_COLS):
+            raise ValueError(f"{path}: bounds do not match {FEATURE_COLS}")
+        return cls(**data)
+
+class Cascade:
+    """
+    Cheap-first gate in front of the model ensemble. gate() looks at one
+    feature vector and returns the stage that decides it; only STAGE_MODELS
+    and STAGE_DRIFT windows need the OCSVM and autoencoder.
+    """
+
+    def __init__(self, config: CascadeConfig):
+        self.config = config
+        self.lower = np.asarray(config.lower, dtype=np.float64)
+        self.upper = np.asarray(config.upper, dtype=np.float64)
+        self.counts = dict.fromkeys(CASCADE_STAGES, 0)
+        self.drift_misses = 0
+        self._in_box = 0
+        self._counters = {stage: CASCADE_WINDOWS.labels(stage) for stage in CASCADE_STAGES}
+
+    @classmethod
+    def load(cls, path):
+        return cls(CascadeConfig.load(path))
+
+    def gate(self, vector) -> str:
+        config = self.config
+        count = vector[_MSG_COUNT]
+        if count > config.flood_count or (count > 1 and vector[_IAT_MEAN] < config.flood_iat):
+            stage = STAGE_RULE
+        elif ((vector >= self.lower) & (vector <= self.upper)).all():
+            self._in_box += 1
+            drift = config.drift_every and self._in_box % config.drift_every == 0
+            stage = STAGE_DRIFT if drift else STAGE_BOUNDS
+        else:
+            stage = STAGE_MODELS
+        self.counts[stage] += 1
+        self._counters[stage].inc()
+        return stage
+
+    def drift_miss(self):
+        """The models flagged a drift sample the box would have passed."""
+        self.drift_misses += 1
+        DRIFT_MISSES.inc()
+
+    def hit_rates(self):
+        total = sum(self.counts.values())
+        return {stage: (n / total if total else 0.0) for stage, n in self.counts.items()}
+
+def calibrate(detector, X, coverage=0.98, margin_quantile=0.08, ae_margin=0.8, **kwargs) -> CascadeConfig:
+    """
+    Fits the benign box on feature rows X (any labels): the central `coverage`
+    of the windows the ensemble passes, then shrunk face by face until no
+    window the ensemble flags lies inside. Windows it passes only narrowly
+    (OCSVM score in the lowest `margin_quantile` of passed windows, or AE
+    error above `ae_margin` x threshold) are kept out as well: an axis-aligned
+    box only approximates the OCSVM boundary, and this margin is what keeps
+    unseen windows near that boundary going to the models.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    scores, mses = detector.score_batch(X)
+    flagged = (scores < 0) | (mses > detector.ae_threshold)
+    svm_margin = float(np.quantile(scores[~flagged], margin_quantile)) if (~flagged).any() else 0.0
+    unsure = flagged | (scores < svm_margin) | (mses > detector.ae_threshold * ae_margin)
+    passed, bad = X[~unsure], X[unsure]
+    tail = (1.0 - coverage) / 2
+    lower = np.quantile(passed, tail, axis=0)
+    upper = np.quantile(passed, 1.0 - tail, axis=0)
+
+    def inside(rows, lo, hi):
+        return np.all((rows >= lo) & (rows <= hi), axis=1)
+
+    while True:
+        hits = bad[inside(bad, lower, upper)]
+        if not len(hits):
+            break
+        point = hits[0]
+        # Exclude it by moving whichever single face keeps the most passed windows
+        best = None
+        for d in range(X.shape[1]):
+            for side in ("lower", "upper"):
+                lo, hi = lower.copy(), upper.copy()
+                if side == "lower":
+                    lo[d] = np.nextafter(point[d], np.inf)
+                else:
+                    hi[d] = np.nextafter(point[d], -np.inf)
+                kept = int(inside(passed, lo, hi).sum())
+                if best is None or kept > best[0]:
+                    best = (kept, lo, hi)
+        _, lower, upper = best
+
+    calibration = {"windows": len(X), "flagged": int(flagged.sum()), "coverage": coverage,
+                   "margin_quantile": margin_quantile, "svm_margin": svm_margin, "ae_margin": ae_margin,
+                   "box_coverage": float(inside(X[~flagged], lower, upper).mean()) if (~flagged).any() else 0.0}
+    return CascadeConfig(lower=lower.tolist(), upper=upper.tolist(), model_version=detector.models.version,
+                         calibration=calibration, **kwargs)
+
+def evaluate(detector, X, y=None):
+    """
+    Runs X window by window, as the live IDS would, once through the full
+    ensemble and once through detector.cascade. Returns a dict with the
+    flags of both, per-stage counts and CPU seconds per window.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    cascade, detector.cascade = detector.cascade, None
+    start = time.process_time()
+    full = np.array([detector.decide(row)[3] for row in X])
+    full_cpu = (time.process_time() - start) / len(X)
+
+    detector.cascade = cascade
+    cascade.counts = dict.fromkeys(CASCADE_STAGES, 0)
+    cascade.drift_misses = 0
+    start = time.process_time()
+    gated = np.array([detector.decide(row)[3] for row in X])
+    cascade_cpu = (time.process_time() - start) / len(X)
+
+    result = {
+        "windows": len(X),
+        "agreement": float((full == gated).mean()),
+        "missed_vs_full": int((full & ~gated).sum()),
+        "extra_vs_full": int((gated & ~full).sum()),
+        "cpu_us_full": full_cpu * 1e6,
+        "cpu_us_cascade": cascade_cpu * 1e6,
+        "stages": dict(cascade.counts),
+        "drift_misses": cascade.drift_misses,
+    }
+    if y is not None:
+        y = np.asarray(y).astype(bool)
+        for name, flags in (("full", full), ("cascade", gated)):
+            tp = int((flags & y).sum())
+            result[f"recall_{name}"] = tp / max(1, int(y.sum()))
+            result[f"precision_{name}"] = tp / max(1, int(flags.sum()))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the detection cascade and compare it with the full ensemble")
+    parser.add_argument("input_csv", help="Feature CSV (e.g. research_features_huge.csv); a 'label' column is optional")
+    parser.add_argument("--model-dir", default=None, help="Models to calibrate against (default IDS_MODEL_DIR)")
+    parser.add_argument("--split", type=float, default=0.5, help="Fraction of rows used to calibrate; the rest evaluates")
+    parser.add_argument("--coverage", type=float, default=0.98, help="Central fraction of passed windows the box starts from")
+    parser.add_argument("--margin-quantile", type=float, default=0.08,
+                        help="Passed windows with an OCSVM score in this lowest fraction are kept out of the box")
+    parser.add_argument("--drift-every", type=int, default=50)
+    parser.add_argument("--out", default=None, help="Config to write (default <model-dir>/ids_cascade.json)")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate only, do not write the config")
+    args = parser.parse_args()
+
+    import warnings
+    import pandas as pd
+    from can_ids.detection.detector import IDSDetector, MODEL_DIR
+
+    model_dir = Path(args.model_dir or MODEL_DIR)
+    df = pd.read_csv(args.input_csv)
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    y = df["label"].to_numpy() if "label" in df else None
+    cut = int(len(X) * args.split)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        detector = IDSDetector.load(model_dir, cascade=False)
+        print(f"⚖️  Calibrating on {cut} windows against models {detector.models.version}...")
+        config = calibrate(detector, X[:cut], args.coverage, args.margin_quantile, drift_every=args.drift_every)
+        detector.cascade = Cascade(config)
+        r = evaluate(detector, X[cut:], None if y is None else y[cut:])
+
+    print(f"\n📊 CASCADE vs FULL ENSEMBLE ({r['windows']} held-out windows)")
+    for stage, n in r["stages"].items():
+        print(f"   {stage:<8} {n:>7} ({n / r['windows']:.1%})")
+    print(f"   Verdict agreement: {r['agreement']:.2%} (missed {r['missed_vs_full']}, extra {r['extra_vs_full']}), "
+          f"drift misses: {r['drift_misses']}")
+    if y is not None:
+        print(f"   Recall    full {r['recall_full']:.3f} | cascade {r['recall_cascade']:.3f}")
+        print(f"   Precision full {r['precision_full']:.3f} | cascade {r['precision_cascade']:.3f}")
+    print(f"   CPU/window full {r['cpu_us_full']:.1f} us | cascade {r['cpu_us_cascade']:.1f} us "
+          f"({r['cpu_us_full'] / max(r['cpu_us_cascade'], 1e-9):.1f}x)")
+
+    if not args.dry_run:
+        out = args.out or model_dir / CASCADE_FILENAME
+        config.save(out)
+        print(f"💾 Cascade config saved to {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,555 @@
+import os
+import time
+import warnings
+import numpy as np
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from can_ids.detection.features import FEATURE_COLS, WINDOW_SIZE, window_feature_vector
+from can_ids.detection.cascade import (Cascade, CASCADE_FILENAME, STAGE_RULE, STAGE_BOUNDS, STAGE_MODELS,
+                                       STAGE_DRIFT)
+from can_ids.detection.periodicity import PeriodicityDetector, PERIODICITY_FILENAME, frame_ids
+from can_ids.detection.transitions import TransitionModel, TRANSITIONS_FILENAME
+from can_ids.detection.payload import PayloadMonitor, PAYLOAD_FILENAME, PAYLOAD_COLS, payload_matrix
+from can_ids.detection.physics import PhysicsChecker
+from can_ids.detection.adaptive import AdaptiveBaseline
+from can_ids.metrics import registry
+
+# === CONFIGURATION ===
+# Where the trainers save and every entry point loads; IDS_MODEL_DIR overrides it.
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+MODEL_DIR = Path(os.environ.get("IDS_MODEL_DIR", PROJECT_ROOT.parent))
+MODEL_FILENAME = "ocsvm_model.joblib"
+SCALER_FILENAME = "scaler.joblib"
+AE_MODEL_FILENAME = "autoencoder_model.keras"
+AE_THRESH_FILENAME = "ae_threshold.npy"
+BUNDLE_FILENAME = "ids_model.bundle" # All of the above in one file, see model_bundle.py
+
+ALERT_THRESHOLD = 3 # Consecutive anomalous windows before an alert
+_MSG_COUNT = FEATURE_COLS.index("msg_count")
+
+# === METRICS ===
+STAGES = ("features", "timing", "sequence", "payload", "physics", "scale", "ocsvm", "ae", "remote", "batch")
+STAGE_SECONDS = registry.histogram("ids_stage_seconds", "Time per window spent in each detection stage", ("stage",))
+_STAGE_HISTOGRAMS = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+VERDICT_LATENCY = registry.histogram("ids_verdict_latency_seconds", "Delay from window end to verdict")
+WINDOWS = registry.counter("ids_windows_total", "Scored windows by outcome", ("outcome",))
+_NORMAL, _ANOMALOUS, _ALERTS = WINDOWS.labels("normal"), WINDOWS.labels("anomalous"), WINDOWS.labels("alert")
+BATCH_WINDOWS = registry.histogram("ids_batch_windows", "Windows scored per model call while catching up",
+                                   buckets=(2, 4, 8, 16, 32, 64, 128, 256))
+CATCHUP_SECONDS = registry.histogram("ids_catchup_seconds", "Oldest window end to last verdict of a catch-up batch")
+
+class WindowSummary(NamedTuple):
+    """What scoring and the streak need from one closed window; the frames themselves are not kept."""
+    vector: np.ndarray # Features in FEATURE_COLS order
+    window_end: Optional[float]
+    checks: Tuple[int, int, float] = (0, 0, 0.0) # early_frames, unknown_ids, sequence_score
+    payload: Optional[Tuple[float, float, float, float]] = None # PAYLOAD_COLS values and flip excess
+    physics: int = 0 # Frames breaking the vehicle physics rules
+
+class ModelSet(NamedTuple):
+    """Everything one window is scored with, swapped as a unit."""
+    scaler: Any
+    ocsvm: Any
+    autoencoder: Any
+    ae_threshold: float
+    version: str = "artifacts" # Bundle content id, or where the models came from
+    path: Optional[str] = None # Bundle file, for reload()
+
+@dataclass
+class Verdict:
+    """Structured result for one scored window."""
+    window_end: float
+    msg_count: int
+    features: Dict[str, float]
+    ocsvm_anomaly: bool
+    ocsvm_score: float
+    ae_mse: float
+    ae_anomaly: bool
+    streak: int
+    attack: Optional[str] = None # Diagnosis once the streak reaches the alert threshold
+    latency: float = 0.0 # Seconds from window end to verdict
+    rule_anomaly: bool = False # Flagged by a cascade rule; the models did not run
+    stage: str = STAGE_MODELS # Cascade stage that decided the window (scores are 0.0 unless the models ran)
+    timing_anomaly: bool = False # Per-ID periodicity check: early frames or unknown IDs
+    early_frames: int = 0 # Frames that arrived well ahead of their ID's period
+    unknown_ids: int = 0 # Frames from IDs outside the learned set
+    sequence_anomaly: bool = False # ID transition model: the order of IDs is improbable
+    sequence_score: float = 0.0 # Worst rolling mean surprisal (nats/frame) in the window
+    payload_anomaly: bool = False # Per-ID payload check: byte values never seen, or excess bit flips
+    payload: Optional[Dict[str, float]] = None # PAYLOAD_COLS and flip_excess, when the payload check ran
+    physics_anomaly: bool = False # RPM/gear/brake values that the vehicle cannot produce
+    physics_score: int = 0 # Frames breaking the physics rules in the window
+
+    @property
+    def is_anomaly(self) -> bool:
+        return self.ocsvm_anomaly or self.ae_anomaly or self.rule_anomaly or self.timing_anomaly or \
+            self.sequence_anomaly or self.payload_anomaly or self.physics_anomaly
+
+    @property
+    def alert(self) -> bool:
+        # Low-volume "ANOMALY" diagnoses are likely false positives and never raise a full alert
+        return self.attack is not None and self.attack != "ANOMALY"
+
+    @property
+    def debug_str(self) -> str:
+        debug_str = ""
+        if self.rule_anomaly: debug_str += "[RULE]"
+        if self.timing_anomaly: debug_str += f"[TIMING:{self.early_frames}/{self.unknown_ids}]"
+        if self.sequence_anomaly: debug_str += f"[SEQ:{self.sequence_score:.2f}]"
+        if self.payload_anomaly:
+            # A verdict decoded from a record without payload values only has the flag
+            debug_str += "[PAYLOAD]" if self.payload is None else \
+                f"[PAYLOAD:{self.payload['out_of_range']:.0%}/{self.payload['flip_excess']:.0f}]"
+        if self.physics_anomaly: debug_str += f"[PHYSICS:{self.physics_score}]"
+        if self.ocsvm_anomaly: debug_str += "[SVM]"
+        if self.ae_anomaly: debug_str += f"[AE:{self.ae_mse:.1f}]"
+        return debug_str
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["alert"] = self.alert
+        return d
+
+def diagnose_attack(features):
+    # Extract scalar values
+    count = features['msg_count']
+    iat = features['iat_mean']
+    
+    # === FINAL TUNED THRESHOLDS ===
+    # Normal: ~8-12 msgs
+    # New Context Spoof: ~28-35 msgs (Precision Injection)
+    # Replay: ~50 msgs
+    # Flooding: >1000 msgs
+    
+    # A safe line for "Massive Volume" vs "Injection"
+    if count > 100 or iat < 0.001:
+        return "FLOODING / DOS"
+    elif count > 20:
+        # 20-60 messages is the signature of Spoofing/Replay
+        # Increased to >20 to avoid jitter false positives (Normal is ~9)
+        return "SPOOFING / REPLAY"
+    else:
+        return "ANOMALY"
+
+class IDSDetector:
+    """
+    The hybrid OCSVM + Autoencoder detector as a library object.
+
+    process_window() takes one window of frames and returns a Verdict, keeping
+    the anomaly streak between calls, so the same object can be driven by the
+    standalone main_live_ids.py loop or by a worker thread in the backend.
+
+    The models live in one ModelSet reference that each window reads once,
+    so swap_models() from another thread takes effect between windows and a
+    window is never scored with a mix of old and new models.
+    """
+
+    def __init__(self, scaler, ocsvm, autoencoder, ae_threshold, alert_threshold=ALERT_THRESHOLD, version="artifacts"):
+        self.models = ModelSet(scaler, ocsvm, autoencoder, float(ae_threshold), version)
+        self.cascade: Optional[Cascade] = None # Cheap stages in front of the models, see cascade.py
+        self.periodicity: Optional[PeriodicityDetector] = None # Per-ID timing check, see periodicity.py
+        self.transitions: Optional[TransitionModel] = None # ID order check, see transitions.py
+        self.payload: Optional[PayloadMonitor] = None # Per-ID payload content check, see payload.py
+        self.physics: Optional[PhysicsChecker] = None # RPM/gear/brake consistency, see physics.py
+        self.adaptive: Optional[AdaptiveBaseline] = None # Online scaler/threshold refresh, see adaptive.py
+        self.alert_threshold = alert_threshold
+        self.anomaly_streak = 0
+        self.stage_ns = dict.fromkeys(STAGES, 0) # Duration of each stage in the last window
+        self.on_stage = None # Optional callback(stage, ns), e.g. the --profile mode of main_live_ids.py
+
+    @property
+    def scaler(self):
+        return self.models.scaler
+
+    @property
+    def ocsvm(self):
+        return self.models.ocsvm
+
+    @property
+    def autoencoder(self):
+        return self.models.autoencoder
+
+    @property
+    def ae_threshold(self):
+        return self.models.ae_threshold
+
+    @ae_threshold.setter
+    def ae_threshold(self, value):
+        self.models = self.models._replace(ae_threshold=float(value))
+
+    def swap_models(self, models: ModelSet):
+        """
+        Replaces the model set with one reference assignment; the anomaly
+        streak carries over. A cascade calibrated for other models is dropped.
+        """
+        if self.cascade is not None and self.cascade.config.model_version != models.version:
+            self.cascade = None
+        self.models = models
+
+    def attach_cascade(self, path) -> bool:
+        """Puts the cascade config at `path` in front of the models if it was calibrated for them."""
+        path = Path(path)
+        if not path.exists():
+            return False
+        cascade = Cascade.load(path)
+        if cascade.config.model_version != self.models.version:
+            return False
+        self.cascade = cascade
+        return True
+
+    def attach_periodicity(self, path=None) -> bool:
+        """
+        Runs the per-ID timing check next to the models: with the profile at
+        `path` if it exists, or learning periods and the ID set online when
+        path is None.
+        """
+        if path is None:
+            self.periodicity = PeriodicityDetector()
+            return True
+        path = Path(path)
+        if not path.exists():
+            return False
+        self.periodicity = PeriodicityDetector.load(path)
+        return True
+
+    def attach_transitions(self, path) -> bool:
+        """Runs the ID transition model at `path` next to the models if it exists."""
+        path = Path(path)
+        if not path.exists():
+            return False
+        self.transitions = TransitionModel.load(path)
+        return True
+
+    def attach_payload(self, path) -> bool:
+        """Runs the per-ID payload check with the profile at `path` next to the models if it exists."""
+        path = Path(path)
+        if not path.exists():
+            return False
+        self.payload = PayloadMonitor.load(path)
+        return True
+
+    def attach_physics(self):
+        """Runs the vehicle physics rules (no profile: they come from the simulator) next to the models."""
+        self.physics = PhysicsChecker()
+        return True
+
+    def attach_adaptive(self, **kwargs):
+        """Refreshes the scaler and AE threshold from benign live windows (kwargs: AdaptiveBaseline's)."""
+        self.adaptive = AdaptiveBaseline(self.models, **kwargs)
+        return True
+
+    def reload(self, path=None):
+        """Loads a bundle (default: the one this detector came from) and swaps it in. Returns its version."""
+        from can_ids.detection.model_bundle import load_bundle
+        path = path or self.models.path
+        if path is None:
+            raise ValueError("Detector was not loaded from a bundle; pass the bundle path")
+        bundle = load_bundle(path)
+        self.swap_models(self._bundle_models(bundle))
+        return bundle.version
+
+    def _end_stage(self, stage, start_ns):
+        """Records the stage that started at start_ns. Returns now, the start of the next stage."""
+        now = time.perf_counter_ns()
+        ns = now - start_ns
+        self.stage_ns[stage] = ns
+        _STAGE_HISTOGRAMS[stage].observe(ns / 1e9)
+        if self.on_stage is not None:
+            self.on_stage(stage, ns)
+        return now
+
+    @classmethod
+    def load(cls, model_dir=MODEL_DIR, prefer_bundle=True, cascade=True, periodicity=True, transitions=True,
+             payload=True, physics=True, **kwargs):
+        """
+        Loads model_dir's bundle if there is one (milliseconds, NumPy only)
+        and no model was retrained since it was built, otherwise the four
+        training artifacts, plus the cascade config if one
+        was calibrated for them, the periodicity profile, transition model
+        and payload profile if there are any, and the physics rules.
+        Raises on missing files or a bundle built for another feature schema.
+        """
+        model_dir = Path(model_dir)
+        if prefer_bundle and (model_dir / BUNDLE_FILENAME).exists():
+            from can_ids.detection.model_bundle import bundle_is_stale
+            if not bundle_is_stale(model_dir / BUNDLE_FILENAME, model_dir):
+                return cls.load_bundle(model_dir / BUNDLE_FILENAME, cascade=cascade, periodicity=periodicity,
+                                       transitions=transitions, payload=payload, physics=physics, **kwargs)
+            warnings.warn(f"{model_dir / BUNDLE_FILENAME} predates the last training run; loading the training "
+                          "artifacts instead (rebuild it: python -m can_ids.detection.model_bundle)")
+        for filename in (SCALER_FILENAME, MODEL_FILENAME, AE_MODEL_FILENAME, AE_THRESH_FILENAME):
+            # Fail before paying for the TensorFlow import
+            if not (model_dir / filename).exists():
+                raise FileNotFoundError(f"Missing model artifact: {model_dir / filename}")
+        # Silence TF logs
+        os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+        import joblib
+        from tensorflow.keras.models import load_model
+
+        scaler = joblib.load(model_dir / SCALER_FILENAME)
+        ocsvm = joblib.load(model_dir / MODEL_FILENAME)
+        autoencoder = load_model(model_dir / AE_MODEL_FILENAME)
+        ae_threshold = np.load(model_dir / AE_THRESH_FILENAME)
+        detector = cls(scaler, ocsvm, autoencoder, ae_threshold, **kwargs)
+        if cascade:
+            detector.attach_cascade(model_dir / CASCADE_FILENAME)
+        if periodicity:
+            detector.attach_periodicity(model_dir / PERIODICITY_FILENAME)
+        if transitions:
+            detector.attach_transitions(model_dir / TRANSITIONS_FILENAME)
+        if payload:
+            detector.attach_payload(model_dir / PAYLOAD_FILENAME)
+        if physics:
+            detector.attach_physics()
+        return detector
+
+    @classmethod
+    def load_bundle(cls, path=MODEL_DIR / BUNDLE_FILENAME, cascade=True, periodicity=True, transitions=True,
+                    payload=True, physics=True, **kwargs):
+        """
+        Memory-maps a bundle written by model_bundle.py (no TensorFlow, sklearn
+        or pandas), plus a matching cascade config, periodicity profile,
+        transition model and payload profile next to it, and the physics rules.
+        """
+        from can_ids.detection.model_bundle import load_bundle
+        detector = cls(None, None, None, 0.0, **kwargs)
+        detector.swap_models(cls._bundle_models(load_bundle(path)))
+        if cascade:
+            detector.attach_cascade(Path(path).parent / CASCADE_FILENAME)
+        if periodicity:
+            detector.attach_periodicity(Path(path).parent / PERIODICITY_FILENAME)
+        if transitions:
+            detector.attach_transitions(Path(path).parent / TRANSITIONS_FILENAME)
+        if payload:
+            detector.attach_payload(Path(path).parent / PAYLOAD_FILENAME)
+        if physics:
+            detector.attach_physics()
+        return detector
+
+    @staticmethod
+    def _bundle_models(bundle):
+        return ModelSet(bundle.scaler, bundle.ocsvm, bundle.autoencoder, bundle.ae_threshold, bundle.version, bundle.path)
+
+    @staticmethod
+    def _model_input(features, scaler):
+        """Feature rows as the scaler expects them: sklearn scalers fitted on a DataFrame want one back."""
+        if hasattr(features, "columns"):
+            return features
+        rows = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_COLS))
+        if hasattr(scaler, "feature_names_in_"):
+            import pandas as pd
+            return pd.DataFrame(rows, columns=FEATURE_COLS)
+        return rows
+
+    @staticmethod
+    def _reconstruct(scaled, autoencoder):
+        # Calling the Keras model directly: predict() has a large fixed per-call cost for small batches
+        return np.asarray(autoencoder(scaled, training=False))
+
+    def score(self, features, models=None):
+        """
+        Returns (ocsvm_pred, ocsvm_score, mse) for one window's features
+        (vector or single-row frame), with `models` or the current set.
+        """
+        m = models or self.models
+        t = time.perf_counter_ns()
+        scaled = m.scaler.transform(self._model_input(features, m.scaler))
+        t = self._end_stage("scale", t)
+
+        # Ensemble Prediction
+        ocsvm_score = float(m.ocsvm.decision_function(scaled)[0])
+        ocsvm_pred = -1 if ocsvm_score < 0 else 1
+        t = self._end_stage("ocsvm", t)
+
+        reconstruction = self._reconstruct(scaled, m.autoencoder)
+        mse = float(np.mean(np.power(scaled - reconstruction, 2)))
+        self._end_stage("ae", t)
+        return ocsvm_pred, ocsvm_score, mse
+
+    def score_batch(self, features, models=None):
+        """
+        Scores many feature rows in one call (DataFrame or array in FEATURE_COLS
+        order). Returns (ocsvm_scores, mses) arrays.
+        """
+        m = models or self.models
+        scaled = m.scaler.transform(self._model_input(features, m.scaler))
+        scores = m.ocsvm.decision_function(scaled)
+        reconstruction = self._reconstruct(scaled, m.autoencoder)
+        mses = np.mean(np.power(scaled - reconstruction, 2), axis=1)
+        return scores, mses
+
+    def process_window(self, messages, window_end: Optional[float] = None) -> Optional[Verdict]:
+        summary = self.summarize(messages, window_end)
+        return None if summary is None else self.process_summary(summary)
+
+    def summarize(self, messages, window_end: Optional[float] = None) -> Optional[WindowSummary]:
+        """Features and frame-level checks of one closed window (None if it is empty); the frames can go after this."""
+        t = time.perf_counter_ns()
+        vector = window_feature_vector(messages)
+        t = self._end_stage("features", t)
+        if vector is None:
+            return None
+        checks = self._frame_checks(messages, t)
+        payload = None
+        physics = 0
+        if self.payload is not None or self.physics is not None:
+            # Both decode the same payload bytes
+            t = time.perf_counter_ns()
+            ids = frame_ids(messages)
+            matrix, lengths = payload_matrix([m.data for m in messages])
+            if self.payload is not None:
+                payload = self.payload.window_features(ids, matrix, lengths)
+                t = self._end_stage("payload", t)
+            if self.physics is not None:
+                violations, _ = self.physics.scan(ids, [m.timestamp for m in messages], matrix, lengths)
+                physics = int(violations.sum())
+                self._end_stage("physics", t)
+        return WindowSummary(vector, window_end, checks, payload, physics)
+
+    def _frame_checks(self, messages, start_ns):
+        """
+        (early_frames, unknown_ids, sequence_score) from the periodicity check
+        and the transition model; zeros for whichever is not attached.
+        """
+        early_frames = unknown_ids = 0
+        sequence_score = 0.0
+        if self.periodicity is not None:
+            early_frames, unknown_ids = self.periodicity.window_flags(messages)
+            start_ns = self._end_stage("timing", start_ns)
+        if self.transitions is not None:
+            sequence_score = self.transitions.window_score(messages)
+            self._end_stage("sequence", start_ns)
+        return early_frames, unknown_ids, sequence_score
+
+    def process_summary(self, summary: WindowSummary) -> Verdict:
+        models = self.models # One set for the whole window, even if a swap lands meanwhile
+        ocsvm_score, mse, stage, _ = self.decide(summary.vector, models)
+        return self._verdict(summary, ocsvm_score, mse, models.ae_threshold, time.time(), stage)
+
+    def decide(self, vector, models=None):
+        """
+        Runs one feature vector through the cascade, if any, and the models
+        when the cascade cannot decide. Returns (ocsvm_score, mse, stage,
+        anomalous); windows decided without the models report 0.0 scores.
+        """
+        m = models or self.models
+        stage = self.cascade.gate(vector) if self.cascade is not None else STAGE_MODELS
+        if stage == STAGE_RULE or stage == STAGE_BOUNDS:
+            return 0.0, 0.0, stage, stage == STAGE_RULE
+        _, ocsvm_score, mse = self.score(vector, m)
+        anomalous = ocsvm_score < 0 or mse > m.ae_threshold
+        if stage == STAGE_DRIFT and anomalous:
+            self.cascade.drift_miss()
+        return ocsvm_score, mse, stage, anomalous
+
+    def process_windows(self, windows: Sequence[Tuple[list, float]]) -> List[Optional[Verdict]]:
+        """
+        Catch-up path: scores several closed windows, given as (messages,
+        window_end) in time order, with one batched model call instead of one
+        call per window, and returns their verdicts in the same order (None
+        for empty windows). The streak advances exactly as if each window had
+        gone through process_window().
+        """
+        # The frame-level checks are stateful, so windows are summarized one by one in order
+        return self.process_summaries([self.summarize(messages, end) for messages, end in windows])
+
+    def process_summaries(self, summaries: Sequence[Optional[WindowSummary]]) -> List[Optional[Verdict]]:
+        """process_windows() for windows already summarized (None entries stay None)."""
+        if len(summaries) <= 1:
+            return [None if s is None else self.process_summary(s) for s in summaries]
+        if all(s is None for s in summaries):
+            return [None] * len(summaries)
+
+        # The cascade decides what it can; only the rest go into the batched model call
+        t = time.perf_counter_ns()
+        stages = [None if s is None else self.cascade.gate(s.vector) if self.cascade is not None else STAGE_MODELS
+                  for s in summaries]
+        rows = [s.vector for s, stage in zip(summaries, stages) if stage == STAGE_MODELS or stage == STAGE_DRIFT]
+        models = self.models
+        if rows:
+            scores, mses = self.score_batch(np.vstack(rows), models)
+        self._end_stage("batch", t)
+
+        now = time.time()
+        verdicts, row = [], 0
+        for summary, stage in zip(summaries, stages):
+            if summary is None:
+                verdicts.append(None)
+                continue
+            ocsvm_score = mse = 0.0
+            if stage == STAGE_MODELS or stage == STAGE_DRIFT:
+                ocsvm_score, mse = float(scores[row]), float(mses[row])
+                row += 1
+                if stage == STAGE_DRIFT and (ocsvm_score < 0 or mse > models.ae_threshold):
+                    self.cascade.drift_miss()
+            verdicts.append(self._verdict(summary, ocsvm_score, mse, models.ae_threshold, now, stage))
+        BATCH_WINDOWS.observe(sum(v is not None for v in verdicts))
+        oldest = next(v for v in verdicts if v is not None)
+        CATCHUP_SECONDS.observe(oldest.latency)
+        return verdicts
+
+    def _verdict(self, summary: WindowSummary, ocsvm_score, mse, ae_threshold, now, stage=STAGE_MODELS) -> Verdict:
+        """Applies the ensemble decision and the streak to one scored window."""
+        vector, window_end, checks, payload, physics_score = summary
+        is_ocsvm_anomaly = ocsvm_score < 0
+        is_ae_anomaly = (mse > ae_threshold)
+        is_rule_anomaly = stage == STAGE_RULE
+        early_frames, unknown_ids, sequence_score = checks
+        is_timing_anomaly = self.periodicity is not None and self.periodicity.is_anomalous(early_frames, unknown_ids)
+        is_sequence_anomaly = self.transitions is not None and self.transitions.is_anomalous(sequence_score)
+        if payload is not None:
+            payload = dict(zip(PAYLOAD_COLS + ["flip_excess"], payload))
+        is_payload_anomaly = payload is not None and self.payload is not None and \
+            self.payload.is_anomalous(payload["out_of_range"], payload["flip_excess"])
+        is_physics_anomaly = self.physics is not None and self.physics.is_anomalous(physics_score)
+
+        if is_ocsvm_anomaly or is_ae_anomaly or is_rule_anomaly or is_timing_anomaly or is_sequence_anomaly or \
+                is_payload_anomaly or is_physics_anomaly:
+            self.anomaly_streak += 1
+        else:
+            self.anomaly_streak = 0
+
+        features = dict(zip(FEATURE_COLS, vector.tolist()))
+        attack = None
+        if self.anomaly_streak >= self.alert_threshold:
+            attack = diagnose_attack(features)
+            # Volume alone cannot place a low-volume anomaly; frame timing, ID order, payload content and
+            # the vehicle physics can
+            if attack == "ANOMALY" and unknown_ids:
+                attack = "UNKNOWN ID"
+            elif attack == "ANOMALY" and (is_timing_anomaly or is_sequence_anomaly or is_payload_anomaly or
+                                          is_physics_anomaly):
+                attack = "SPOOFING / REPLAY"
+        window_end = now if window_end is None else window_end
+        verdict = Verdict(
+            window_end=window_end,
+            msg_count=int(vector[_MSG_COUNT]),
+            features=features,
+            ocsvm_anomaly=is_ocsvm_anomaly,
+            ocsvm_score=ocsvm_score,
+            ae_mse=mse,
+            ae_anomaly=is_ae_anomaly,
+            streak=self.anomaly_streak,
+            attack=attack,
+            latency=max(0.0, now - window_end),
+            rule_anomaly=is_rule_anomaly,
+            stage=stage,
+            timing_anomaly=is_timing_anomaly,
+            early_frames=early_frames,
+            unknown_ids=unknown_ids,
+            sequence_anomaly=is_sequence_anomaly,
+            sequence_score=sequence_score,
+            payload_anomaly=is_payload_anomaly,
+            payload=payload,
+            physics_anomaly=is_physics_anomaly,
+            physics_score=physics_score
+        )
+        VERDICT_LATENCY.observe(verdict.latency)
+        (_ALERTS if verdict.alert else _ANOMALOUS if verdict.is_anomaly else _NORMAL).inc()
+        if self.adaptive is not None:
+            models = self.adaptive.observe(verdict, vector, mse, stage, self.models)
+            if models is not None:
+                self.swap_models(models) # Derived version: a cascade calibrated for the trained set is dropped
+        return verdict
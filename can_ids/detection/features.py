@@ -0,0 +1,49 @@
+import math
+import numpy as np
+from collections import Counter
+
+WINDOW_SIZE = 0.1
+
+# Feature names must match training
+FEATURE_COLS = ['msg_count', 'unique_ids', 'id_entropy', 'payload_entropy', 'iat_mean', 'iat_std']
+
+def calculate_entropy(data_list):
+    if not data_list: return 0.0
+    counts = Counter(data_list)
+    total = len(data_list)
+    probs = [c / total for c in counts.values()]
+    return -sum(p * math.log2(p) for p in probs)
+
+def window_feature_vector(messages):
+    """
+    Live counterpart of build_features.process_window. Takes a list of
+    can.Message (anything with arbitration_id, data and timestamp) and returns
+    the features as a float64 array in FEATURE_COLS order. NumPy only, so the
+    live IDS does not need to import pandas.
+    """
+    if not messages: return None
+    msg_count = len(messages)
+    ids = [m.arbitration_id for m in messages]
+    payloads = [m.data.hex() for m in messages]
+    timestamps = [m.timestamp for m in messages]
+
+    unique_ids = len(set(ids))
+    id_entropy = calculate_entropy(ids)
+    payload_entropy = calculate_entropy(payloads)
+
+    if len(timestamps) > 1:
+        iats = np.diff(timestamps)
+        iat_mean = np.mean(iats)
+        iat_std = np.std(iats)
+    else:
+        iat_mean = 0.0
+        iat_std = 0.0
+
+    return np.array([msg_count, unique_ids, id_entropy, payload_entropy, iat_mean, iat_std], dtype=np.float64)
+
+def extract_window_features(messages):
+    """window_feature_vector() as a single-row DataFrame (imports pandas on first use)."""
+    vector = window_feature_vector(messages)
+    if vector is None: return None
+    import pandas as pd
+    return pd.DataFrame([vector], columns=FEATURE_COLS)
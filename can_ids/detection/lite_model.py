@@ -0,0 +1,104 @@
+import numpy as np
+
+from can_ids.detection.features import FEATURE_COLS
+
+# Activations the exported autoencoder may use
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0.0),
+    "sigmoid": lambda x: 1.0 / (1.0 + np.exp(-x)),
+    "tanh": np.tanh,
+}
+
+class LiteScaler:
+    """StandardScaler.transform with the fitted mean/scale."""
+
+    def __init__(self, mean, scale):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+class LiteOCSVM:
+    """RBF OneClassSVM decision function: sum(dual_coef * exp(-gamma * |sv - x|^2)) + intercept."""
+
+    def __init__(self, support_vectors, dual_coef, intercept, gamma):
+        self.support_vectors = np.asarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64).ravel()
+        self.intercept = float(np.ravel(intercept)[0])
+        self.gamma = float(gamma)
+        self._sv_sq = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.support_vectors.shape[1])
+        # |x - sv|^2 = |x|^2 - 2 x.sv + |sv|^2, one matrix product for the whole batch
+        sq_dist = np.einsum("ij,ij->i", X, X)[:, None] - 2.0 * X @ self.support_vectors.T + self._sv_sq
+        return np.exp(-self.gamma * np.maximum(sq_dist, 0.0)) @ self.dual_coef + self.intercept
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+class LiteAutoencoder:
+    """Stack of dense layers, callable like the Keras model (model(x, training=False))."""
+
+    def __init__(self, weights, biases, activations):
+        self.layers = [(np.asarray(w, dtype=np.float32), np.asarray(b, dtype=np.float32), ACTIVATIONS[a])
+                       for w, b, a in zip(weights, biases, activations)]
+
+    def __call__(self, X, training=False):
+        out = np.asarray(X, dtype=np.float32)
+        for w, b, activation in self.layers:
+            out = activation(out @ w + b)
+        return out
+
+    def predict(self, X, verbose=0):
+        return self(X)
+
+def model_arrays(scaler, ocsvm, autoencoder):
+    """
+    Flattens a fitted StandardScaler, RBF OneClassSVM and dense Keras
+    autoencoder into named arrays plus the few scalars they need. Raises
+    ValueError for models the Lite classes cannot reproduce.
+    """
+    if getattr(ocsvm, "kernel", "rbf") != "rbf":
+        raise ValueError(f"Only RBF OneClassSVMs can be exported (got {ocsvm.kernel})")
+    names = list(getattr(scaler, "feature_names_in_", FEATURE_COLS))
+    if names != FEATURE_COLS:
+        raise ValueError(f"Scaler features {names} do not match {FEATURE_COLS}")
+
+    arrays = {
+        "scaler_mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scaler_scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "svm_support_vectors": np.asarray(ocsvm.support_vectors_, dtype=np.float64),
+        "svm_dual_coef": np.asarray(ocsvm.dual_coef_, dtype=np.float64).ravel(),
+    }
+    activations = []
+    for layer in getattr(autoencoder, "layers", ()):
+        if not layer.get_weights():
+            continue # Input layer
+        kind = type(layer).__name__
+        activation = layer.get_config().get("activation")
+        if kind != "Dense" or activation not in ACTIVATIONS:
+            raise ValueError(f"Cannot export layer {layer.name} ({kind}, activation={activation})")
+        w, b = layer.get_weights()
+        arrays[f"ae_w{len(activations)}"] = np.asarray(w, dtype=np.float32)
+        arrays[f"ae_b{len(activations)}"] = np.asarray(b, dtype=np.float32)
+        activations.append(activation)
+    if not activations:
+        raise ValueError("Autoencoder has no Dense layers to export")
+
+    meta = {
+        "svm_gamma": float(ocsvm._gamma),
+        "svm_intercept": float(np.ravel(ocsvm.intercept_)[0]),
+        "ae_activations": activations,
+    }
+    return arrays, meta
+
+def models_from_arrays(arrays, meta):
+    """Inverse of model_arrays(): returns (scaler, ocsvm, autoencoder) Lite objects."""
+    activations = meta["ae_activations"]
+    return (LiteScaler(arrays["scaler_mean"], arrays["scaler_scale"]),
+            LiteOCSVM(arrays["svm_support_vectors"], arrays["svm_dual_coef"], meta["svm_intercept"], meta["svm_gamma"]),
+            LiteAutoencoder([arrays[f"ae_w{i}"] for i in range(len(activations))],
+                            [arrays[f"ae_b{i}"] for i in range(len(activations))], activations))
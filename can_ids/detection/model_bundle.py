@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import struct
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/model_bundle.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.features import FEATURE_COLS, WINDOW_SIZE
+from can_ids.detection.lite_model import model_arrays, models_from_arrays
+
+# === FORMAT ===
+# magic | format version (uint32) | header length (uint32) | JSON header | padding | arrays
+# Every array starts on an ALIGN-byte boundary so it can be viewed straight out of the mmap.
+MAGIC = b"CANIDSMB"
+FORMAT_VERSION = 1
+PREAMBLE_FMT = "<8sII"
+PREAMBLE_SIZE = struct.calcsize(PREAMBLE_FMT)
+ALIGN = 64
+
+MANIFEST_FILENAME = "training_manifest.json"
+
+class BundleError(ValueError):
+    """The file is not a usable bundle: bad magic/version, corrupt, or built for another feature schema."""
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+def _digest(header, payload):
+    """sha256 over the canonical header (minus the digest itself) and the array bytes."""
+    h = hashlib.sha256(json.dumps({k: v for k, v in header.items() if k != "sha256"}, sort_keys=True).encode())
+    h.update(payload)
+    return h.hexdigest()
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _atomic_write(path, data):
+    """Writes via a temp file + rename, so a reader (or an mmap) never sees a half-written file."""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        for chunk in data:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class ModelBundle:
+    """
+    One loaded bundle: the header, the arrays (read-only views into the mmap)
+    and the Lite scaler/OCSVM/autoencoder built on them.
+    """
+
+    def __init__(self, path, header, arrays):
+        self.path = str(path)
+        self.header = header
+        self.arrays = arrays
+        self.scaler, self.ocsvm, self.autoencoder = models_from_arrays(arrays, header)
+        self.ae_threshold = float(header["ae_threshold"])
+
+    @property
+    def digest(self):
+        return self.header["sha256"]
+
+    @property
+    def version(self):
+        """Short content id, for logs."""
+        return self.digest[:12]
+
+def write_bundle(path, scaler, ocsvm, autoencoder, ae_threshold, window_size=WINDOW_SIZE, **metadata):
+    """
+    Writes a fitted scaler, OCSVM and autoencoder plus the AE threshold as one
+    bundle, atomically. Extra keyword arguments (e.g. dataset_sha256) are
+    stored in the header. Returns the content digest.
+    """
+    arrays, meta = model_arrays(scaler, ocsvm, autoencoder)
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    payload = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]["offset"]
+        payload[start:start + array.nbytes] = array.tobytes()
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "feature_cols": FEATURE_COLS,
+        "window_size": window_size,
+        "ae_threshold": float(ae_threshold),
+        **meta,
+        **metadata,
+        "arrays": layout,
+    }
+    header["sha256"] = _digest(header, payload)
+
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(PREAMBLE_SIZE + len(header_bytes))
+    preamble = struct.pack(PREAMBLE_FMT, MAGIC, FORMAT_VERSION, len(header_bytes))
+    _atomic_write(path, [preamble, header_bytes, b"\0" * (data_start - PREAMBLE_SIZE - len(header_bytes)), payload])
+    return header["sha256"]
+
+def read_header(path):
+    """Returns (header, data_start) after checking the magic and format version."""
+    with open(path, "rb") as f:
+        preamble = f.read(PREAMBLE_SIZE)
+        if len(preamble) < PREAMBLE_SIZE:
+            raise BundleError(f"{path}: too short to be a model bundle")
+        magic, version, header_len = struct.unpack(PREAMBLE_FMT, preamble)
+        if magic != MAGIC:
+            raise BundleError(f"{path}: not a model bundle")
+        if version != FORMAT_VERSION:
+            raise BundleError(f"{path}: bundle format {version}, this IDS reads format {FORMAT_VERSION}")
+        header = json.loads(f.read(header_len))
+    return header, _align(PREAMBLE_SIZE + header_len)
+
+def check_schema(header, path="bundle"):
+    """Raises BundleError unless the bundle was built for this IDS's features and window."""
+    if header.get("feature_cols") != FEATURE_COLS:
+        raise BundleError(f"{path}: built for features {header.get('feature_cols')}, the IDS extracts {FEATURE_COLS}")
+    if header.get("window_size") != WINDOW_SIZE:
+        raise BundleError(f"{path}: built for {header.get('window_size')}s windows, the IDS uses {WINDOW_SIZE}s")
+
+def load_bundle(path, verify=True):
+    """
+    Memory-maps a bundle and returns a ModelBundle. The schema is checked
+    from the header before anything else is touched; with verify=True the
+    content hash is checked too (one pass over a few hundred KB).
+    """
+    header, data_start = read_header(path)
+    check_schema(header, path)
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    payload = mm[data_start:]
+    if verify and _digest(header, payload) != header["sha256"]:
+        raise BundleError(f"{path}: content hash mismatch (corrupt or modified)")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(payload, dtype=dtype, count=count, offset=spec["offset"]).reshape(spec["shape"])
+    return ModelBundle(path, header, arrays)
+
+# === TRAINING MANIFEST ===
+# The trainers record which dataset and which scaler each model was fitted
+# with, so a model trained against a stale scaler is caught instead of bundled.
+
+def read_manifest(model_dir):
+    path = Path(model_dir) / MANIFEST_FILENAME
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(model_dir, manifest):
+    _atomic_write(Path(model_dir) / MANIFEST_FILENAME, [json.dumps(manifest, indent=2).encode()])
+
+def manifest_digest(manifest):
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()
+
+def remove_bundle(model_dir):
+    """Deletes model_dir's bundle: a trainer that rewrote an artifact has made it stale. Returns True if one existed."""
+    from can_ids.detection.detector import BUNDLE_FILENAME
+    try:
+        os.unlink(Path(model_dir) / BUNDLE_FILENAME)
+        return True
+    except FileNotFoundError:
+        return False
+
+def bundle_is_stale(path, model_dir):
+    """
+    True if the training manifest in model_dir changed since the bundle at
+    `path` was built from it, i.e. a model was retrained after bundling.
+    Bundles built without a manifest digest are compared by dataset.
+    """
+    manifest = read_manifest(model_dir)
+    if not manifest:
+        return False
+    header, _ = read_header(path)
+    if "manifest_sha256" in header:
+        return header["manifest_sha256"] != manifest_digest(manifest)
+    return header.get("dataset_sha256") != manifest.get("dataset_sha256")
+
+def build_from_artifacts(model_dir, path=None):
+    """
+    Bundles the four training artifacts in model_dir (needs sklearn and
+    TensorFlow). Refuses if the training manifest shows the autoencoder was
+    fitted with a different scaler than the OCSVM. Returns (path, digest).
+    """
+    from can_ids.detection.detector import (IDSDetector, BUNDLE_FILENAME, SCALER_FILENAME)
+
+    model_dir = Path(model_dir)
+    path = Path(path) if path else model_dir / BUNDLE_FILENAME
+    manifest = read_manifest(model_dir)
+    metadata = {}
+    if manifest:
+        scaler_sha = file_sha256(model_dir / SCALER_FILENAME)
+        for model in ("ocsvm", "autoencoder"):
+            entry = manifest.get(model)
+            if entry is None:
+                raise BundleError(f"{model_dir}: no {model} trained since the scaler was last fitted")
+            if entry["scaler_sha256"] != scaler_sha:
+                raise BundleError(f"{model_dir}: the {model} was trained with a different scaler; retrain it")
+        metadata = {"dataset": manifest.get("dataset"), "dataset_sha256": manifest.get("dataset_sha256"),
+                    "manifest_sha256": manifest_digest(manifest)}
+
+    detector = IDSDetector.load(model_dir, prefer_bundle=False)
+    digest = write_bundle(path, detector.scaler, detector.ocsvm, detector.autoencoder, detector.ae_threshold, **metadata)
+    return path, digest
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the single-file IDS model bundle")
+    parser.add_argument("--model-dir", default=None, help="Directory with the training artifacts (default IDS_MODEL_DIR)")
+    parser.add_argument("--out", default=None, help="Bundle path (default <model-dir>/ids_model.bundle)")
+    parser.add_argument("--info", metavar="BUNDLE", help="Print a bundle's header and verify its hash, then exit")
+    args = parser.parse_args()
+
+    from can_ids.detection.detector import MODEL_DIR
+    try:
+        if args.info:
+            start = time.perf_counter()
+            bundle = load_bundle(args.info)
+            elapsed = (time.perf_counter() - start) * 1000
+            header = {k: v for k, v in bundle.header.items() if k != "arrays"}
+            print(json.dumps(header, indent=2))
+            print(f"✅ {args.info}: hash OK, {len(bundle.arrays)} arrays, loaded in {elapsed:.1f} ms")
+            return
+        path, digest = build_from_artifacts(args.model_dir or MODEL_DIR, args.out)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    print(f"✅ Bundle written to {path} ({digest[:12]})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import argparse
+import selectors
+import threading
+import warnings
+
+import numpy as np
+
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.detection.detector import IDSDetector, MODEL_DIR
+
+DEFAULT_SOCKET = "/tmp/can_ids_models.sock"
+
+# Every message: type, status, row count, request id, model generation
+HEADER_FMT = "<BBHII"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+MSG_SCORE = 1 # Request: rows x len(FEATURE_COLS) float64. Response: rows x (ocsvm_score, mse) float64
+MSG_INFO = 2 # Response payload: JSON
+MSG_RELOAD = 3 # Request payload: optional JSON {"model_dir": ...}. Response payload: JSON
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+MAX_ROWS = 1024 # Per request; keeps a message well under the SEQPACKET size limit
+MAX_MESSAGE = HEADER_SIZE + MAX_ROWS * len(FEATURE_COLS) * 8
+BATCH_WAIT = 0.001 # Seconds to wait for more requests to join a batch
+
+class ModelServer:
+    """
+    Keeps the scaler, OCSVM and autoencoder loaded and warmed for any number
+    of IDS processes, over a Unix SOCK_SEQPACKET socket.
+
+    Requests that arrive together (from one or many clients) are stacked and
+    scored with a single transform/decision_function/autoencoder call. RELOAD
+    (or SIGHUP) loads a new model set in a background thread and swaps it in
+    with one reference assignment, so in-flight scoring is never interrupted;
+    every response carries the model generation so clients can notice a swap.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, model_dir=MODEL_DIR, batch_wait=BATCH_WAIT):
+        self.path = path
+        self.model_dir = str(model_dir)
+        self.batch_wait = batch_wait
+        self.detector = None
+        self.generation = 0
+        self.loaded_at = 0.0
+        self.requests_served = 0
+        self.batches_scored = 0
+        self._reloading = threading.Lock()
+        self._stop = threading.Event()
+
+    def load(self, model_dir=None):
+        """Loads and warms a model set, then swaps it in. Returns the new generation."""
+        model_dir = str(model_dir or self.model_dir)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            detector = IDSDetector.load(model_dir, cascade=False) # Clients run their own cascade
+            # First calls build TF functions and sklearn validation paths
+            detector.score_batch(np.zeros((1, len(FEATURE_COLS))))
+        self.detector, self.model_dir = detector, model_dir
+        self.generation += 1
+        self.loaded_at = time.time()
+        return self.generation
+
+    def reload_async(self, model_dir=None):
+        def run():
+            if not self._reloading.acquire(blocking=False):
+                return
+            try:
+                generation = self.load(model_dir)
+                print(f"🔄 Models reloaded from {self.model_dir} (generation {generation})", flush=True)
+            except Exception as e:
+                print(f"❌ Reload failed, keeping generation {self.generation}: {e}", flush=True)
+            finally:
+                self._reloading.release()
+        threading.Thread(target=run, daemon=True).start()
+
+    def info(self):
+        return {
+            "generation": self.generation,
+            "model_dir": self.model_dir,
+            "loaded_at": self.loaded_at,
+            "ae_threshold": self.detector.ae_threshold,
+            "version": self.detector.models.version,
+            "feature_cols": FEATURE_COLS,
+            "requests_served": self.requests_served,
+            "batches_scored": self.batches_scored
+        }
+
+    def _read_requests(self, conn, pending):
+        """Reads every queued message from conn. Returns False when the client is gone."""
+        while True:
+            try:
+                data = conn.recv(MAX_MESSAGE)
+            except (BlockingIOError, InterruptedError):
+                return True
+            except OSError:
+                return False
+            if not data:
+                return False
+            if len(data) < HEADER_SIZE:
+                continue
+            kind, _, rows, req_id, _ = struct.unpack_from(HEADER_FMT, data)
+            try:
+                self._handle(conn, kind, rows, req_id, data, pending)
+            except Exception as e:
+                # A malformed message fails its own request, never the server every IDS shares
+                self._reply(conn, kind, STATUS_ERROR, 0, req_id, str(e).encode())
+
+    def _handle(self, conn, kind, rows, req_id, data, pending):
+        if kind == MSG_SCORE:
+            expected = rows * len(FEATURE_COLS) * 8
+            if len(data) - HEADER_SIZE != expected:
+                raise ValueError(f"{rows} rows need {expected} payload bytes, got {len(data) - HEADER_SIZE}")
+            X = np.frombuffer(data, dtype=np.float64, offset=HEADER_SIZE)
+            pending.append((conn, req_id, X.reshape(rows, len(FEATURE_COLS))))
+        elif kind == MSG_INFO:
+            self._reply(conn, MSG_INFO, STATUS_OK, 0, req_id, json.dumps(self.info()).encode())
+        elif kind == MSG_RELOAD:
+            payload = json.loads(data[HEADER_SIZE:] or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("RELOAD payload must be a JSON object")
+            self.reload_async(payload.get("model_dir"))
+            self._reply(conn, MSG_RELOAD, STATUS_OK, 0, req_id, json.dumps({"reloading": True}).encode())
+        else:
+            raise ValueError(f"Unknown message type {kind}")
+
+    def _reply(self, conn, kind, status, rows, req_id, payload=b""):
+        try:
+            conn.send(struct.pack(HEADER_FMT, kind, status, rows, req_id, self.generation) + payload)
+        except OSError:
+            pass # Client went away; the selector will notice
+
+    def _score(self, pending):
+        detector = self.detector # One model set per batch, even if a swap lands meanwhile
+        X = np.concatenate([rows for _, _, rows in pending]) if len(pending) > 1 else pending[0][2]
+        try:
+            scores, mses = detector.score_batch(X)
+        except Exception as e:
+            for conn, req_id, rows in pending:
+                self._reply(conn, MSG_SCORE, STATUS_ERROR, 0, req_id, str(e).encode())
+            return
+        out = np.column_stack((scores, mses)).astype(np.float64)
+        start = 0
+        for conn, req_id, rows in pending:
+            n = len(rows)
+            self._reply(conn, MSG_SCORE, STATUS_OK, n, req_id, out[start:start + n].tobytes())
+            start += n
+        self.requests_served += len(pending)
+        self.batches_scored += 1
+
+    def serve(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        server.bind(self.path)
+        server.listen(64)
+        server.setblocking(False)
+        sel = selectors.DefaultSelector()
+        sel.register(server, selectors.EVENT_READ)
+        try:
+            while not self._stop.is_set():
+                pending = []
+                events = sel.select(timeout=0.5)
+                for _ in range(2):
+                    for key, _ in events:
+                        if key.fileobj is server:
+                            try:
+                                conn, _ = server.accept()
+                            except (BlockingIOError, InterruptedError):
+                                continue
+                            conn.setblocking(False)
+                            sel.register(conn, selectors.EVENT_READ)
+                        elif not self._read_requests(key.fileobj, pending):
+                            sel.unregister(key.fileobj)
+                            key.fileobj.close()
+                    if not pending or not self.batch_wait:
+                        break
+                    # Give requests from other IDS instances a moment to join this batch
+                    events = sel.select(timeout=self.batch_wait)
+                if pending:
+                    self._score(pending)
+        finally:
+            for key in list(sel.get_map().values()):
+                key.fileobj.close()
+            sel.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def stop(self):
+        self._stop.set()
+
+class ModelClient:
+    """Blocking client for ModelServer. One request in flight at a time."""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=2.0):
+        self.path = path
+        self.timeout = timeout
+        self.sock = None
+        self._req_id = 0
+        self.generation = None
+        self.connect()
+
+    def connect(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.settimeout(self.timeout)
+        try:
+            self.sock.connect(self.path)
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            raise
+
+    def _request(self, kind, rows=0, payload=b""):
+        self._req_id = (self._req_id + 1) & 0xFFFFFFFF
+        self.sock.send(struct.pack(HEADER_FMT, kind, 0, rows, self._req_id, 0) + payload)
+        while True:
+            data = self.sock.recv(MAX_MESSAGE)
+            if not data:
+                raise ConnectionError("Model server closed the connection")
+            r_kind, status, r_rows, req_id, generation = struct.unpack_from(HEADER_FMT, data)
+            if req_id != self._req_id:
+                continue # Reply to a request that timed out earlier
+            if status != STATUS_OK:
+                raise RuntimeError(f"Model server error: {data[HEADER_SIZE:].decode(errors='replace')}")
+            self.generation = generation
+            return r_rows, data[HEADER_SIZE:]
+
+    def info(self):
+        _, payload = self._request(MSG_INFO)
+        return json.loads(payload)
+
+    def reload(self, model_dir=None):
+        payload = json.dumps({"model_dir": str(model_dir)} if model_dir else {}).encode()
+        _, reply = self._request(MSG_RELOAD, payload=payload)
+        return json.loads(reply)
+
+    def score(self, X):
+        """Returns (ocsvm_scores, mses) for rows in FEATURE_COLS order."""
+        X = np.ascontiguousarray(X, dtype=np.float64).reshape(-1, len(FEATURE_COLS))
+        scores, mses = [], []
+        for start in range(0, len(X), MAX_ROWS):
+            chunk = X[start:start + MAX_ROWS]
+            rows, payload = self._request(MSG_SCORE, len(chunk), chunk.tobytes())
+            out = np.frombuffer(payload, dtype=np.float64).reshape(rows, 2)
+            scores.append(out[:, 0])
+            mses.append(out[:, 1])
+        return np.concatenate(scores), np.concatenate(mses)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+class RemoteIDSDetector(IDSDetector):
+    """
+    IDSDetector that scores on a ModelServer instead of loading the models.
+    Streak/diagnosis logic is unchanged; the AE threshold follows the server
+    and is refreshed whenever the server swaps models.
+    """
+
+    def __init__(self, client: ModelClient, **kwargs):
+        self.client = client
+        info = client.info()
+        if info["feature_cols"] != FEATURE_COLS:
+            raise ValueError(f"Model server features {info['feature_cols']} do not match {FEATURE_COLS}")
+        super().__init__(None, None, None, info["ae_threshold"], version=info.get("version", "artifacts"), **kwargs)
+        self.generation = info["generation"]
+
+    @classmethod
+    def connect(cls, path=DEFAULT_SOCKET, timeout=2.0, **kwargs):
+        return cls(ModelClient(path, timeout), **kwargs)
+
+    def _sync_generation(self):
+        if self.client.generation != self.generation:
+            info = self.client.info()
+            # Through swap_models so a cascade calibrated for the old models is dropped
+            self.swap_models(self.models._replace(ae_threshold=float(info["ae_threshold"]),
+                                                  version=info.get("version", "artifacts")))
+            self.generation = info["generation"]
+
+    def score_batch(self, features, models=None):
+        try:
+            scores, mses = self.client.score(np.asarray(features, dtype=np.float64))
+        except (OSError, ConnectionError):
+            # Server restarted: reconnect once and retry
+            self.client.connect()
+            scores, mses = self.client.score(np.asarray(features, dtype=np.float64))
+        self._sync_generation()
+        return scores, mses
+
+    def score(self, features, models=None):
+        t = time.perf_counter_ns()
+        if hasattr(features, "columns"):
+            features = features[FEATURE_COLS].to_numpy()
+        scores, mses = self.score_batch(features)
+        self._end_stage("remote", t)
+        ocsvm_score = float(scores[0])
+        return (-1 if ocsvm_score < 0 else 1), ocsvm_score, float(mses[0])
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm model server for the live IDS")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--model-dir", default=str(MODEL_DIR))
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT,
+                        help="Seconds to wait for concurrent requests to join a batch (default 0.001)")
+    parser.add_argument("--reload", action="store_true", help="Ask a running server to reload its models, then exit")
+    parser.add_argument("--info", action="store_true", help="Print a running server's model info, then exit")
+    args = parser.parse_args()
+
+    if args.reload or args.info:
+        try:
+            client = ModelClient(args.socket)
+        except OSError as e:
+            print(f"❌ Error: No model server on {args.socket} ({e}).")
+            sys.exit(1)
+        print(json.dumps(client.reload(args.model_dir) if args.reload else client.info(), indent=2))
+        client.close()
+        return
+
+    server = ModelServer(args.socket, args.model_dir, args.batch_wait)
+    print(f"🧠 Loading models from {args.model_dir}...", flush=True)
+    start = time.perf_counter()
+    try:
+        server.load()
+    except Exception as e:
+        print(f"❌ Setup Error: {e}")
+        sys.exit(1)
+    print(f"✅ Models loaded and warmed in {time.perf_counter() - start:.1f}s. Serving on {args.socket}", flush=True)
+
+    signal.signal(signal.SIGHUP, lambda *_: server.reload_async())
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+    print("\n🛑 Model Server Stopped.")
+
+if __name__ == "__main__":
+    main()
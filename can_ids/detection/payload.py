@@ -0,0 +1,257 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/payload.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.periodicity import N_SLOTS, EXTENDED_SLOT, frame_ids, id_slots, read_capture
+from can_ids.metrics import registry
+
+PAYLOAD_FILENAME = "ids_payload.npz"
+PAYLOAD_BYTES = 8 # Classic CAN; longer (FD) payloads are scored on their first 8 bytes
+PAYLOAD_COLS = ["byte_entropy", "bit_flip_rate", "out_of_range"]
+
+# === DEFAULTS ===
+QUANTILE = 0.999 # Benign window flip excess above this quantile (times MARGIN) is anomalous
+MARGIN = 1.5
+
+PAYLOAD_WINDOWS = registry.counter("ids_payload_anomalies_total", "Windows with out-of-range bytes or excess bit flips")
+
+def payload_matrix(payloads):
+    """(n, 8) uint8 matrix of zero-padded payloads and their lengths, from bytes-like objects."""
+    payloads = [bytes(p[:PAYLOAD_BYTES]) for p in payloads]
+    lengths = np.fromiter((len(p) for p in payloads), dtype=np.int64, count=len(payloads))
+    data = b"".join(p.ljust(PAYLOAD_BYTES, b"\0") for p in payloads)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, PAYLOAD_BYTES), lengths
+
+def hex_payload_matrix(hex_strings):
+    """payload_matrix() for the data_hex column of a parsed capture (NaN means an empty payload)."""
+    return payload_matrix([bytes.fromhex(x) if isinstance(x, str) else b"" for x in hex_strings])
+
+def byte_entropy(ids, matrix, lengths):
+    """
+    Mean Shannon entropy (bits) of the values seen at each (ID, byte
+    position) in one window. A fuzzed or spoofed byte that normally holds a
+    few values raises it even when the window volume does not change.
+    """
+    ids = id_slots(ids)
+    present = np.arange(PAYLOAD_BYTES) < np.asarray(lengths)[:, None]
+    if not present.any():
+        return 0.0
+    codes = (ids[:, None] * PAYLOAD_BYTES + np.arange(PAYLOAD_BYTES))[present]
+    keys, counts = np.unique(codes * 256 + matrix[present], return_counts=True)
+    cells, cell = np.unique(keys >> 8, return_inverse=True)
+    p = counts / np.bincount(cell, weights=counts)[cell]
+    return float(np.bincount(cell, weights=-p * np.log2(p)).mean())
+
+def cell_entropy(counts):
+    """byte_entropy() from value counts accumulated per cell, shape (cells, ..., 256)."""
+    counts = counts.reshape(-1, 256)
+    counts = counts[counts.sum(axis=1) > 0].astype(np.float64)
+    if not len(counts):
+        return 0.0
+    p = counts / counts.sum(axis=1, keepdims=True)
+    return float(-(p * np.log2(p, where=p > 0, out=np.zeros_like(p))).sum(axis=1).mean())
+
+class PayloadMonitor:
+    """
+    Per-ID payload content checks, stateful across windows.
+
+    The benign profile is a byte-value histogram per (ID, byte position),
+    stored compactly as [K+1, 8, 256] for the K IDs seen in training (one
+    extra slot for every other ID, which is never out of range: unknown IDs
+    are the periodicity check's job). Live state is the last payload of
+    every 11-bit ID, [2048 + 1, 8], so the bit-flip count of a frame against
+    the previous frame of the same ID is one XOR, even across windows. All
+    extended IDs share the last row and are never compared. All updates are
+    vectorized over a window.
+    """
+
+    def __init__(self, known_ids=(), hist=None, flip_mean=None, flip_threshold=np.inf):
+        self.known_ids = np.asarray(known_ids, dtype=np.int64)
+        k = len(self.known_ids)
+        self.index = np.full(N_SLOTS, k, dtype=np.int64)
+        self.index[self.known_ids] = np.arange(k)
+        self.hist = np.zeros((k + 1, PAYLOAD_BYTES, 256), dtype=np.uint32) if hist is None else hist
+        self.seen = self.hist > 0
+        self.seen[k] = True
+        self.flip_mean = np.zeros(N_SLOTS)
+        if flip_mean is not None: # Profiles saved before the extended slot have one entry per 11-bit ID
+            self.flip_mean[:len(flip_mean)] = flip_mean
+        self.flip_threshold = float(flip_threshold)
+        self.reset()
+
+    def reset(self):
+        self.last = np.zeros((N_SLOTS, PAYLOAD_BYTES), dtype=np.uint8)
+        self.last_len = np.full(N_SLOTS, -1, dtype=np.int64) # -1: no frame seen yet
+
+    # === OFFLINE PROFILE ===
+    @classmethod
+    def fit(cls, ids, matrix, lengths, timestamps=None, window=0.1, quantile=QUANTILE, margin=MARGIN):
+        """
+        Builds the histogram (one bincount over flattened cell/value codes)
+        and each ID's mean flipped bits per frame from a benign capture in
+        arrival order. With timestamps, the flip threshold is the `quantile`
+        of the benign per-window flip excess, times `margin`.
+        """
+        ids = id_slots(ids)
+        known = np.unique(ids)
+        known = known[known != EXTENDED_SLOT] # Extended IDs share the "other" slot
+        monitor = cls(known)
+        k = len(known)
+        present = np.arange(PAYLOAD_BYTES) < np.asarray(lengths)[:, None]
+        cells = (monitor.index[ids][:, None] * PAYLOAD_BYTES + np.arange(PAYLOAD_BYTES))[present]
+        hist = np.bincount(cells * 256 + matrix[present], minlength=(k + 1) * PAYLOAD_BYTES * 256)
+        flips, _ = monitor.scan(ids, matrix, lengths)
+        compared = ~np.isnan(flips)
+        flip_mean = np.zeros(N_SLOTS)
+        frames = np.bincount(ids[compared], minlength=N_SLOTS)
+        np.divide(np.bincount(ids[compared], weights=flips[compared], minlength=N_SLOTS), frames,
+                  out=flip_mean, where=frames > 0)
+
+        monitor = cls(known, hist.reshape(k + 1, PAYLOAD_BYTES, 256).astype(np.uint32), flip_mean)
+        if timestamps is not None:
+            excess = np.where(compared, flips - flip_mean[ids], 0.0)
+            window_ids = np.floor((np.asarray(timestamps) - timestamps[0]) / window).astype(np.int64)
+            _, window_ids = np.unique(window_ids, return_inverse=True) # Sessions may step back in time
+            per_window = np.bincount(window_ids, weights=excess)
+            monitor.flip_threshold = float(max(np.quantile(per_window, quantile), 1.0) * margin)
+        return monitor
+
+    def save(self, path):
+        np.savez(path, known_ids=self.known_ids, hist=self.hist, flip_mean=self.flip_mean,
+                 flip_threshold=self.flip_threshold)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["known_ids"], data["hist"], data["flip_mean"], float(data["flip_threshold"]))
+
+    # === LIVE ===
+    def scan(self, ids, matrix, lengths):
+        """
+        Scores one window of frames in arrival order. Returns (flips,
+        out_of_range): bits changed against the previous frame of the same
+        ID (NaN when there is none, or the length changed) and whether any
+        byte holds a value never seen at that position for that ID.
+        """
+        ids = id_slots(ids)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        n = len(ids)
+        if n == 0:
+            return np.zeros(0), np.zeros(0, dtype=bool)
+
+        order = np.argsort(ids, kind="stable")
+        sid, smat, slen = ids[order], matrix[order], lengths[order]
+        first = np.r_[True, sid[1:] != sid[:-1]]
+        prev = np.empty_like(smat)
+        prev[1:] = smat[:-1]
+        prev[first] = self.last[sid[first]]
+        prev_len = np.empty_like(slen)
+        prev_len[1:] = slen[:-1]
+        prev_len[first] = self.last_len[sid[first]]
+        flipped = np.unpackbits(smat ^ prev, axis=1).sum(axis=1).astype(np.float64)
+        flipped[(prev_len != slen) | (sid == EXTENDED_SLOT)] = np.nan
+
+        last = np.r_[first[1:], True]
+        self.last[sid[last]] = smat[last]
+        self.last_len[sid[last]] = slen[last]
+
+        flips = np.empty(n)
+        flips[order] = flipped
+        present = np.arange(PAYLOAD_BYTES) < lengths[:, None]
+        unseen = ~self.seen[self.index[ids][:, None], np.arange(PAYLOAD_BYTES), matrix] & present
+        return flips, unseen.any(axis=1)
+
+    def sums(self, ids, matrix, lengths):
+        """
+        scan() reduced to additive totals, so a window can be scored in
+        chunks: (flipped bits, compared bits, flip excess over the benign
+        per-ID means, frames with an unseen byte value).
+        """
+        ids = id_slots(ids)
+        flips, unseen = self.scan(ids, matrix, lengths)
+        compared = ~np.isnan(flips)
+        flipped = float(flips[compared].sum())
+        excess = flipped - float(self.flip_mean[ids[compared]].sum())
+        return flipped, 8 * int(np.asarray(lengths)[compared].sum()), excess, int(unseen.sum())
+
+    def count_cells(self, ids, matrix, lengths, counts):
+        """Adds the byte values of these frames to `counts`, shape [K+1, 8, 256] (see cell_entropy())."""
+        present = np.arange(PAYLOAD_BYTES) < np.asarray(lengths)[:, None]
+        cells = (self.index[id_slots(ids)][:, None] * PAYLOAD_BYTES +
+                 np.arange(PAYLOAD_BYTES))[present]
+        counts += np.bincount(cells * 256 + matrix[present], minlength=counts.size).reshape(counts.shape)
+
+    @staticmethod
+    def features(entropy, flipped, bits, excess, unseen, frames):
+        """(byte_entropy, bit_flip_rate, out_of_range, flip_excess) from window totals."""
+        return entropy, flipped / bits if bits else 0.0, unseen / frames if frames else 0.0, excess
+
+    def window_features(self, ids, matrix, lengths):
+        """
+        PAYLOAD_COLS for one window plus the flip excess:
+        (byte_entropy, bit_flip_rate, out_of_range, flip_excess).
+        bit_flip_rate is flipped bits per compared bit; out_of_range is the
+        fraction of frames holding an unseen byte value.
+        """
+        return self.features(byte_entropy(ids, matrix, lengths), *self.sums(ids, matrix, lengths), len(ids))
+
+    def message_features(self, messages):
+        """window_features() for a list of can.Message."""
+        matrix, lengths = payload_matrix([m.data for m in messages])
+        return self.window_features(frame_ids(messages), matrix, lengths)
+
+    def is_anomalous(self, out_of_range, excess):
+        anomalous = out_of_range > 0 or excess > self.flip_threshold
+        if anomalous:
+            PAYLOAD_WINDOWS.inc()
+        return anomalous
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn per-ID payload byte profiles from a benign capture and test them on a labelled one")
+    parser.add_argument("train_csv", help="Parsed capture (parse_can_log.py output); only label 0 frames are used")
+    parser.add_argument("--test", default=None, help="Labelled parsed capture to report window-level detection on")
+    parser.add_argument("--out", default=None, help="Profile path (default <model dir>/ids_payload.npz)")
+    parser.add_argument("--window", type=float, default=0.1)
+    args = parser.parse_args()
+
+    import pandas as pd
+    from can_ids.detection.detector import MODEL_DIR
+
+    def load(path):
+        ids, timestamps, labels = read_capture(path)
+        matrix, lengths = hex_payload_matrix(pd.read_csv(path, usecols=["data_hex"], dtype=str)["data_hex"])
+        return ids, timestamps, labels, matrix, lengths
+
+    ids, timestamps, labels, matrix, lengths = load(args.train_csv)
+    benign = labels == 0
+    monitor = PayloadMonitor.fit(ids[benign], matrix[benign], lengths[benign], timestamps[benign], args.window)
+    out = Path(args.out or MODEL_DIR / PAYLOAD_FILENAME)
+    monitor.save(out)
+    print(f"✅ Profiled {len(monitor.known_ids)} IDs from {int(benign.sum())} benign frames -> {out}")
+    for can_id in monitor.known_ids:
+        cells = monitor.seen[monitor.index[can_id]].sum(axis=1)
+        print(f"   0x{can_id:03X}: values per byte {cells.tolist()}, {monitor.flip_mean[can_id]:.2f} bits flipped per frame")
+    print(f"   Flip excess threshold: {monitor.flip_threshold:.1f} bits/window")
+
+    if args.test:
+        ids, timestamps, labels, matrix, lengths = load(args.test)
+        monitor = PayloadMonitor.load(out)
+        edges = np.searchsorted(timestamps, np.arange(timestamps[0], timestamps[-1] + args.window, args.window), side="right")
+        flagged, attack, start = [], [], 0
+        for end in edges:
+            if end > start:
+                _, _, out_of_range, excess = monitor.window_features(ids[start:end], matrix[start:end], lengths[start:end])
+                flagged.append(monitor.is_anomalous(out_of_range, excess))
+                attack.append(labels[start:end].any())
+                start = end
+        flagged, attack = np.array(flagged), np.array(attack)
+        print(f"\n📊 Window-level on {args.test}: flagged {flagged[attack].mean():.1%} of {int(attack.sum())} attack windows, "
+              f"{flagged[~attack].mean():.2%} of {int((~attack).sum())} benign windows")
+
+if __name__ == "__main__":
+    main()
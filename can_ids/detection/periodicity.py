@@ -0,0 +1,330 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/periodicity.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.metrics import registry
+
+PERIODICITY_FILENAME = "ids_periodicity.npz"
+N_IDS = 2048 # Every 11-bit arbitration ID has a slot
+EXTENDED_SLOT = N_IDS # One more slot shared by every 29-bit ID: never profiled, so always unknown
+N_SLOTS = N_IDS + 1
+CAN_EFF_FLAG = 0x80000000 # Marks a 29-bit ID in an integer, as in SocketCAN
+
+# === DEFAULTS ===
+ALPHA = 0.05 # EWMA weight of the newest inter-arrival time
+EARLY_K = 4.0 # A frame is early when its IAT is this many deviations below the period
+LEARN_K = 2.0 # Once trained, only IATs within this many deviations of the period update it
+DEV_FLOOR = 0.1 # Deviation never counts as less than this fraction of the period (scheduler jitter)
+WARMUP = 16 # IATs an ID needs before it can be flagged early (online learning only)
+LEARN_SECONDS = 10.0 # Without a profile: IDs first seen after this long are flagged as unknown
+MIN_EARLY = 2 # Early frames in a window before the window counts as a timing anomaly
+
+def frame_ids(messages):
+    """Integer IDs of can.Message frames, with CAN_EFF_FLAG set on extended (29-bit) ones."""
+    return [m.arbitration_id | CAN_EFF_FLAG if m.is_extended_id else m.arbitration_id for m in messages]
+
+def id_slots(ids):
+    """
+    State slot of every ID: its own below 0x800, EXTENDED_SLOT for anything
+    wider (CAN_EFF_FLAG set, or a 29-bit value from a parsed capture), so an
+    extended frame such as 0x10000310 never touches 0x310's state.
+    """
+    return np.minimum(np.asarray(ids, dtype=np.int64), EXTENDED_SLOT)
+
+EARLY_FRAMES = registry.counter("ids_periodicity_early_frames_total", "Frames that arrived well ahead of their ID's period")
+UNKNOWN_FRAMES = registry.counter("ids_periodicity_unknown_frames_total", "Frames from IDs outside the learned set")
+
+class PeriodicityDetector:
+    """
+    Frame-level timing check per arbitration ID.
+
+    State lives in preallocated arrays indexed by the 11-bit ID, plus one
+    slot for all extended IDs (last timestamp, EWMA period, EWMA absolute
+    deviation, IAT count, known flag), so scoring a frame is a few array
+    reads with no dict lookups. scan()
+    takes a whole window at once: frames are grouped by ID with one stable
+    sort, each IAT is scored against the period as it stood at the start of
+    the window, and the EWMAs are then advanced in closed form. Early frames
+    are left out of the IAT chain and never update the period, so an
+    injection cannot teach the detector its own rate.
+    """
+
+    def __init__(self, alpha=ALPHA, early_k=EARLY_K, learn_k=LEARN_K, dev_floor=DEV_FLOOR, warmup=WARMUP,
+                 learn_seconds=LEARN_SECONDS, min_early=MIN_EARLY):
+        self.alpha = alpha
+        self.early_k = early_k
+        self.learn_k = learn_k
+        self.dev_floor = dev_floor
+        self.warmup = warmup
+        self.learn_seconds = learn_seconds
+        self.min_early = min_early
+        self.last_ts = np.full(N_SLOTS, np.nan)
+        self.period = np.zeros(N_SLOTS)
+        self.dev = np.zeros(N_SLOTS)
+        self.count = np.zeros(N_SLOTS, dtype=np.int64)
+        self.known = np.zeros(N_SLOTS, dtype=bool)
+        self.profiled = False # True once fit()/load() has fixed the known set
+        self.learn_until = None
+
+    # === OFFLINE PROFILE ===
+    def fit(self, ids, timestamps, max_gap=10.0):
+        """
+        Learns per-ID period (median IAT) and deviation (scaled MAD) from a
+        benign capture, vectorized over any number of frames. IATs longer than
+        `max_gap` periods are capture gaps and are ignored.
+        """
+        ids = id_slots(ids)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        order = np.lexsort((timestamps, ids))
+        ids, timestamps = ids[order], timestamps[order]
+        same = ids[1:] == ids[:-1]
+        iat_ids, iats = ids[1:][same], np.diff(timestamps)[same]
+
+        median = self._group_median(iat_ids, iats)
+        keep = iats <= max_gap * median[iat_ids]
+        iat_ids, iats = iat_ids[keep], iats[keep]
+        median = self._group_median(iat_ids, iats)
+        mad = self._group_median(iat_ids, np.abs(iats - median[iat_ids])) * 1.4826
+
+        self.known[:] = False
+        self.known[ids] = True
+        self.known[EXTENDED_SLOT] = False
+        self.count[:] = np.bincount(iat_ids, minlength=N_SLOTS)
+        self.period[:] = median
+        self.dev[:] = mad
+        self.last_ts[:] = np.nan
+        self.profiled = True
+        return self
+
+    @staticmethod
+    def _group_median(ids, values):
+        """Median of `values` per ID, as a dense N_SLOTS array (0 for absent IDs)."""
+        out = np.zeros(N_SLOTS)
+        if not len(values):
+            return out
+        order = np.lexsort((values, ids))
+        ids, values = ids[order], values[order]
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        counts = np.diff(np.r_[starts, len(ids)])
+        out[ids[starts]] = values[starts + (counts - 1) // 2]
+        return out
+
+    def save(self, path):
+        # The extended slot is never profiled: the file keeps one entry per 11-bit ID
+        np.savez(path, period=self.period[:N_IDS], dev=self.dev[:N_IDS], count=self.count[:N_IDS],
+                 known=self.known[:N_IDS], params=np.array([self.alpha, self.early_k, self.learn_k, self.dev_floor, self.min_early]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            alpha, early_k, learn_k, dev_floor, min_early = data["params"]
+            detector = cls(alpha=alpha, early_k=early_k, learn_k=learn_k, dev_floor=dev_floor, min_early=int(min_early))
+            detector.period[:N_IDS] = data["period"]
+            detector.dev[:N_IDS] = data["dev"]
+            detector.count[:N_IDS] = data["count"]
+            detector.known[:N_IDS] = data["known"]
+        detector.profiled = True
+        return detector
+
+    # === LIVE ===
+    def scan(self, ids, timestamps):
+        """
+        Scores one window of frames (arrays in arrival order). Returns
+        (early, unknown): boolean arrays, one entry per frame.
+        """
+        ids = id_slots(ids)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        n = len(ids)
+        if n == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+
+        if not self.profiled:
+            if self.learn_until is None:
+                self.learn_until = timestamps[0] + self.learn_seconds
+            if timestamps[-1] <= self.learn_until:
+                self.known[ids] = True
+                self.known[EXTENDED_SLOT] = False
+        unknown = ~self.known[ids]
+
+        # Group by ID, keeping arrival order inside each group
+        order = np.argsort(ids, kind="stable")
+        sid, sts = ids[order], timestamps[order]
+        first = np.r_[True, sid[1:] != sid[:-1]]
+        period, dev = self.period[sid], self.dev[sid]
+        scale = np.maximum(dev, self.dev_floor * period)
+        limit = period - self.early_k * scale
+        trained = self.count[sid] >= self.warmup
+
+        prev = np.empty(n)
+        prev[1:] = sts[:-1]
+        prev[first] = self.last_ts[sid[first]]
+        iat = sts - prev # NaN for an ID's very first frame
+        with np.errstate(invalid="ignore"):
+            early_sorted = trained & (iat >= 0) & (iat < limit) # A negative IAT is a clock restart, not an attack
+        if early_sorted.any():
+            self._rechain(sid, sts, first, trained, limit, iat, early_sorted)
+
+        # Advance the state with the frames that looked normal
+        accepted = ~early_sorted
+        last = np.r_[first[1:], True] & accepted
+        self.last_ts[sid[last]] = sts[last]
+        # Once an ID is trained, only IATs well inside the band move its period:
+        # frames let through just past the limit, or after a gap, would drag it along
+        with np.errstate(invalid="ignore"):
+            in_band = ~trained | (np.abs(iat - period) <= self.learn_k * scale)
+        learn = (iat >= 0) & accepted & in_band & (sid != EXTENDED_SLOT) # The shared slot has no period
+        if learn.any():
+            self._learn(sid[learn], iat[learn], period[learn])
+
+        early = np.empty(n, dtype=bool)
+        early[order] = early_sorted
+        n_early, n_unknown = int(early.sum()), int(unknown.sum())
+        if n_early:
+            EARLY_FRAMES.inc(n_early)
+        if n_unknown:
+            UNKNOWN_FRAMES.inc(n_unknown)
+        return early, unknown
+
+    def _rechain(self, sid, sts, first, trained, limit, iat, early):
+        """
+        IATs should run from the previous *accepted* frame of the same ID, so
+        the genuine frame right after an injected one is not blamed for it.
+        That only differs from the plain diff for IDs with an early frame in
+        this window (in place on iat/early). Their accepted frames form a
+        greedy chain, each the first frame at least `limit` after the one
+        before, so one searchsorted finds every frame's successor, and all
+        chains are followed at once: one step per accepted (genuine) frame of
+        the longest chain, however many frames an injection or flood adds.
+        IDs whose timestamps step back (a clock restart) break the chain and
+        are walked frame by frame instead.
+        """
+        group = np.cumsum(first) - 1
+        starts = np.flatnonzero(first)
+        ends = np.r_[starts[1:], len(sid)]
+        redo = np.zeros(len(starts), dtype=bool)
+        redo[group[early]] = True
+        prev = self.last_ts[sid[starts]]
+        with np.errstate(invalid="ignore"):
+            back = np.bincount(group[1:][(np.diff(sts) < 0) & ~first[1:]], minlength=len(starts)) > 0
+            back |= sts[starts] < prev
+        for g in np.flatnonzero(redo & back):
+            last = prev[g]
+            for i in range(starts[g], ends[g]):
+                iat[i] = sts[i] - last
+                early[i] = trained[i] and 0 <= iat[i] < limit[i]
+                if not early[i]:
+                    last = sts[i]
+
+        rows = np.flatnonzero((redo & ~back)[group])
+        if not len(rows):
+            return
+        g, ts, lim = group[rows], sts[rows], limit[rows]
+        m = len(rows)
+        local = np.r_[True, g[1:] != g[:-1]]
+        gstart = np.flatnonzero(local)
+        gid = np.cumsum(local) - 1
+        gend = np.r_[gstart[1:], m][gid]
+        # One sorted key across IDs: each ID's times shifted past the previous ID's
+        t0 = ts.min()
+        span = ts.max() - t0 + lim.max() + 1.0
+        key = ts - t0 + gid * span
+        succ = np.searchsorted(key, key + lim)
+        succ[succ >= gend] = m # No successor: the sentinel
+        last = prev[g[gstart]]
+        head = np.where(np.isnan(last), gstart,
+                        np.searchsorted(key, last - t0 + np.arange(len(gstart)) * span + lim[gstart]))
+        head = head[head < np.r_[gstart[1:], m]]
+
+        accepted = np.zeros(m, dtype=bool)
+        while len(head):
+            accepted[head] = True
+            head = succ[head]
+            head = head[head < m]
+
+        before = np.maximum.accumulate(np.r_[-1, np.where(accepted, np.arange(m), -1)[:-1]])
+        valid = before >= gstart[gid]
+        iat[rows] = ts - np.where(valid, ts[np.maximum(before, 0)], last[gid])
+        early[rows] = ~accepted
+
+    def _learn(self, ids, iats, start_period):
+        """
+        m EWMA steps per ID in closed form: the j-th of m new IATs carries
+        weight alpha*(1-alpha)^(m-1-j), and the old value (1-alpha)^m. An ID's
+        first IATs seed the period directly.
+        """
+        a = self.alpha
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        counts = np.diff(np.r_[starts, len(ids)])
+        group = np.repeat(np.arange(len(starts)), counts)
+        from_end = np.repeat(starts + counts, counts) - np.arange(len(ids)) - 1
+        weights = a * (1 - a) ** from_end
+        keep = (1 - a) ** counts
+        gid = ids[starts]
+
+        fresh = self.count[gid] == 0
+        base_period = np.where(fresh, iats[starts], self.period[gid])
+        base_dev = np.where(fresh, 0.0, self.dev[gid])
+        deviation = np.abs(iats - np.where(np.repeat(fresh, counts), iats[np.repeat(starts, counts)], start_period))
+        self.period[gid] = keep * base_period + np.bincount(group, weights * iats, len(starts))
+        self.dev[gid] = keep * base_dev + np.bincount(group, weights * deviation, len(starts))
+        self.count[gid] += counts
+
+    def window_flags(self, messages):
+        """scan() for a list of can.Message. Returns (early_frames, unknown_frames) counts."""
+        early, unknown = self.scan(frame_ids(messages), [m.timestamp for m in messages])
+        return int(early.sum()), int(unknown.sum())
+
+    def is_anomalous(self, early_frames, unknown_frames):
+        return early_frames >= self.min_early or unknown_frames > 0
+
+def read_capture(path):
+    """(ids, timestamps, labels) from a parsed CSV; IDs there are hex text."""
+    import pandas as pd
+    df = pd.read_csv(path, dtype={"arbitration_id": str})
+    # Parse each distinct hex ID once, not once per frame
+    unique, inverse = np.unique(df["arbitration_id"].to_numpy(dtype=str), return_inverse=True)
+    ids = np.array([int(x, 16) for x in unique], dtype=np.int64)[inverse]
+    labels = df["label"].to_numpy() if "label" in df else np.zeros(len(df), dtype=int)
+    return ids, df["timestamp"].to_numpy(dtype=np.float64), labels
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn per-ID periods from a benign capture and test them on a labelled one")
+    parser.add_argument("train_csv", help="Parsed capture (parse_can_log.py output); only label 0 frames are used")
+    parser.add_argument("--test", default=None, help="Labelled parsed capture to report frame-level detection on")
+    parser.add_argument("--out", default=None, help="Profile path (default <model dir>/ids_periodicity.npz)")
+    parser.add_argument("--window", type=float, default=0.1)
+    args = parser.parse_args()
+
+    from can_ids.detection.detector import MODEL_DIR
+    ids, timestamps, labels = read_capture(args.train_csv)
+    benign = labels == 0
+    detector = PeriodicityDetector().fit(ids[benign], timestamps[benign])
+    out = Path(args.out or MODEL_DIR / PERIODICITY_FILENAME)
+    detector.save(out)
+    print(f"✅ Learned {int(detector.known.sum())} IDs from {int(benign.sum())} benign frames -> {out}")
+    for can_id in np.flatnonzero(detector.known):
+        print(f"   0x{can_id:03X}: period {detector.period[can_id] * 1000:7.1f} ms, deviation {detector.dev[can_id] * 1000:6.2f} ms")
+
+    if args.test:
+        ids, timestamps, labels = read_capture(args.test)
+        detector = PeriodicityDetector.load(out)
+        flagged = np.zeros(len(ids), dtype=bool)
+        # Replay in windows, as the live IDS would
+        edges = np.searchsorted(timestamps, np.arange(timestamps[0], timestamps[-1] + args.window, args.window), side="right")
+        start = 0
+        for end in edges:
+            if end > start:
+                early, unknown = detector.scan(ids[start:end], timestamps[start:end])
+                flagged[start:end] = early | unknown
+                start = end
+        attack = labels == 1
+        print(f"\n📊 Frame-level on {args.test}: flagged {flagged[attack].mean():.1%} of {int(attack.sum())} attack frames, "
+              f"{flagged[~attack].mean():.2%} of {int((~attack).sum())} benign frames")
+
+if __name__ == "__main__":
+    main()
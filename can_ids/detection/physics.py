@@ -0,0 +1,160 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/physics.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.periodicity import frame_ids, id_slots, read_capture
+from can_ids.detection.payload import payload_matrix, hex_payload_matrix
+from can_ids.metrics import registry
+
+# === SIGNALS (encodings from simulation/virtual_ecu.py) ===
+RPM_ID = 0x123 # Bytes 0-1 big-endian, 0.25 RPM/bit
+GEAR_ID = 0x310 # Byte 0
+BRAKE_ID = 0x240 # Byte 0, 1 while braking
+RPM_SCALE = 0.25
+
+# === RULES (from simulation/vehicle_fsm.py and test_physics.py) ===
+# Outside the anomaly reaction the FSM idles at 800 +-50 in gear 0, shifts up
+# above 3500 (-1000) and down below 1500 (+800), so every gear has an RPM band;
+# margins cover one frame of lag between the latest RPM and gear values.
+GEAR_RPM_BANDS = np.array([
+    [650, 1000], # 0: idle
+    [650, 3700], # 1: pulls away from idle, brakes down to idle
+    [1100, 3700], # 2-5
+    [1100, 3700],
+    [1100, 3700],
+    [1100, 3700],
+], dtype=np.float64)
+UPDATE_PERIOD = 0.1 # The FSM steps every 100 ms
+MAX_RPM_STEP = 1100 # Largest RPM change in one FSM step (upshift: +120 - 1000)
+MIN_SHIFT_INTERVAL = 0.4 # Fastest sequence of shifts (braking: 4 steps of -200 after the +800)
+MIN_VIOLATIONS = 2 # Violating frames per window before it is anomalous; single frames are signal lag
+
+PHYSICS_WINDOWS = registry.counter("ids_physics_anomalies_total", "Windows whose RPM/gear/brake signals break the vehicle physics")
+
+class PhysicsChecker:
+    """
+    Cross-signal consistency of the decoded vehicle signals, stateful across
+    windows.
+
+    Keeps the latest RPM, gear and brake values (and when RPM and gear were
+    last seen), decodes a whole window of frames at once and checks every
+    RPM and gear frame against the latest value of the others:
+      band   RPM outside the band of the current gear (or an unknown gear)
+      rpm    RPM moved more than MAX_RPM_STEP per FSM step since the last frame
+      gear   gear skipped a step faster than the FSM can shift
+      brake  upshift while the brake is on
+    The latest-value join is a running maximum over frame positions, so a
+    window costs a few array operations however many frames it holds.
+    """
+
+    def __init__(self, bands=GEAR_RPM_BANDS, max_rpm_step=MAX_RPM_STEP, min_violations=MIN_VIOLATIONS):
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.max_rpm_step = float(max_rpm_step)
+        self.min_violations = int(min_violations)
+        self.reset()
+
+    def reset(self):
+        self.rpm = self.gear = self.brake = np.nan # Latest values, NaN before the first frame
+        self.rpm_ts = self.gear_ts = np.nan
+
+    def _latest(self, mask, values, carry):
+        """Latest value at every frame position (the frame's own if it carries the signal)."""
+        pos = np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+        return np.where(pos >= 0, values[np.maximum(pos, 0)], carry)
+
+    def _step(self, mask, values, ts, last, last_ts):
+        """(previous value, seconds since it) for the frames carrying one signal."""
+        v, t = values[mask], ts[mask]
+        return np.r_[last, v[:-1]], t - np.r_[last_ts, t[:-1]]
+
+    def scan(self, ids, timestamps, matrix, lengths):
+        """
+        Checks one window of frames in arrival order. Returns a per-frame
+        boolean array of rule violations (only RPM and gear frames can
+        violate) and the violations per rule as a dict.
+        """
+        ids = id_slots(ids) # An extended 0x10000310 is not a gear frame
+        ts = np.asarray(timestamps, dtype=np.float64)
+        lengths = np.asarray(lengths)
+        n = len(ids)
+        counts = dict.fromkeys(("band", "rpm", "gear", "brake"), 0)
+        if n == 0:
+            return np.zeros(0, dtype=bool), counts
+
+        is_rpm = (ids == RPM_ID) & (lengths >= 2)
+        is_gear = (ids == GEAR_ID) & (lengths >= 1)
+        is_brake = (ids == BRAKE_ID) & (lengths >= 1)
+        values = matrix[:, 0].astype(np.float64)
+        rpm_values = (values * 256 + matrix[:, 1]) * RPM_SCALE
+
+        rpm = self._latest(is_rpm, rpm_values, self.rpm)
+        gear = self._latest(is_gear, values, self.gear)
+        brake = self._latest(is_brake, values, self.brake)
+
+        checked = (is_rpm | is_gear) & ~np.isnan(rpm) & ~np.isnan(gear)
+        band_gear = np.clip(np.nan_to_num(gear), 0, len(self.bands) - 1).astype(np.int64)
+        band = checked & ((gear != band_gear) | (rpm < self.bands[band_gear, 0]) | (rpm > self.bands[band_gear, 1]))
+
+        violations = band.copy()
+        # Steps are only checked forward in time; a capture that jumps back starts over
+        prev, dt = self._step(is_rpm, rpm_values, ts, self.rpm, self.rpm_ts)
+        allowed = self.max_rpm_step * np.maximum(1.0, np.ceil(dt / UPDATE_PERIOD))
+        rpm_jump = (dt >= 0) & (np.abs(rpm_values[is_rpm] - prev) > allowed)
+        violations[np.flatnonzero(is_rpm)[rpm_jump]] = True
+
+        prev, dt = self._step(is_gear, values, ts, self.gear, self.gear_ts)
+        shift = values[is_gear] - prev
+        gear_skip = (dt >= 0) & (np.abs(shift) > 1 + np.floor(dt / MIN_SHIFT_INTERVAL))
+        braking_upshift = (shift > 0) & (brake[is_gear] == 1)
+        violations[np.flatnonzero(is_gear)[gear_skip | braking_upshift]] = True
+
+        counts.update(band=int(band.sum()), rpm=int(rpm_jump.sum()), gear=int(gear_skip.sum()),
+                      brake=int(braking_upshift.sum()))
+        self.rpm, self.gear, self.brake = rpm[-1], gear[-1], brake[-1]
+        if is_rpm.any():
+            self.rpm_ts = ts[np.flatnonzero(is_rpm)[-1]]
+        if is_gear.any():
+            self.gear_ts = ts[np.flatnonzero(is_gear)[-1]]
+        return violations, counts
+
+    def window_score(self, messages):
+        """Violating frames in one window of can.Message (the physics_score feature)."""
+        matrix, lengths = payload_matrix([m.data for m in messages])
+        violations, _ = self.scan(frame_ids(messages), [m.timestamp for m in messages],
+                                  matrix, lengths)
+        return int(violations.sum())
+
+    def is_anomalous(self, score):
+        anomalous = score >= self.min_violations
+        if anomalous:
+            PHYSICS_WINDOWS.inc()
+        return anomalous
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a parsed capture against the vehicle physics rules")
+    parser.add_argument("input_csv", help="Parsed capture (parse_can_log.py output)")
+    parser.add_argument("--window", type=float, default=0.1)
+    args = parser.parse_args()
+
+    import pandas as pd
+    ids, timestamps, labels = read_capture(args.input_csv)
+    matrix, lengths = hex_payload_matrix(pd.read_csv(args.input_csv, usecols=["data_hex"], dtype=str)["data_hex"])
+    checker = PhysicsChecker()
+    violations, counts = checker.scan(ids, timestamps, matrix, lengths)
+    print(f"📊 {int(violations.sum())} of {len(ids)} frames break the physics rules: "
+          + ", ".join(f"{rule} {count}" for rule, count in counts.items()))
+
+    window_ids = np.floor((timestamps - timestamps[0]) / args.window).astype(np.int64)
+    _, window_ids = np.unique(window_ids, return_inverse=True) # Sessions may step back in time
+    scores = np.bincount(window_ids, weights=violations)
+    attack = np.bincount(window_ids, weights=labels) > 0
+    flagged = scores >= checker.min_violations
+    print(f"   Window-level: flagged {flagged[attack].mean():.1%} of {int(attack.sum())} attack windows, "
+          f"{flagged[~attack].mean():.2%} of {int((~attack).sum())} benign windows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import os
+import sys
+import math
+import argparse
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/sketch.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.features import FEATURE_COLS, window_feature_vector
+from can_ids.detection.periodicity import N_SLOTS, CAN_EFF_FLAG, id_slots
+from can_ids.detection.payload import PAYLOAD_BYTES, cell_entropy
+
+# === DEFAULTS ===
+CHUNK = 1024 # Frames staged before they are folded into the sketches in one vectorized step
+HLL_BITS = 10 # 2^10 one-byte HyperLogLog registers: ~3.3% standard error on distinct payloads
+TOP_K = 256 # Payloads tracked exactly (space-saving style); windows with fewer distinct payloads are exact
+
+_U64 = np.uint64
+_HLL_M = 1 << HLL_BITS
+_HLL_ALPHA = 0.7213 / (1 + 1.079 / _HLL_M)
+
+class SketchWindow:
+    """
+    Bounded-memory window accumulator: the live feature backend for flood
+    conditions, when a window can hold thousands of frames.
+
+    add() copies three numbers per frame into preallocated staging arrays;
+    every CHUNK frames (and when the window closes) they are folded into
+    fixed-size state with a few vectorized operations. Nothing grows with
+    the number of frames or distinct payloads, so memory is capped at about
+    40 KiB per accumulator whatever the bus does.
+
+    Accuracy against window_feature_vector() (see `python -m
+    can_ids.detection.sketch` for a measurement on a capture):
+      msg_count, iat_mean, iat_std  exact (running sums / Chan's merge)
+      unique_ids, id_entropy        exact for 11-bit IDs (one counter per ID);
+                                    all 29-bit IDs share one counter
+      payload_entropy               exact while a window has at most TOP_K
+                                    distinct payloads (every benign window);
+                                    beyond that the untracked mass is spread
+                                    uniformly over the HyperLogLog estimate of
+                                    the remaining distinct payloads, which is
+                                    exact for uniform fuzzing and an upper
+                                    bound otherwise
+    The periodicity check and the transition model, if given, are fed the
+    staged IDs and timestamps chunk by chunk; the payload and physics checks,
+    if given, the staged payload bytes. byte_entropy is exact for the IDs
+    the payload check was profiled on; all other IDs share one set of byte
+    histograms.
+    """
+
+    def __init__(self, periodicity=None, transitions=None, payload=None, physics=None, chunk=CHUNK, top_k=TOP_K):
+        self.periodicity = periodicity
+        self.transitions = transitions
+        self.payload = payload
+        self.physics = physics
+        self._stage_data = payload is not None or physics is not None
+        self.chunk = chunk
+        self.top_k = top_k
+        self._ids = np.zeros(chunk, dtype=np.int64)
+        self._ts = np.zeros(chunk, dtype=np.float64)
+        self._keys = np.zeros(chunk, dtype=np.int64) # Payload hashes
+        if self._stage_data:
+            self._data = np.zeros((chunk, PAYLOAD_BYTES), dtype=np.uint8)
+            self._lens = np.zeros(chunk, dtype=np.int64)
+        if payload is not None:
+            self.byte_counts = np.zeros((len(payload.known_ids) + 1, PAYLOAD_BYTES, 256), dtype=np.int64)
+        self._staged = 0
+        self.id_counts = np.zeros(N_SLOTS, dtype=np.int64)
+        self.registers = np.zeros(_HLL_M, dtype=np.uint8)
+        self.top_keys = np.zeros(0, dtype=np.int64)
+        self.top_counts = np.zeros(0, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """Starts a new window; the arrays are reused, not reallocated."""
+        self._staged = 0
+        self.count = 0
+        self.first_ts = self.last_ts = None
+        self.iat_mean = self.iat_m2 = 0.0
+        self.id_counts[:] = 0
+        self.registers[:] = 0
+        self.top_keys = self.top_keys[:0]
+        self.top_counts = self.top_counts[:0]
+        self.early_frames = self.unknown_ids = 0
+        self.sequence_score = 0.0
+        self.physics_score = 0
+        if self.payload is not None:
+            self.byte_counts[:] = 0
+            self.payload_sums = np.zeros(4) # Flipped bits, compared bits, flip excess, unseen frames
+
+    def add(self, msg):
+        i = self._staged
+        self._ids[i] = msg.arbitration_id | CAN_EFF_FLAG if msg.is_extended_id else msg.arbitration_id
+        self._ts[i] = msg.timestamp
+        self._keys[i] = hash(bytes(msg.data))
+        if self._stage_data:
+            data = msg.data[:PAYLOAD_BYTES]
+            self._data[i, :len(data)] = data
+            self._data[i, len(data):] = 0
+            self._lens[i] = len(data)
+        self._staged = i + 1
+        if self._staged == self.chunk:
+            self._fold()
+
+    def _fold(self):
+        n = self._staged
+        if not n:
+            return
+        ids = id_slots(self._ids[:n])
+        ts = self._ts[:n]
+        keys = self._keys[:n]
+
+        # Timing: IATs of this chunk, plus the one across the previous chunk boundary
+        iats = np.diff(ts) if self.last_ts is None else np.diff(ts, prepend=self.last_ts)
+        if self.first_ts is None:
+            self.first_ts = ts[0]
+        self.last_ts = ts[-1]
+        if len(iats):
+            self._merge_iats(len(iats), float(iats.mean()), float(((iats - iats.mean()) ** 2).sum()))
+        self.count += n
+
+        self.id_counts += np.bincount(ids, minlength=N_SLOTS)
+        self._update_hll(keys)
+        self._update_top(keys)
+
+        if self.periodicity is not None:
+            early, unknown = self.periodicity.scan(ids, ts)
+            self.early_frames += int(early.sum())
+            self.unknown_ids += int(unknown.sum())
+        if self.transitions is not None:
+            self.sequence_score = max(self.sequence_score, self.transitions.score_ids(ids))
+        if self.payload is not None:
+            data, lens = self._data[:n], self._lens[:n]
+            self.payload.count_cells(ids, data, lens, self.byte_counts)
+            self.payload_sums += self.payload.sums(ids, data, lens)
+        if self.physics is not None:
+            violations, _ = self.physics.scan(ids, ts, self._data[:n], self._lens[:n])
+            self.physics_score += int(violations.sum())
+        self._staged = 0
+
+    def _merge_iats(self, n, mean, m2):
+        """Chan et al. parallel merge of (count, mean, M2) for the IATs."""
+        total = self.count - 1 if self.count else 0 # IATs folded so far
+        if total <= 0:
+            self.iat_mean, self.iat_m2 = mean, m2
+            return
+        delta = mean - self.iat_mean
+        combined = total + n
+        self.iat_mean += delta * n / combined
+        self.iat_m2 += m2 + delta * delta * total * n / combined
+
+    def _update_hll(self, keys):
+        h = keys.view(_U64)
+        index = (h >> _U64(64 - HLL_BITS)).astype(np.int64)
+        low = (h & _U64(0xFFFFFFFF)).astype(np.float64) # Rank from the low 32 bits (exact in float64)
+        rank = np.where(low > 0, 32 - np.floor(np.log2(np.maximum(low, 1))), 33).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def distinct_payloads(self):
+        """HyperLogLog estimate, with linear counting for small cardinalities."""
+        estimate = _HLL_ALPHA * _HLL_M * _HLL_M / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * _HLL_M and zeros:
+            estimate = _HLL_M * math.log(_HLL_M / zeros)
+        return estimate
+
+    def _update_top(self, keys):
+        keys, counts = np.unique(keys, return_counts=True)
+        if len(self.top_keys):
+            keys = np.concatenate([self.top_keys, keys])
+            counts = np.concatenate([self.top_counts, counts])
+            keys, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts).astype(np.int64)
+        if len(keys) > self.top_k:
+            keep = np.argpartition(counts, -self.top_k)[-self.top_k:]
+            keys, counts = keys[keep], counts[keep]
+        self.top_keys, self.top_counts = keys, counts
+
+    def _payload_entropy(self):
+        n = self.count
+        p = self.top_counts / n
+        entropy = float(-(p * np.log2(p)).sum())
+        rest = n - int(self.top_counts.sum())
+        if rest > 0:
+            tail = max(self.distinct_payloads() - len(self.top_keys), 1.0)
+            q = rest / n
+            entropy -= q * math.log2(q / tail)
+        return entropy
+
+    def vector(self):
+        """Window features in FEATURE_COLS order, or None for an empty window."""
+        self._fold()
+        n = self.count
+        if not n:
+            return None
+        present = self.id_counts[self.id_counts > 0]
+        p = present / n
+        id_entropy = float(-(p * np.log2(p)).sum())
+        iat_std = math.sqrt(self.iat_m2 / (n - 1)) if n > 1 else 0.0
+        iat_mean = self.iat_mean if n > 1 else 0.0
+        values = {"msg_count": n, "unique_ids": len(present), "id_entropy": id_entropy,
+                  "payload_entropy": self._payload_entropy(), "iat_mean": iat_mean, "iat_std": iat_std}
+        return np.array([values[col] for col in FEATURE_COLS], dtype=np.float64)
+
+    def close(self, window_end):
+        """Returns the closed window as a WindowSummary (None if empty) and starts the next one."""
+        from can_ids.detection.detector import WindowSummary
+        vector = self.vector()
+        payload = None
+        if vector is not None and self.payload is not None:
+            flipped, bits, excess, unseen = self.payload_sums.tolist()
+            payload = self.payload.features(cell_entropy(self.byte_counts), flipped, bits, excess, unseen, self.count)
+        summary = None if vector is None else \
+            WindowSummary(vector, window_end, (self.early_frames, self.unknown_ids, self.sequence_score), payload,
+                          self.physics_score)
+        self.reset()
+        return summary
+
+    def nbytes(self):
+        """Bytes held in arrays: constant after construction."""
+        payload = (self._data.nbytes + self._lens.nbytes if self._stage_data else 0) + \
+            (self.byte_counts.nbytes if self.payload is not None else 0)
+        return (self._ids.nbytes + self._ts.nbytes + self._keys.nbytes + self.id_counts.nbytes +
+                self.registers.nbytes + 2 * 8 * self.top_k + payload)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sketch features with the exact ones on a parsed capture")
+    parser.add_argument("input_csv", help="Parsed capture (parse_can_log.py output)")
+    parser.add_argument("--window", type=float, default=0.1)
+    parser.add_argument("--flood", type=int, default=5000, help="Also test a synthetic window of N fuzzed frames")
+    args = parser.parse_args()
+
+    import can
+    from can_ids.detection.periodicity import read_capture
+    import pandas as pd
+    df = pd.read_csv(args.input_csv, dtype={"arbitration_id": str, "data_hex": str})
+    ids, timestamps, _ = read_capture(args.input_csv)
+    payloads = [bytes.fromhex(x) if isinstance(x, str) else b"" for x in df["data_hex"]]
+    messages = [can.Message(timestamp=t, arbitration_id=int(i), data=d, is_extended_id=bool(i > 0x7FF))
+                for t, i, d in zip(timestamps, ids, payloads)]
+
+    sketch = SketchWindow()
+    errors = []
+    edges = np.searchsorted(timestamps, np.arange(timestamps[0], timestamps[-1] + args.window, args.window), side="right")
+    start = 0
+    for end in edges:
+        if end > start:
+            window = messages[start:end]
+            for msg in window:
+                sketch.add(msg)
+            approx = sketch.vector()
+            sketch.reset()
+            errors.append(np.abs(approx - window_feature_vector(window)))
+            start = end
+    errors = np.array(errors)
+    print(f"📊 Sketch vs exact features on {len(errors)} windows of {args.input_csv}")
+    for col, worst, mean in zip(FEATURE_COLS, errors.max(axis=0), errors.mean(axis=0)):
+        print(f"   {col:<16} max abs error {worst:.3g} | mean {mean:.3g}")
+
+    rng = np.random.default_rng(0)
+    flood = [can.Message(timestamp=i * 0.00002, arbitration_id=int(rng.integers(0, 0x800)),
+                         data=rng.bytes(8), is_extended_id=False) for i in range(args.flood)]
+    for msg in flood:
+        sketch.add(msg)
+    approx = sketch.vector()
+    exact = window_feature_vector(flood)
+    print(f"\n🌊 Fuzzed flood window ({args.flood} frames, random IDs and payloads), sketch state {sketch.nbytes() / 1024:.1f} KiB")
+    for col, a, e in zip(FEATURE_COLS, approx, exact):
+        print(f"   {col:<16} exact {e:.6g} | sketch {a:.6g}")
+
+if __name__ == "__main__":
+    main()
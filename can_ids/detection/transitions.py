@@ -0,0 +1,183 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Allow running as a script (python can_ids/detection/transitions.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.periodicity import N_SLOTS, EXTENDED_SLOT, PeriodicityDetector, frame_ids, id_slots, read_capture
+from can_ids.metrics import registry
+
+TRANSITIONS_FILENAME = "ids_transitions.npz"
+
+# === DEFAULTS ===
+SMOOTHING = 0.5 # Additive (Jeffreys) smoothing per transition, so unseen ones are improbable, not impossible
+ROLLING_FRAMES = 32 # Frames per rolling sum; a window's score is its worst rolling mean
+QUANTILE = 0.999 # Benign rolling means above this quantile (times MARGIN) are anomalous
+MARGIN = 1.1
+
+SEQUENCE_WINDOWS = registry.counter("ids_sequence_anomalies_total", "Windows whose ID order the transition model rejects")
+
+class TransitionModel:
+    """
+    First-order Markov model of which arbitration ID follows which.
+
+    The IDs seen in training get compact indices (index[id], with one extra
+    slot for every other ID), and the surprisal -log P(next | previous) of
+    every transition is precomputed into a dense (K+1) x (K+1) table, so
+    scoring a frame is two array lookups. Replay and masquerade attacks keep
+    window volume and entropy normal but break the usual order; a rolling
+    sum of surprisal over ROLLING_FRAMES frames picks that up without being
+    diluted by a long window.
+    """
+
+    def __init__(self, known_ids, nll, threshold, rolling=ROLLING_FRAMES):
+        self.known_ids = np.asarray(known_ids, dtype=np.int64)
+        self.index = np.full(N_SLOTS, len(self.known_ids), dtype=np.int64)
+        self.index[self.known_ids] = np.arange(len(self.known_ids))
+        self.nll = np.asarray(nll, dtype=np.float32)
+        self.threshold = float(threshold)
+        self.rolling = int(rolling)
+        self.reset()
+
+    def reset(self):
+        self.last = -1 # Index of the previous frame's ID, -1 before the first frame
+        self.tail = np.zeros(0, dtype=np.float32) # Surprisal of the last rolling-1 frames
+
+    # === OFFLINE ===
+    @classmethod
+    def fit(cls, streams, smoothing=SMOOTHING, rolling=ROLLING_FRAMES, quantile=QUANTILE, margin=MARGIN):
+        """
+        Learns the table from benign ID streams (one array per capture, in
+        arrival order; transitions never cross captures). Counting is one
+        bincount over pair codes, however many frames there are. The
+        threshold is the `quantile` of the benign rolling means, times `margin`.
+        """
+        streams = [id_slots(s) for s in streams]
+        known = np.unique(np.concatenate(streams))
+        known = known[known != EXTENDED_SLOT] # Extended IDs share the "other" row
+        k = len(known) + 1
+        index = np.full(N_SLOTS, k - 1, dtype=np.int64)
+        index[known] = np.arange(len(known))
+
+        counts = np.zeros(k * k, dtype=np.float64)
+        for s in streams:
+            idx = index[s]
+            counts += np.bincount(idx[:-1] * k + idx[1:], minlength=k * k)
+        counts = counts.reshape(k, k) + smoothing
+        nll = -np.log(counts / counts.sum(axis=1, keepdims=True))
+
+        model = cls(known, nll, np.inf, rolling)
+        scores = np.concatenate([model.rolling_means(s) for s in streams])
+        model.threshold = float(np.quantile(scores, quantile) * margin) if len(scores) else np.inf
+        return model
+
+    def rolling_means(self, ids):
+        """Mean surprisal of every run of `rolling` consecutive transitions in one stream."""
+        idx = self.index[id_slots(ids)]
+        surprisal = self.nll[idx[:-1], idx[1:]].astype(np.float64)
+        if len(surprisal) < self.rolling:
+            return surprisal.mean(keepdims=True) if len(surprisal) else surprisal
+        c = np.cumsum(np.r_[0.0, surprisal])
+        return (c[self.rolling:] - c[:-self.rolling]) / self.rolling
+
+    def save(self, path):
+        np.savez(path, known_ids=self.known_ids, nll=self.nll, threshold=self.threshold, rolling=self.rolling)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["known_ids"], data["nll"], float(data["threshold"]), int(data["rolling"]))
+
+    # === LIVE ===
+    def scan(self, ids):
+        """
+        Per-frame surprisal for one window of IDs in arrival order, carrying
+        the previous ID across windows. The first frame ever has nothing to
+        follow and scores 0.
+        """
+        idx = self.index[id_slots(ids)]
+        if not len(idx):
+            return np.zeros(0, dtype=np.float32)
+        prev = np.empty_like(idx)
+        prev[0] = self.last
+        prev[1:] = idx[:-1]
+        surprisal = self.nll[prev, idx]
+        if self.last < 0:
+            surprisal[0] = 0.0
+        self.last = idx[-1]
+        return surprisal
+
+    def score_ids(self, ids):
+        """
+        Worst rolling mean surprisal among the runs that end in this window
+        of IDs (runs reach back into the previous window through `tail`).
+        """
+        surprisal = self.scan(ids)
+        run = np.concatenate([self.tail, surprisal]).astype(np.float64)
+        self.tail = run[len(run) - self.rolling + 1:] if self.rolling > 1 else run[:0]
+        if not len(surprisal):
+            return 0.0
+        if len(run) < self.rolling:
+            return float(run.mean())
+        c = np.cumsum(np.r_[0.0, run])
+        return float(((c[self.rolling:] - c[:-self.rolling]) / self.rolling).max())
+
+    def window_score(self, messages):
+        """score_ids() for a list of can.Message."""
+        return self.score_ids(frame_ids(messages))
+
+    def is_anomalous(self, score):
+        anomalous = score > self.threshold
+        if anomalous:
+            SEQUENCE_WINDOWS.inc()
+        return anomalous
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn the ID transition model from benign captures and test it on a labelled one")
+    parser.add_argument("train_csv", nargs="+", help="Parsed captures (parse_can_log.py output); only label 0 frames are used")
+    parser.add_argument("--test", default=None, help="Labelled parsed capture to report window-level detection on")
+    parser.add_argument("--out", default=None, help="Model path (default <model dir>/ids_transitions.npz)")
+    parser.add_argument("--rolling", type=int, default=ROLLING_FRAMES)
+    parser.add_argument("--quantile", type=float, default=QUANTILE)
+    parser.add_argument("--window", type=float, default=0.1)
+    parser.add_argument("--drop-early", action="store_true",
+                        help="Also drop benign-labelled frames that arrive well ahead of their ID's period "
+                             "(unlabelled injections in the training capture)")
+    args = parser.parse_args()
+
+    from can_ids.detection.detector import MODEL_DIR
+    streams = []
+    for path in args.train_csv:
+        ids, timestamps, labels = read_capture(path)
+        keep = labels == 0
+        if args.drop_early:
+            early, _ = PeriodicityDetector().fit(ids[keep], timestamps[keep]).scan(ids[keep], timestamps[keep])
+            keep[np.flatnonzero(keep)[early]] = False
+            print(f"   {path}: dropped {int(early.sum())} early frames")
+        streams.append(ids[keep])
+    model = TransitionModel.fit(streams, rolling=args.rolling, quantile=args.quantile)
+    out = Path(args.out or MODEL_DIR / TRANSITIONS_FILENAME)
+    model.save(out)
+    frames = sum(len(s) for s in streams)
+    print(f"✅ Learned {len(model.known_ids)} IDs from {frames} benign frames -> {out}")
+    print(f"   Threshold: {model.threshold:.3f} nats/frame over {model.rolling}-frame runs")
+
+    if args.test:
+        ids, timestamps, labels = read_capture(args.test)
+        model = TransitionModel.load(out)
+        edges = np.searchsorted(timestamps, np.arange(timestamps[0], timestamps[-1] + args.window, args.window), side="right")
+        flagged, attack, start = [], [], 0
+        for end in edges:
+            if end > start:
+                flagged.append(model.score_ids(ids[start:end]) > model.threshold)
+                attack.append(labels[start:end].any())
+                start = end
+        flagged, attack = np.array(flagged), np.array(attack)
+        print(f"\n📊 Window-level on {args.test}: flagged {flagged[attack].mean():.1%} of {int(attack.sum())} attack windows, "
+              f"{flagged[~attack].mean():.2%} of {int((~attack).sum())} benign windows")
+
+if __name__ == "__main__":
+    main()
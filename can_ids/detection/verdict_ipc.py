@@ -0,0 +1,210 @@
+import os
+import socket
+import struct
+import sys
+import time
+import argparse
+
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.detection.detector import Verdict
+from can_ids.detection.payload import PAYLOAD_COLS
+
+DEFAULT_SOCKET = "/tmp/can_ids_verdicts.sock"
+
+# One verdict per SEQPACKET message (boundaries are preserved, no length prefix needed):
+# version, flags, attack code, more flags | streak, msg_count | window_end | ocsvm_score, ae_mse, latency |
+# early_frames, unknown_ids, sequence_score, physics_score | payload values | 6 features
+PAYLOAD_VALUES = PAYLOAD_COLS + ["flip_excess"]
+VERDICT_FMT = "<BBBBII" + "d" + "fff" + "IIfI" + f"{len(PAYLOAD_VALUES)}f" + f"{len(FEATURE_COLS)}f"
+VERDICT_SIZE = struct.calcsize(VERDICT_FMT)
+VERSION = 2 # 2: check scores, payload values and the fourth flag byte
+
+FLAG_OCSVM = 0x01
+FLAG_AE = 0x02
+FLAG_RULE = 0x04
+STAGE_SHIFT = 3 # Bits 3-4: cascade stage that decided the window
+STAGE_CODES = {"models": 0, "rule": 1, "bounds": 2, "drift": 3}
+STAGE_NAMES = {code: name for name, code in STAGE_CODES.items()}
+FLAG_TIMING = 0x20
+FLAG_SEQUENCE = 0x40
+FLAG_PAYLOAD = 0x80
+EXT_FLAG_PHYSICS = 0x01 # Fourth byte
+EXT_FLAG_PAYLOAD_VALUES = 0x02 # The payload check ran; without it the payload values are zero
+
+ATTACK_CODES = {None: 0, "ANOMALY": 1, "SPOOFING / REPLAY": 2, "FLOODING / DOS": 3, "UNKNOWN ID": 4}
+ATTACK_NAMES = {code: name for name, code in ATTACK_CODES.items()}
+
+def encode_verdict(verdict: Verdict) -> bytes:
+    flags = (FLAG_OCSVM if verdict.ocsvm_anomaly else 0) | (FLAG_AE if verdict.ae_anomaly else 0) | \
+            (FLAG_RULE if verdict.rule_anomaly else 0) | (STAGE_CODES.get(verdict.stage, 0) << STAGE_SHIFT) | \
+            (FLAG_TIMING if verdict.timing_anomaly else 0) | (FLAG_SEQUENCE if verdict.sequence_anomaly else 0) | \
+            (FLAG_PAYLOAD if verdict.payload_anomaly else 0)
+    ext_flags = (EXT_FLAG_PHYSICS if verdict.physics_anomaly else 0) | \
+                (EXT_FLAG_PAYLOAD_VALUES if verdict.payload is not None else 0)
+    payload = verdict.payload or {}
+    return struct.pack(
+        VERDICT_FMT, VERSION, flags, ATTACK_CODES.get(verdict.attack, 0), ext_flags,
+        verdict.streak, verdict.msg_count, verdict.window_end,
+        verdict.ocsvm_score, verdict.ae_mse, verdict.latency,
+        verdict.early_frames, verdict.unknown_ids, verdict.sequence_score, verdict.physics_score,
+        *(payload.get(col, 0.0) for col in PAYLOAD_VALUES),
+        *(verdict.features.get(col, 0.0) for col in FEATURE_COLS)
+    )
+
+def decode_verdict(data: bytes) -> Verdict:
+    if data[:1] != bytes([VERSION]) or len(data) != VERDICT_SIZE:
+        raise ValueError(f"Unsupported verdict record (version {data[0] if data else None}, {len(data)} bytes)")
+    fields = struct.unpack(VERDICT_FMT, data)
+    version, flags, attack, ext_flags, streak, msg_count, window_end, ocsvm_score, ae_mse, latency = fields[:10]
+    early_frames, unknown_ids, sequence_score, physics_score = fields[10:14]
+    payload = fields[14:14 + len(PAYLOAD_VALUES)]
+    return Verdict(
+        window_end=window_end,
+        msg_count=msg_count,
+        features=dict(zip(FEATURE_COLS, fields[14 + len(PAYLOAD_VALUES):])),
+        ocsvm_anomaly=bool(flags & FLAG_OCSVM),
+        ocsvm_score=ocsvm_score,
+        ae_mse=ae_mse,
+        ae_anomaly=bool(flags & FLAG_AE),
+        streak=streak,
+        attack=ATTACK_NAMES.get(attack),
+        latency=latency,
+        rule_anomaly=bool(flags & FLAG_RULE),
+        stage=STAGE_NAMES[(flags >> STAGE_SHIFT) & 0x03],
+        timing_anomaly=bool(flags & FLAG_TIMING),
+        early_frames=early_frames,
+        unknown_ids=unknown_ids,
+        sequence_anomaly=bool(flags & FLAG_SEQUENCE),
+        sequence_score=sequence_score,
+        payload_anomaly=bool(flags & FLAG_PAYLOAD),
+        payload=dict(zip(PAYLOAD_VALUES, payload)) if ext_flags & EXT_FLAG_PAYLOAD_VALUES else None,
+        physics_anomaly=bool(ext_flags & EXT_FLAG_PHYSICS),
+        physics_score=physics_score
+    )
+
+class VerdictPublisher:
+    """
+    Publishes every window verdict to any number of local subscribers over a
+    Unix SOCK_SEQPACKET socket. Never blocks the detector: new subscribers are
+    accepted lazily on publish, and a subscriber whose buffer is full simply
+    misses that verdict (counted in `dropped`).
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.server.bind(path)
+        self.server.listen(16)
+        self.server.setblocking(False)
+        self.subscribers = []
+        self.published = 0
+        self.dropped = 0
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            conn.setblocking(False)
+            self.subscribers.append(conn)
+
+    def publish(self, verdict: Verdict):
+        self._accept()
+        if not self.subscribers:
+            return
+        data = encode_verdict(verdict)
+        for conn in list(self.subscribers):
+            try:
+                conn.send(data)
+            except BlockingIOError:
+                self.dropped += 1
+            except OSError:
+                # Subscriber went away
+                self.subscribers.remove(conn)
+                conn.close()
+        self.published += 1
+
+    def close(self):
+        for conn in self.subscribers:
+            conn.close()
+        self.server.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+class VerdictSubscriber:
+    """Reads verdicts from a VerdictPublisher. Iterating yields Verdicts until the publisher closes."""
+
+    def __init__(self, path=DEFAULT_SOCKET, connect_timeout=10.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                self.sock.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # The IDS may still be loading its models
+                if time.time() >= deadline:
+                    self.sock.close()
+                    raise
+                time.sleep(0.1)
+
+    def recv(self, timeout=None):
+        """Returns the next Verdict, None on timeout, or raises EOFError when the publisher is gone."""
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(VERDICT_SIZE)
+        except socket.timeout:
+            return None
+        if not data:
+            raise EOFError("Verdict publisher closed")
+        return decode_verdict(data)
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.recv()
+        except EOFError:
+            return
+
+    def close(self):
+        self.sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Subscribe to live IDS verdicts")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--csv", help="Append every verdict to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        subscriber = VerdictSubscriber(args.socket)
+    except OSError as e:
+        print(f"❌ Error: Could not connect to {args.socket} ({e}).")
+        sys.exit(1)
+
+    out = None
+    if args.csv:
+        new_file = not os.path.exists(args.csv)
+        out = open(args.csv, "a")
+        if new_file:
+            out.write(",".join(["window_end", "msg_count", "streak", "ocsvm_score", "ae_mse",
+                                "latency", "attack"] + FEATURE_COLS) + "\n")
+    try:
+        for v in subscriber:
+            if out:
+                out.write(",".join(str(x) for x in [v.window_end, v.msg_count, v.streak, v.ocsvm_score, v.ae_mse,
+                                                    v.latency, v.attack or ""] + [v.features[c] for c in FEATURE_COLS]) + "\n")
+            else:
+                print(f"{v.window_end:.3f} | Vol: {v.msg_count:<4} | SVM: {v.ocsvm_score:+.3f} | AE: {v.ae_mse:.4f} | Streak: {v.streak} | {v.attack or 'NORMAL'}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        subscriber.close()
+        if out: out.close()
+
+if __name__ == "__main__":
+    main()
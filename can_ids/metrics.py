@@ -0,0 +1,203 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers a sub-100us decode up to a multi-second stall
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Updates are plain attribute arithmetic with no locks: they cost about as much
+# as the += they replace. A concurrent update from another thread can, rarely,
+# be lost, which is an acceptable error for monitoring counters.
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+class _GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+    def dec(self, amount=1.0):
+        self.value -= amount
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Metric:
+    """
+    One metric family. Without labelnames it can be updated directly
+    (counter.inc()); with labelnames, use .labels(...) to get (and cache)
+    a child. `fn` makes the metric computed at scrape time instead: it returns
+    a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, kind, name, help, labelnames=(), buckets=None, fn=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) if buckets else None
+        self.fn = fn
+        self._children = {}
+        if not self.labelnames and fn is None:
+            self._default = self.labels()
+
+    def _new_child(self):
+        if self.kind == "counter":
+            return _CounterValue()
+        if self.kind == "gauge":
+            return _GaugeValue()
+        return _HistogramValue(self.buckets)
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def inc(self, amount=1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    @property
+    def value(self):
+        return self._default.value
+
+    def collect(self):
+        """Prometheus text lines for this family."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.fn is not None:
+            try:
+                result = self.fn()
+            except Exception:
+                return lines
+            items = result.items() if isinstance(result, dict) else [((), result)]
+            for values, value in items:
+                values = values if isinstance(values, tuple) else (values,)
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+            return lines
+
+        for values, child in list(self._children.items()):
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                labels = _format_labels(self.labelnames, values)
+                lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics. Registration is idempotent by name, so a
+    module can declare its metrics at import time and tests can re-import.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric(kind, name, help, **kwargs)
+            elif metric.kind != kind:
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            elif kwargs.get("fn") is not None:
+                # Re-registering a computed metric rebinds it (e.g. to a new instance)
+                metric.fn = kwargs["fn"]
+            return metric
+
+    def counter(self, name, help, labelnames=(), fn=None):
+        return self._register("counter", name, help, labelnames=labelnames, fn=fn)
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self._register("gauge", name, help, labelnames=labelnames, fn=fn)
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register("histogram", name, help, labelnames=labelnames, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+def start_http_server(port, addr="127.0.0.1", reg=registry):
+    """Serves GET /metrics from a daemon thread, for the standalone scripts."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = reg.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass # Keep scrapes out of the console
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,24 +1,20 @@
-import pandas as pd
-import numpy as np
-import joblib
 import argparse
 import sys
 import os
+import time
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' # Silence TensorFlow logs
+# pandas/sklearn/TensorFlow are imported where they are used, so --help and path errors are instant
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import tensorflow as tf
-from tensorflow.keras.models import Model, load_model
-from tensorflow.keras.layers import Input, Dense
-from tensorflow.keras.callbacks import EarlyStopping
-
-# === CONFIGURATION ===
-MODEL_FILENAME = "autoencoder_model.keras"
-THRESHOLD_FILENAME = "ae_threshold.npy"
-SCALER_FILENAME = "scaler.joblib" # We share the scaler with OCSVM
+# Allow running as a script (python can_ids/models/...) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.detector import MODEL_DIR, AE_MODEL_FILENAME as MODEL_FILENAME, \
+    AE_THRESH_FILENAME as THRESHOLD_FILENAME, SCALER_FILENAME # We share the scaler with OCSVM
+from can_ids.detection.features import FEATURE_COLS, WINDOW_SIZE
+from can_ids.detection.model_bundle import (file_sha256, read_manifest, write_manifest,
+                                            build_from_artifacts, remove_bundle, BundleError)
 
 def load_data(csv_path):
+    import pandas as pd
     print(f"📂 Loading dataset: {csv_path}...")
     if not os.path.exists(csv_path):
         # Try finding in root
@@ -26,28 +22,46 @@ def load_data(csv_path):
         if not os.path.exists(csv_path):
             print(f"❌ Error: File {csv_path} not found.")
             sys.exit(1)
-    return pd.read_csv(csv_path)
+    return csv_path, pd.read_csv(csv_path)
 
-def train_autoencoder(input_csv):
+def train_autoencoder(input_csv, model_dir=MODEL_DIR, fit_scaler=False):
     # 1. Load Data
-    df = load_data(input_csv)
-    feature_cols = ['msg_count', 'unique_ids', 'id_entropy', 'payload_entropy', 'iat_mean', 'iat_std']
+    csv_path, df = load_data(input_csv)
+    dataset_sha = file_sha256(csv_path)
+
+    import numpy as np
+    import joblib
+    from sklearn.preprocessing import StandardScaler
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import Input, Dense
+    from tensorflow.keras.callbacks import EarlyStopping
+    feature_cols = FEATURE_COLS
     
     # Filter for Benign ONLY (Label 0)
     benign_df = df[df['label'] == 0]
     print(f"   Training on {len(benign_df)} Benign samples...")
 
     # 2. Scaling
-    # We MUST use the same scaling logic as the OCSVM.
-    # If scaler exists, load it. If not, create it.
-    if os.path.exists(SCALER_FILENAME):
-        print("   Loading existing scaler...")
-        scaler = joblib.load(SCALER_FILENAME)
+    # We MUST use the same scaler as the OCSVM, and only if it was fitted on this dataset:
+    # a scaler left over from another CSV would silently skew every reconstruction error.
+    scaler_path = os.path.join(model_dir, SCALER_FILENAME)
+    manifest = read_manifest(model_dir)
+    if os.path.exists(scaler_path) and not fit_scaler:
+        if manifest.get("dataset_sha256") != dataset_sha or \
+                manifest.get("ocsvm", {}).get("scaler_sha256") != file_sha256(scaler_path):
+            print(f"❌ Error: {scaler_path} was not fitted on {csv_path}.")
+            print("   Train the OCSVM on this CSV first, or pass --fit-scaler (the OCSVM must then be retrained).")
+            sys.exit(1)
+        print("   Loading the OCSVM's scaler...")
+        scaler = joblib.load(scaler_path)
     else:
         print("   Creating new scaler...")
         scaler = StandardScaler()
         scaler.fit(benign_df[feature_cols])
-        joblib.dump(scaler, SCALER_FILENAME)
+        joblib.dump(scaler, scaler_path)
+        # Any OCSVM in model_dir was fitted with the old scaler
+        manifest = {"dataset": os.path.abspath(csv_path), "dataset_sha256": dataset_sha,
+                    "feature_cols": FEATURE_COLS, "window_size": WINDOW_SIZE}
 
     X_train = scaler.transform(benign_df[feature_cols])
 
@@ -90,19 +104,34 @@ def train_autoencoder(input_csv):
     print(f"   Max Benign Error: {np.max(mse):.6f}")
     print(f"   Selected Threshold: {threshold:.6f}")
 
-    # 6. Save Artifacts
-    # Calculate root path to save alongside other models
-    save_dir = os.getcwd()
-    model_path = os.path.join(save_dir, MODEL_FILENAME)
-    thresh_path = os.path.join(save_dir, THRESHOLD_FILENAME)
+    # 6. Save Artifacts (to MODEL_DIR, alongside the OCSVM)
+    model_path = os.path.join(model_dir, MODEL_FILENAME)
+    thresh_path = os.path.join(model_dir, THRESHOLD_FILENAME)
     
     print(f"\n💾 Saving model to {model_path}...")
     autoencoder.save(model_path)
     np.save(thresh_path, threshold)
+    manifest["autoencoder"] = {"scaler_sha256": file_sha256(scaler_path), "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    write_manifest(model_dir, manifest)
     print("✅ Training Complete.")
+    # The old bundle holds the old autoencoder (and, with --fit-scaler, the old scaler); rebuilt below if possible
+    remove_bundle(model_dir)
+
+    # 7. Bundle everything the Live IDS needs into one file
+    if "ocsvm" not in manifest:
+        print("   No OCSVM for this scaler yet: train it, then run `python -m can_ids.detection.model_bundle`.")
+        return
+    try:
+        bundle_path, digest = build_from_artifacts(model_dir)
+        print(f"📦 Model bundle written to {bundle_path} ({digest[:12]})")
+    except BundleError as e:
+        print(f"⚠️  Bundle not built: {e}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train Autoencoder on Benign Data")
     parser.add_argument("input_csv", help="Path to feature matrix CSV")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR), help="Where the OCSVM and scaler live (default IDS_MODEL_DIR)")
+    parser.add_argument("--fit-scaler", action="store_true",
+                        help="Fit a new scaler on this CSV instead of reusing the OCSVM's (the OCSVM must be retrained)")
     args = parser.parse_args()
-    train_autoencoder(args.input_csv)
+    train_autoencoder(args.input_csv, args.model_dir, args.fit_scaler)
@@ -1,14 +1,15 @@
-import pandas as pd
-import numpy as np
-import joblib
 import argparse
 import sys
 import os
+import time
 from pathlib import Path
-from sklearn.svm import OneClassSVM
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report, confusion_matrix
-from sklearn.model_selection import train_test_split
+# pandas/sklearn are imported where they are used, so --help and path errors are instant
+
+# Allow running as a script (python can_ids/models/...) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.detector import MODEL_DIR, MODEL_FILENAME, SCALER_FILENAME
+from can_ids.detection.features import FEATURE_COLS, WINDOW_SIZE
+from can_ids.detection.model_bundle import file_sha256, write_manifest, remove_bundle
 
 # === PATH SETUP ===
 # Find the root directory (assuming structure: root/can_ids_framework/can_ids/models/this_script.py)
@@ -20,10 +21,8 @@ PROJECT_ROOT = SCRIPT_DIR.parent.parent.parent.parent # Adjust based on nesting
 # Let's default to looking in the current working directory OR the project root if possible.
 # But the best way is to let the user pass the path, and if they don't, try to find it.
 
-MODEL_FILENAME = "ocsvm_model.joblib"
-SCALER_FILENAME = "scaler.joblib"
-
 def load_data(csv_path):
+    import pandas as pd
     print(f"📂 Loading dataset: {csv_path}...")
     if not os.path.exists(csv_path):
         # Try looking in the project root if not found in current dir
@@ -32,18 +31,26 @@ def load_data(csv_path):
         potential_path = Path(__file__).resolve().parent.parent.parent.parent / csv_path
         if potential_path.exists():
             print(f"   Found at: {potential_path}")
-            return pd.read_csv(potential_path)
+            return potential_path, pd.read_csv(potential_path)
         
         print(f"❌ Error: File {csv_path} not found.")
         sys.exit(1)
         
-    return pd.read_csv(csv_path)
+    return Path(csv_path), pd.read_csv(csv_path)
+
+def train_one_class_svm(input_csv, model_dir=MODEL_DIR):
+    import numpy as np
+    import pandas as pd
+    import joblib
+    from sklearn.svm import OneClassSVM
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.metrics import classification_report, confusion_matrix
+    from sklearn.model_selection import train_test_split
 
-def train_one_class_svm(input_csv):
     # 1. Load Data
-    df = load_data(input_csv)
+    csv_path, df = load_data(input_csv)
     
-    feature_cols = ['msg_count', 'unique_ids', 'id_entropy', 'payload_entropy', 'iat_mean', 'iat_std']
+    feature_cols = FEATURE_COLS
     
     # 2. Data Preparation
     benign_df = df[df['label'] == 0]
@@ -92,20 +99,32 @@ def train_one_class_svm(input_csv):
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred, target_names=['Benign', 'Attack']))
     
-    # 7. Save Artifacts (Save to the ROOT folder so Live IDS can find them)
-    # Calculate root path: .../can_ids/
-    save_dir = Path(__file__).resolve().parent.parent.parent.parent
+    # 7. Save Artifacts (to MODEL_DIR, where the Live IDS loads from)
+    save_dir = Path(model_dir)
     model_path = save_dir / MODEL_FILENAME
     scaler_path = save_dir / SCALER_FILENAME
     
     print(f"\n💾 Saving model to {model_path}...")
     joblib.dump(ocsvm, model_path)
     joblib.dump(scaler, scaler_path)
-    print("✅ Training Complete.")
+
+    # A new scaler invalidates any autoencoder trained before it, so the manifest starts over
+    write_manifest(save_dir, {
+        "dataset": str(Path(csv_path).resolve()),
+        "dataset_sha256": file_sha256(csv_path),
+        "feature_cols": FEATURE_COLS,
+        "window_size": WINDOW_SIZE,
+        "ocsvm": {"scaler_sha256": file_sha256(scaler_path), "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    })
+    # The bundle holds the old OCSVM and scaler; IDSDetector.load() would keep preferring it
+    if remove_bundle(save_dir):
+        print("   Removed the old model bundle (stale).")
+    print("✅ Training Complete. Train the autoencoder on the same CSV next to build the model bundle.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Train One-Class SVM on Benign Data")
     parser.add_argument("input_csv", help="Path to feature matrix CSV (e.g., research_features.csv)")
+    parser.add_argument("--model-dir", default=str(MODEL_DIR), help="Where to save the artifacts (default IDS_MODEL_DIR)")
     args = parser.parse_args()
     
-    train_one_class_svm(args.input_csv)
+    train_one_class_svm(args.input_csv, args.model_dir)
@@ -3,8 +3,16 @@ import numpy as np
 import math
 from collections import Counter
 import argparse
+import os
 import sys
 
+# Allow running as a script (python can_ids/processing/build_features.py) from anywhere
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from can_ids.detection.payload import PayloadMonitor, PAYLOAD_BYTES, PAYLOAD_COLS, byte_entropy, hex_payload_matrix
+from can_ids.detection.physics import PhysicsChecker
+
+BYTE_COLS = [f"b{i}" for i in range(PAYLOAD_BYTES)]
+
 def calculate_entropy(data_series):
     """Calculates Shannon Entropy for a series of values."""
     if len(data_series) == 0:
@@ -20,6 +28,43 @@ def hex_to_int(hex_str):
     except (ValueError, TypeError):
         return 0
 
+def decode_frames(df):
+    """Integer IDs, (n, 8) payload byte matrix and payload lengths of a capture."""
+    codes, inverse = np.unique(df['arbitration_id'].astype(str), return_inverse=True)
+    ids = np.array([hex_to_int(c) for c in codes], dtype=np.int64)[inverse]
+    matrix, lengths = hex_payload_matrix(df['data_hex'])
+    return ids, matrix, lengths
+
+def add_payload_columns(df, monitor, ids, matrix, lengths):
+    """
+    Adds per-frame payload columns (integer ID, bytes, length, flipped/compared bits
+    against the previous frame of the same ID, unseen byte values) to a
+    capture sorted by time, in one vectorized pass over the whole capture,
+    so process_window() only has to sum them.
+    """
+    flips, unseen = monitor.scan(ids, matrix, lengths)
+    compared = ~np.isnan(flips)
+    for col, values in zip(BYTE_COLS, matrix.T):
+        df[col] = values
+    df['can_id'] = ids
+    df['payload_len'] = lengths
+    df['flip_bits'] = np.where(compared, flips, 0.0)
+    df['compared_bits'] = np.where(compared, 8 * lengths, 0)
+    df['payload_unseen'] = unseen
+    return df
+
+def add_physics_column(df, ids, matrix, lengths):
+    """Adds a per-frame physics rule violation column, from one pass of the checker over the capture."""
+    df['physics_violation'], _ = PhysicsChecker().scan(ids, df['timestamp'].to_numpy(), matrix, lengths)
+    return df
+
+def payload_features(window):
+    """PAYLOAD_COLS of one window with add_payload_columns() applied."""
+    entropy = byte_entropy(window['can_id'].to_numpy(), window[BYTE_COLS].to_numpy(dtype=np.uint8), window['payload_len'].to_numpy())
+    bits = window['compared_bits'].sum()
+    flip_rate = window['flip_bits'].sum() / bits if bits else 0.0
+    return dict(zip(PAYLOAD_COLS, (entropy, flip_rate, window['payload_unseen'].mean())))
+
 def process_window(window):
     """
     Aggregates a 100ms window of CAN messages into a single feature vector.
@@ -60,7 +105,7 @@ def process_window(window):
     label = 1 if (window['label'] == 1).any() else 0
     
     # Return Feature Vector
-    return pd.Series({
+    features = {
         'msg_count': msg_count,
         'unique_ids': unique_ids,
         'id_entropy': id_entropy,
@@ -68,15 +113,26 @@ def process_window(window):
         'iat_mean': iat_mean,
         'iat_std': iat_std,
         'iat_min': iat_min,
-        'iat_max': iat_max,
-        'label': label
-    })
+        'iat_max': iat_max
+    }
+    # 6. Per-ID payload content (only when add_payload_columns() ran)
+    if 'flip_bits' in window.columns:
+        features.update(payload_features(window))
+    # 7. Vehicle physics (only when add_physics_column() ran)
+    if 'physics_violation' in window.columns:
+        features['physics_score'] = int(window['physics_violation'].sum())
+    features['label'] = label
+    return pd.Series(features)
 
 def main():
     parser = argparse.ArgumentParser(description="Build Time-Windowed Features from CAN Logs")
     parser.add_argument("--input", required=True, help="Input parsed CSV file (e.g. dataset.csv)")
     parser.add_argument("--output", required=True, help="Output Feature Matrix CSV")
     parser.add_argument("--window", type=float, default=0.1, help="Window size in seconds (default 0.1s)")
+    parser.add_argument("--payload-profile", default=None, metavar="NPZ",
+                        help="Payload profile (payload.py output) for the out_of_range column (default: always 0)")
+    parser.add_argument("--no-payload", action="store_true", help="Skip the per-ID payload columns")
+    parser.add_argument("--no-physics", action="store_true", help="Skip the physics_score column")
     args = parser.parse_args()
 
     print(f"⚙️  Processing {args.input} into {args.window}s windows...")
@@ -90,6 +146,13 @@ def main():
 
     # Ensure timestamp is sorted
     df = df.sort_values('timestamp')
+    if not (args.no_payload and args.no_physics):
+        ids, matrix, lengths = decode_frames(df)
+    if not args.no_payload:
+        monitor = PayloadMonitor.load(args.payload_profile) if args.payload_profile else PayloadMonitor()
+        df = add_payload_columns(df, monitor, ids, matrix, lengths)
+    if not args.no_physics:
+        df = add_physics_column(df, ids, matrix, lengths)
     
     # Convert timestamp to datetime for resampling (Simulated timestamp is float seconds)
     # We create a dummy datetime index starting from "now" just for pandas resampling
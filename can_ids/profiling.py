@@ -0,0 +1,202 @@
+import json
+import time
+import tracemalloc
+
+SUB_BUCKET_BITS = 7 # 128 sub-buckets per power of two: <= 1/64 (~1.6%) relative error
+MAX_VALUE_BITS = 42 # ~73 minutes in ns
+
+class HdrHistogram:
+    """
+    HDR-style log-linear histogram of integer values (nanoseconds here).
+
+    Values below 2^SUB_BUCKET_BITS are counted exactly; above that each power
+    of two is split into 2^(SUB_BUCKET_BITS-1) equal buckets, so any recorded
+    value is reported with a bounded relative error whatever its magnitude.
+    Recording is a few integer ops and one list increment; memory is fixed.
+    """
+
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS, max_value_bits=MAX_VALUE_BITS):
+        self.sub_bits = sub_bucket_bits
+        self.sub_count = 1 << sub_bucket_bits
+        self.half = self.sub_count >> 1
+        self.max_value = (1 << max_value_bits) - 1
+        self.counts = [0] * self._index(self.max_value) + [0]
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + ((value >> shift) - self.half)
+
+    def _upper_bound(self, index):
+        """Highest value that maps to `index`."""
+        if index < self.sub_count:
+            return index
+        shift, offset = divmod(index - self.sub_count, self.half)
+        shift += 1
+        return ((offset + self.half + 1) << shift) - 1
+
+    def record(self, value):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if self.min is None or value < self.min:
+            self.min = value
+
+    def percentile(self, p):
+        """Value at percentile p (0-100), clamped to the exact observed min/max."""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * p // 100))
+        seen = 0
+        for index, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(max(self._upper_bound(index), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+class StageProfiler:
+    """
+    Per-stage latency and allocation profile for the live IDS loop.
+
+    Stage durations come from IDSDetector.on_stage (features, scale, ocsvm, ae)
+    plus whatever the loop records itself (recv, summary, score, window). Every
+    `alloc_sample_every`-th window runs under tracemalloc: the peak bytes
+    allocated inside each stage, and the blocks still alive when the window
+    ends, are recorded. Tracing only sampled windows keeps the overhead of
+    tracemalloc off the rest.
+    """
+
+    def __init__(self, alloc_sample_every=50, late_threshold=0.01):
+        self.stages = {}
+        self.alloc_peak = {} # stage -> HdrHistogram of peak bytes (sampled windows)
+        self.retained_blocks = HdrHistogram()
+        self.retained_bytes = HdrHistogram()
+        self.alloc_sample_every = alloc_sample_every
+        self.late_threshold = late_threshold
+        self.windows = 0
+        self.windows_late = 0
+        self.frames = 0
+        self.catchup_windows = HdrHistogram() # Windows per batched catch-up call
+        self.catchup_ns = HdrHistogram() # Oldest window end to its batch's verdicts
+        self.started = time.perf_counter()
+        self._tracing = False
+        self._trace_base = 0
+
+    def record(self, stage, ns):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = HdrHistogram()
+        hist.record(ns)
+
+    def on_stage(self, stage, ns):
+        self.record(stage, ns)
+        if self._tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            hist = self.alloc_peak.get(stage)
+            if hist is None:
+                hist = self.alloc_peak[stage] = HdrHistogram()
+            hist.record(peak - self._trace_base)
+            tracemalloc.reset_peak()
+            self._trace_base = current
+
+    def begin_window(self):
+        """Call before the window's summary is built; a no-op while a sampled window is still open."""
+        if self._tracing:
+            return
+        if self.alloc_sample_every and self.windows % self.alloc_sample_every == 0:
+            tracemalloc.start()
+            self._tracing = True
+            self._trace_base = 0
+
+    def mark(self):
+        """Starts the next stage's allocation peak here, leaving out whatever ran in between (e.g. recv)."""
+        if self._tracing:
+            tracemalloc.reset_peak()
+            self._trace_base = tracemalloc.get_traced_memory()[0]
+
+    def end_window(self, frames, latency):
+        """Closes a window of `frames` frames whose verdict came `latency` seconds after it ended."""
+        self.windows += 1
+        self.frames += frames
+        if latency > self.late_threshold:
+            self.windows_late += 1
+        if self._tracing:
+            snapshot = tracemalloc.take_snapshot()
+            stats = snapshot.statistics("filename")
+            self.retained_blocks.record(sum(s.count for s in stats))
+            self.retained_bytes.record(sum(s.size for s in stats))
+            tracemalloc.stop()
+            self._tracing = False
+
+    def record_catchup(self, windows, seconds):
+        """One batched call that cleared `windows` pending windows, `seconds` after the oldest ended."""
+        self.catchup_windows.record(windows)
+        self.catchup_ns.record(seconds * 1e9)
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        stages = {}
+        for name, hist in self.stages.items():
+            stages[name] = {
+                "count": hist.count,
+                "p50_us": hist.percentile(50) / 1000,
+                "p99_us": hist.percentile(99) / 1000,
+                "max_us": hist.max / 1000,
+                "mean_us": hist.mean / 1000
+            }
+            if name in self.alloc_peak:
+                stages[name]["alloc_peak_kib_p50"] = self.alloc_peak[name].percentile(50) / 1024
+                stages[name]["alloc_peak_kib_max"] = self.alloc_peak[name].max / 1024
+        return {
+            "elapsed_s": elapsed,
+            "frames": self.frames,
+            "frames_per_s": self.frames / elapsed if elapsed > 0 else 0.0,
+            "windows": self.windows,
+            "windows_late": self.windows_late,
+            "late_threshold_ms": self.late_threshold * 1000,
+            "alloc_sampled_windows": self.retained_blocks.count,
+            "retained_blocks_p50": self.retained_blocks.percentile(50),
+            "retained_kib_p50": self.retained_bytes.percentile(50) / 1024,
+            "catchup_batches": self.catchup_windows.count,
+            "catchup_windows_max": self.catchup_windows.max,
+            "catchup_ms_p99": self.catchup_ns.percentile(99) / 1e6,
+            "catchup_ms_max": self.catchup_ns.max / 1e6,
+            "stages": stages
+        }
+
+    def format_report(self, report=None):
+        r = report or self.report()
+        lines = [
+            "📊 IDS PROFILE",
+            f"   Runtime: {r['elapsed_s']:.1f}s | Frames: {r['frames']} ({r['frames_per_s']:.0f} fps) | "
+            f"Windows: {r['windows']} (late >{r['late_threshold_ms']:.0f}ms: {r['windows_late']})",
+            f"   {'Stage':<10} {'Count':>8} {'p50 us':>10} {'p99 us':>10} {'Max us':>10} {'Alloc KiB p50/max':>18}"
+        ]
+        for name, s in r["stages"].items():
+            alloc = ""
+            if "alloc_peak_kib_p50" in s:
+                alloc = f"{s['alloc_peak_kib_p50']:.1f}/{s['alloc_peak_kib_max']:.1f}"
+            lines.append(f"   {name:<10} {s['count']:>8} {s['p50_us']:>10.1f} {s['p99_us']:>10.1f} {s['max_us']:>10.1f} {alloc:>18}")
+        if r["alloc_sampled_windows"]:
+            lines.append(f"   Retained after a window (p50 of {r['alloc_sampled_windows']} sampled): "
+                         f"{r['retained_blocks_p50']} blocks, {r['retained_kib_p50']:.1f} KiB")
+        if r["catchup_batches"]:
+            lines.append(f"   Catch-up: {r['catchup_batches']} batched calls (up to {r['catchup_windows_max']} windows), "
+                         f"backlog cleared p99 {r['catchup_ms_p99']:.1f} ms / max {r['catchup_ms_max']:.1f} ms")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
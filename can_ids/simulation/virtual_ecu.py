@@ -1,6 +1,11 @@
 import threading
 import can
 import time
+from can_ids.metrics import registry
+
+FRAMES_SENT = registry.counter("sim_frames_sent_total", "Frames sent by each virtual ECU", ("ecu",))
+SEND_ERRORS = registry.counter("sim_send_errors_total", "Failed sends by each virtual ECU", ("ecu",))
+SEND_SECONDS = registry.histogram("sim_send_seconds", "Time to build and send one frame")
 
 class VirtualECU(threading.Thread):
     def __init__(self, bus, name, fsm_instance, message_type, period):
@@ -20,6 +25,8 @@ class VirtualECU(threading.Thread):
         self.period = period
         self.stopped_event = threading.Event()
         self.daemon = True
+        self.sent = FRAMES_SENT.labels(name)
+        self.errors = SEND_ERRORS.labels(name)
 
     def run(self):
         while not self.stopped_event.is_set():
@@ -28,10 +35,12 @@ class VirtualECU(threading.Thread):
             try:
                 msg = self._generate_message()
                 self.bus.send(msg)
+                self.sent.inc()
             except can.CanError:
-                pass
+                self.errors.inc()
             
             elapsed = time.time() - start_time
+            SEND_SECONDS.observe(elapsed)
             time.sleep(max(0, self.period - elapsed))
 
     def _generate_message(self):
@@ -20,38 +20,75 @@ function App() {
     const [activeAttack, setActiveAttack] = useState(null);
     const logsEndRef = useRef(null);
 
-    // WebSocket Connection
+    const cursorRef = useRef(null);
+
+    // Apply a snapshot or delta frame from the dashboard stream
+    const applyFrame = (prev, frame) => {
+        if (frame.type === 'snapshot') {
+            const { type, seq, ...state } = frame;
+            return state;
+        }
+        const next = { ...prev };
+        if (frame.can) next.can = { ...prev.can, ...frame.can };
+        if (frame.logs) next.logs = [...prev.logs, ...frame.logs].slice(-50);
+        if (frame.alerts) next.alerts = [...prev.alerts, ...frame.alerts].slice(-10);
+        if (frame.status) next.status = frame.status;
+        if ('vehicle_state' in frame) next.vehicle_state = frame.vehicle_state;
+        if ('dos_active' in frame) next.dos_active = frame.dos_active;
+        if ('ids' in frame) next.ids = frame.ids;
+        return next;
+    };
+
+    // WebSocket Connection (resumes from the last applied seq after a reconnect)
     useEffect(() => {
-        console.log("Connecting to WebSocket:", WS_URL);
-        const ws = new WebSocket(WS_URL);
+        let ws = null;
+        let retryTimer = null;
+        let closed = false;
 
-        ws.onopen = () => {
-            console.log("WebSocket Connected");
-        };
+        const connect = () => {
+            const url = cursorRef.current !== null ? `${WS_URL}?cursor=${cursorRef.current}` : WS_URL;
+            console.log("Connecting to WebSocket:", url);
+            ws = new WebSocket(url);
+
+            ws.onopen = () => {
+                console.log("WebSocket Connected");
+            };
 
-        ws.onmessage = (event) => {
-            try {
-                const payload = JSON.parse(event.data);
-                setData(payload);
-                // Sync active attack state if backend reports attacker is off
-                if (!payload.status.Attacker && activeAttack) {
-                    setActiveAttack(null);
+            ws.onmessage = (event) => {
+                try {
+                    const frame = JSON.parse(event.data);
+                    if (frame.seq === undefined) return;
+                    cursorRef.current = frame.seq;
+                    setData(prev => applyFrame(prev, frame));
+                } catch (e) {
+                    console.error("Error parsing WebSocket message:", e);
                 }
-            } catch (e) {
-                console.error("Error parsing WebSocket message:", e);
-            }
-        };
+            };
+
+            ws.onerror = (error) => {
+                console.error("WebSocket Error:", error);
+            };
 
-        ws.onerror = (error) => {
-            console.error("WebSocket Error:", error);
+            ws.onclose = () => {
+                console.log("WebSocket Disconnected");
+                if (!closed) retryTimer = setTimeout(connect, 1000);
+            };
         };
 
-        ws.onclose = () => {
-            console.log("WebSocket Disconnected");
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            if (ws) ws.close();
         };
+    }, []);
 
-        return () => ws.close();
-    }, [activeAttack]);
+    // Sync active attack state if backend reports attacker is off
+    useEffect(() => {
+        if (!data.status.Attacker && activeAttack) {
+            setActiveAttack(null);
+        }
+    }, [data.status, activeAttack]);
 
     // Auto-scroll logs
     useEffect(() => {
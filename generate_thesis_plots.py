@@ -1,29 +1,21 @@
-import pandas as pd
-import joblib
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import os
 import sys
-from sklearn.metrics import confusion_matrix, classification_report, roc_curve, auc
 from pathlib import Path
 
 # Mute TensorFlow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
-from tensorflow.keras.models import load_model
+# pandas, sklearn, matplotlib and TensorFlow are imported in generate_plots(),
+# after the cheap checks, so a missing file is reported immediately
+
+# Feature Columns and model location (Must match training)
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.detection.detector import IDSDetector, MODEL_DIR
 
 # === CONFIGURATION ===
 BASE_DIR = Path(__file__).resolve().parent.parent # .../can_ids
 DATA_FILE = BASE_DIR / "research_features.csv"
-MODEL_OCSVM = BASE_DIR / "ocsvm_model.joblib"
-MODEL_AE = BASE_DIR / "autoencoder_model.keras"
-SCALER_PATH = BASE_DIR / "scaler.joblib"
-THRESH_PATH = BASE_DIR / "ae_threshold.npy"
 OUTPUT_DIR = BASE_DIR / "thesis_results"
 
-# Feature Columns (Must match training)
-FEATURE_COLS = ['msg_count', 'unique_ids', 'id_entropy', 'payload_entropy', 'iat_mean', 'iat_std']
-
 def generate_plots():
     print("📊 GENERATING THESIS RESULTS...")
     
@@ -35,12 +27,17 @@ def generate_plots():
         print(f"❌ Error: Data file {DATA_FILE} not found.")
         return
 
+    import numpy as np
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.metrics import confusion_matrix, classification_report
+
     print("   Loading Data & Models...", end=" ")
     df = pd.read_csv(DATA_FILE)
-    scaler = joblib.load(SCALER_PATH)
-    ocsvm = joblib.load(MODEL_OCSVM)
-    autoencoder = load_model(MODEL_AE)
-    ae_threshold = np.load(THRESH_PATH)
+    # The bundle if there is one, else the four training artifacts
+    detector = IDSDetector.load(MODEL_DIR)
+    scaler, ocsvm, autoencoder, ae_threshold = detector.scaler, detector.ocsvm, detector.autoencoder, detector.ae_threshold
     print("✅ Done.")
 
     # 3. Preprocessing
@@ -1,172 +1,268 @@
-import can
 import time
-import joblib
-import numpy as np
-import pandas as pd
 import math
 import sys
 import os
+import argparse
+import signal
+import threading
 import warnings
-from collections import Counter
-from pathlib import Path
 
-# Silence TF logs
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
-import tensorflow as tf
-from tensorflow.keras.models import load_model
+# Only NumPy-level imports here: python-can, TensorFlow and sklearn load on the paths that use them
+from can_ids.detection.features import WINDOW_SIZE
+from can_ids.detection.detector import IDSDetector, MODEL_DIR, STAGE_SECONDS
+from can_ids.detection.cascade import CASCADE_FILENAME
+from can_ids.detection.periodicity import PERIODICITY_FILENAME
+from can_ids.detection.transitions import TRANSITIONS_FILENAME
+from can_ids.detection.payload import PAYLOAD_FILENAME
+from can_ids.detection.sketch import SketchWindow
+from can_ids.detection.verdict_ipc import VerdictPublisher, DEFAULT_SOCKET
+from can_ids.detection.model_server import RemoteIDSDetector, DEFAULT_SOCKET as MODEL_SOCKET
+from can_ids.metrics import registry, start_http_server
+from can_ids.profiling import StageProfiler
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
 
 # === CONFIGURATION ===
-BASE_DIR = Path(__file__).resolve().parent.parent 
-MODEL_PATH = BASE_DIR / "ocsvm_model.joblib"
-SCALER_PATH = BASE_DIR / "scaler.joblib"
-AE_MODEL_PATH = BASE_DIR / "autoencoder_model.keras"
-AE_THRESH_PATH = BASE_DIR / "ae_threshold.npy"
 INTERFACE = "vcan0"
-WINDOW_SIZE = 0.1 
-
-# Feature names must match training
-FEATURE_COLS = ['msg_count', 'unique_ids', 'id_entropy', 'payload_entropy', 'iat_mean', 'iat_std']
-
-def calculate_entropy(data_list):
-    if not data_list: return 0.0
-    counts = Counter(data_list)
-    total = len(data_list)
-    probs = [c / total for c in counts.values()]
-    return -sum(p * math.log2(p) for p in probs)
-
-def extract_window_features(messages):
-    if not messages: return None
-    msg_count = len(messages)
-    ids = [m.arbitration_id for m in messages]
-    payloads = [m.data.hex() for m in messages]
-    timestamps = [m.timestamp for m in messages]
-
-    unique_ids = len(set(ids))
-    id_entropy = calculate_entropy(ids)
-    payload_entropy = calculate_entropy(payloads)
-
-    if len(timestamps) > 1:
-        iats = np.diff(timestamps)
-        iat_mean = np.mean(iats)
-        iat_std = np.std(iats)
-    else:
-        iat_mean = 0.0
-        iat_std = 0.0
-
-    return pd.DataFrame([[msg_count, unique_ids, id_entropy, payload_entropy, iat_mean, iat_std]], 
-                        columns=FEATURE_COLS)
-
-def diagnose_attack(features_df):
-    # Extract scalar values
-    count = features_df['msg_count'].values[0]
-    iat = features_df['iat_mean'].values[0]
-    
-    # === FINAL TUNED THRESHOLDS ===
-    # Normal: ~8-12 msgs
-    # New Context Spoof: ~28-35 msgs (Precision Injection)
-    # Replay: ~50 msgs
-    # Flooding: >1000 msgs
-    
-    # A safe line for "Massive Volume" vs "Injection"
-    if count > 100 or iat < 0.001:
-        return "FLOODING / DOS"
-    elif count > 20:
-        # 20-60 messages is the signature of Spoofing/Replay
-        # Increased to >20 to avoid jitter false positives (Normal is ~9)
-        return "SPOOFING / REPLAY"
-    else:
-        return "ANOMALY"
+MAX_BATCH_WINDOWS = 64 # Upper bound on windows scored in one catch-up call
+
+FRAMES = registry.counter("ids_frames_total", "Frames received by the live IDS")
+RECV_SECONDS = STAGE_SECONDS.labels("recv")
+
+def reload_async(detector):
+    """SIGHUP: re-reads the bundle off the receive loop and swaps it in between windows."""
+    def run():
+        try:
+            version = detector.reload()
+            print(f"\n🔄 Models reloaded ({version}). Threshold: {detector.ae_threshold:.5f}", flush=True)
+        except Exception as e:
+            print(f"\n❌ Reload failed, keeping {detector.models.version}: {e}", flush=True)
+    threading.Thread(target=run, daemon=True).start()
 
 def main():
+    parser = argparse.ArgumentParser(description="Live CAN IDS (OCSVM + Autoencoder)")
+    parser.add_argument("--interface", default=INTERFACE)
+    parser.add_argument("--publish", nargs="?", const=DEFAULT_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Publish every window verdict over a Unix socket (default {DEFAULT_SOCKET})")
+    parser.add_argument("--model-server", nargs="?", const=MODEL_SOCKET, default=None, metavar="SOCKET",
+                        help=f"Score on a running model server instead of loading the models (default {MODEL_SOCKET})")
+    parser.add_argument("--bundle", default=None, metavar="PATH",
+                        help="Load this model bundle (default: <model dir>/ids_model.bundle if present, else the artifacts)")
+    parser.add_argument("--no-cascade", action="store_true",
+                        help="Score every window with the models, even if a calibrated cascade config exists")
+    parser.add_argument("--no-periodicity", action="store_true",
+                        help="Disable the per-ID timing check (early frames, unknown IDs)")
+    parser.add_argument("--no-transitions", action="store_true",
+                        help="Disable the ID transition model, even if one was trained")
+    parser.add_argument("--no-payload", action="store_true",
+                        help="Disable the per-ID payload check (unseen byte values, bit-flip rate), even if profiled")
+    parser.add_argument("--no-physics", action="store_true",
+                        help="Disable the vehicle physics check (RPM band per gear, RPM/gear rate limits)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Refresh the scaler and AE threshold online from benign windows (follows slow drift)")
+    parser.add_argument("--features", choices=("exact", "sketch"), default="exact",
+                        help="sketch: fold frames into fixed-size sketches instead of buffering them "
+                             "(bounded memory under floods; see can_ids/detection/sketch.py for accuracy)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port (http://127.0.0.1:PORT/metrics)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage per window and print a latency/allocation report on exit")
+    parser.add_argument("--profile-out", default=None, metavar="JSON", help="Also write the profile report to this file")
+    parser.add_argument("--profile-alloc-every", type=int, default=50, metavar="N",
+                        help="Trace allocations (tracemalloc) in every Nth window, 0 to disable (default 50)")
+    args = parser.parse_args()
+
     print("🛡️  RESEARCH-GRADE IDS: DETECTION & DIAGNOSIS ACTIVE...")
     
+    publisher = None
+    profiler = None
     try:
-        scaler = joblib.load(SCALER_PATH)
-        ocsvm = joblib.load(MODEL_PATH)
-        autoencoder = load_model(AE_MODEL_PATH)
-        ae_threshold = np.load(AE_THRESH_PATH)
-        print("✅ Loaded AI Models.")
-        print(f"   Autoencoder Threshold: {ae_threshold:.5f}")
+        detector = None
+        if args.model_server:
+            try:
+                detector = RemoteIDSDetector.connect(args.model_server)
+                print(f"✅ Using warm models from {args.model_server} (generation {detector.generation}).")
+            except OSError as e:
+                print(f"⚠️  Model server unavailable ({e}), loading models locally...")
+        if detector is None:
+            cascade = not args.no_cascade
+            periodicity = not args.no_periodicity
+            transitions = not args.no_transitions
+            payload = not args.no_payload
+            physics = not args.no_physics
+            detector = IDSDetector.load_bundle(args.bundle, cascade=cascade, periodicity=periodicity,
+                                               transitions=transitions, payload=payload, physics=physics) \
+                if args.bundle else \
+                IDSDetector.load(MODEL_DIR, cascade=cascade, periodicity=periodicity, transitions=transitions,
+                                 payload=payload, physics=physics)
+            print(f"✅ Loaded AI Models ({detector.models.version}).")
+        elif not args.no_cascade:
+            detector.attach_cascade(MODEL_DIR / CASCADE_FILENAME)
+        print(f"   Autoencoder Threshold: {detector.ae_threshold:.5f}")
+        if detector.cascade is not None:
+            print(f"   Cascade: rules + benign box gate the models (drift check every {detector.cascade.config.drift_every})")
+        if not args.no_periodicity:
+            if detector.periodicity is not None or detector.attach_periodicity(MODEL_DIR / PERIODICITY_FILENAME):
+                print(f"   Periodicity: {int(detector.periodicity.known.sum())} IDs profiled")
+            else:
+                detector.attach_periodicity()
+                print(f"   Periodicity: no profile, learning IDs for {detector.periodicity.learn_seconds:.0f}s")
+        if not args.no_transitions and (detector.transitions is not None or
+                                        detector.attach_transitions(MODEL_DIR / TRANSITIONS_FILENAME)):
+            print(f"   Transitions: {len(detector.transitions.known_ids)} IDs, "
+                  f"threshold {detector.transitions.threshold:.3f} nats/frame")
+        if not args.no_payload and (detector.payload is not None or
+                                    detector.attach_payload(MODEL_DIR / PAYLOAD_FILENAME)):
+            print(f"   Payload: {len(detector.payload.known_ids)} IDs profiled, "
+                  f"flip threshold {detector.payload.flip_threshold:.1f} bits/window")
+        if not args.no_physics and (detector.physics is not None or detector.attach_physics()):
+            print(f"   Physics: RPM band per gear, rate limits ({detector.physics.min_violations}+ frames per window)")
+        if args.adaptive and detector.attach_adaptive():
+            adaptive = detector.adaptive
+            print(f"   Adaptive: refresh every {adaptive.refresh_windows} benign windows "
+                  f"({'threshold only' if adaptive.trained is None else 'scaler + threshold'}, "
+                  f"within x{adaptive.max_drift:g} of the trained baseline)")
+        if detector.models.path is not None:
+            signal.signal(signal.SIGHUP, lambda *_: reload_async(detector))
         
-        bus = can.ThreadSafeBus(channel=INTERFACE, interface='socketcan')
-        print(f"   Connected to {INTERFACE}. Monitoring...")
+        from can_ids.bus_mux import open_bus
+        bus = open_bus(args.interface, name="ids")
+        print(f"   Connected to {args.interface}. Monitoring...")
+
+        if args.publish:
+            publisher = VerdictPublisher(args.publish)
+            print(f"   Publishing verdicts on {args.publish}")
+        if args.metrics_port:
+            start_http_server(args.metrics_port)
+            print(f"   Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        if args.profile or args.profile_out:
+            profiler = StageProfiler(alloc_sample_every=args.profile_alloc_every)
+            detector.on_stage = profiler.on_stage
+            print("   Profiling enabled (report on exit)")
     except Exception as e:
         print(f"❌ Setup Error: {e}")
         return
 
+    sketch = SketchWindow(detector.periodicity, detector.transitions, detector.payload, detector.physics) if args.features == "sketch" else None
+    if sketch is not None:
+        print(f"   Features: fixed-size sketches ({sketch.nbytes() / 1024:.0f} KiB, frames are not buffered)")
     print("-" * 60)
     print("   STATUS:  [🟢 MONITORING]")
     print("-" * 60)
 
     message_buffer = []
+    pending = [] # Summaries of closed windows not scored yet
+    summary_ns = 0 # Time spent building the pending summaries, part of their profiled window time
+
+    def close_window(window_end):
+        nonlocal message_buffer, summary_ns
+        if profiler is not None:
+            # Feature extraction belongs to the window: trace and time it with the scoring
+            profiler.begin_window()
+            profiler.mark()
+            t0 = time.perf_counter_ns()
+        if sketch is not None:
+            summary = sketch.close(window_end)
+        else:
+            summary = detector.summarize(message_buffer, window_end) if message_buffer else None
+            message_buffer = []
+        if profiler is not None:
+            ns = time.perf_counter_ns() - t0
+            profiler.record("summary", ns)
+            summary_ns += ns
+        if summary is not None:
+            pending.append(summary)
     next_window_end = time.time() + WINDOW_SIZE
-    
-    anomaly_streak = 0
-    ALERT_THRESHOLD = 3 
+    web_mode = bool(os.environ.get("WEB_UI"))
 
     try:
         while True:
-            remaining = next_window_end - time.time()
-            if remaining > 0:
-                msg = bus.recv(timeout=remaining)
-                if msg: message_buffer.append(msg)
-            
-            if time.time() >= next_window_end:
-                if message_buffer:
-                    features_df = extract_window_features(message_buffer)
-                    
-                    if features_df is not None:
-                        scaled = scaler.transform(features_df)
-                        
-                        # Ensemble Prediction
-                        ocsvm_pred = ocsvm.predict(scaled)[0]
-                        is_ocsvm_anomaly = (ocsvm_pred == -1)
-
-                        reconstruction = autoencoder.predict(scaled, verbose=0)
-                        mse = np.mean(np.power(scaled - reconstruction, 2))
-                        is_ae_anomaly = (mse > ae_threshold)
-
-                        if is_ocsvm_anomaly or is_ae_anomaly:
-                            anomaly_streak += 1
-                            debug_str = ""
-                            if is_ocsvm_anomaly: debug_str += "[SVM]"
-                            if is_ae_anomaly: debug_str += f"[AE:{mse:.1f}]"
-                        else:
-                            anomaly_streak = 0
-                        
-                        # Display
-                        count = len(message_buffer)
-                        
-                        if os.environ.get("WEB_UI"):
-                            # Web Mode: Print newlines for backend capture
-                            if anomaly_streak >= ALERT_THRESHOLD:
-                                attack_name = diagnose_attack(features_df)
-                                if attack_name == "ANOMALY":
-                                    # Don't trigger a full red ALERT for low-volume anomalies (likely false positives)
-                                    pass 
-                                else:
-                                    print(f"🚨 ALERT: {attack_name} | Vol: {count} | {debug_str}", flush=True)
-                        else:
-                            # Terminal Mode: Use \r for inplace updates
-                            if anomaly_streak >= ALERT_THRESHOLD:
-                                attack_name = diagnose_attack(features_df)
-                                print(f"\r🚨 ALERT: {attack_name:<18} | Vol: {count:<4} | {debug_str}            ", end="")
-                            elif anomaly_streak > 0:
-                                print(f"\r⚠️  CHECKING...              | Vol: {count:<4} | {debug_str}            ", end="")
-                            else:
-                                print(f"\r🟢 NORMAL                   | Vol: {count:<4} | AE: {mse:.4f}      ", end="")
+            # Windows are cut by frame timestamp. While frames are still queued (we fell
+            # behind), keep reading without blocking and score every closed window at once.
+            timeout = 0 if pending else max(0.0, next_window_end - time.time())
+            t0 = time.perf_counter_ns()
+            msg = bus.recv(timeout=timeout)
+            if msg is not None:
+                recv_ns = time.perf_counter_ns() - t0
+                RECV_SECONDS.observe(recv_ns / 1e9)
+                FRAMES.inc()
+                if profiler is not None:
+                    profiler.record("recv", recv_ns)
+                if msg.timestamp > next_window_end:
+                    close_window(next_window_end)
+                    # Skip straight over idle gaps
+                    next_window_end += math.ceil((msg.timestamp - next_window_end) / WINDOW_SIZE) * WINDOW_SIZE
+                if sketch is not None:
+                    sketch.add(msg)
+                else:
+                    message_buffer.append(msg)
+                if len(pending) < MAX_BATCH_WINDOWS:
+                    continue
+            elif time.time() >= next_window_end:
+                close_window(next_window_end)
+                next_window_end += WINDOW_SIZE
+                if next_window_end < time.time():
+                    next_window_end = time.time() + WINDOW_SIZE
+
+            if not pending:
+                continue
+            if profiler is not None:
+                profiler.mark()
+                t0 = time.perf_counter_ns()
+            verdicts = detector.process_summaries(pending)
+            if profiler is not None:
+                score_ns = time.perf_counter_ns() - t0
+                profiler.record("score", score_ns)
+                profiler.record("window" if len(pending) == 1 else "catchup", summary_ns + score_ns)
+                now = time.time()
+                for summary in pending:
+                    profiler.end_window(int(summary.vector[0]), now - summary.window_end)
+                if len(pending) > 1:
+                    profiler.record_catchup(len(pending), now - pending[0].window_end)
+            pending = []
+            summary_ns = 0
+
+            for verdict in verdicts:
+                if verdict is None:
+                    continue
+                if publisher is not None:
+                    publisher.publish(verdict)
+
+                # Display
+                count = verdict.msg_count
+                debug_str = verdict.debug_str
                 
-                message_buffer = []
-                next_window_end = time.time() + WINDOW_SIZE
-                sys.stdout.flush()
+                if web_mode:
+                    # Web Mode: Print newlines for backend capture
+                    # (when publishing, the backend gets structured verdicts instead)
+                    if verdict.alert and publisher is None:
+                        print(f"🚨 ALERT: {verdict.attack} | Vol: {count} | {debug_str}", flush=True)
+                else:
+                    # Terminal Mode: Use \r for inplace updates
+                    if verdict.attack is not None:
+                        print(f"\r🚨 ALERT: {verdict.attack:<18} | Vol: {count:<4} | {debug_str}            ", end="")
+                    elif verdict.streak > 0:
+                        print(f"\r⚠️  CHECKING...              | Vol: {count:<4} | {debug_str}            ", end="")
+                    else:
+                        score = f"AE: {verdict.ae_mse:.4f}" if verdict.stage != "bounds" else "gated   "
+                        print(f"\r🟢 NORMAL                   | Vol: {count:<4} | {score}      ", end="")
+            sys.stdout.flush()
 
     except KeyboardInterrupt:
         print("\n🛑 IDS Stopped.")
     finally:
         bus.shutdown()
+        if publisher is not None:
+            publisher.close()
+        if profiler is not None:
+            print(profiler.format_report())
+            if detector.cascade is not None:
+                rates = " | ".join(f"{stage} {rate:.1%}" for stage, rate in detector.cascade.hit_rates().items())
+                print(f"   Cascade: {rates} | drift misses {detector.cascade.drift_misses}")
+            if args.profile_out:
+                profiler.dump(args.profile_out)
+                print(f"   Report written to {args.profile_out}")
 
 if __name__ == "__main__":
     main()
@@ -6,6 +6,11 @@ import threading
 import argparse
 from can_ids.simulation.vehicle_fsm import VehicleFSM
 from can_ids.simulation.virtual_ecu import VirtualECU
+from can_ids.bus_mux import open_bus
+from can_ids.metrics import registry, start_http_server
+
+BUS_FRAMES = registry.counter("sim_bus_frames_total", "Frames seen on the bus by the simulator dashboard")
+BUS_RATE = registry.gauge("sim_bus_rate", "Bus load in frames per second, updated every second")
 
 # Global Dashboard State
 dashboard_view = {
@@ -23,13 +28,14 @@ def dashboard_listener(interface):
     Also counts total messages to show 'Bus Load'.
     """
     try:
-        bus = can.ThreadSafeBus(channel=interface, interface='socketcan')
+        bus = open_bus(interface, name="simulator")
         while True:
             msg = bus.recv(timeout=0.01)
             if not msg: continue
             
             # Increment global counter for every single message (even 0x000)
             dashboard_view["Msg_Count"] += 1
+            BUS_FRAMES.inc()
             
             current_time = time.time()
             
@@ -49,9 +55,14 @@ def dashboard_listener(interface):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--interface", default="vcan0")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port (http://127.0.0.1:PORT/metrics)")
     args = parser.parse_args()
 
     print(f"🚗 Starting Research-Grade Simulator on {args.interface}...")
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+        print(f"   Metrics on http://127.0.0.1:{args.metrics_port}/metrics")
     
     vehicle = VehicleFSM()
     
@@ -93,6 +104,7 @@ def main():
                 
                 # Store rate for display (hacky but works for print loop)
                 dashboard_view["Rate"] = rate
+                BUS_RATE.set(rate)
 
             # C. Visualize
             state_name = vehicle.get_state_data()['state']
@@ -2,15 +2,41 @@ import unittest
 import time
 import os
 import sys
+import socket
+import tempfile
+import threading
+import tracemalloc
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
 # Add framework to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# Keep the backend's event database out of the project root
+os.environ.setdefault("IDS_EVENT_DB", os.path.join(tempfile.mkdtemp(), "ids_events.db"))
+os.environ.setdefault("IDS_LOG_DIR", tempfile.mkdtemp())
 
 from can_ids.simulation.vehicle_fsm import VehicleFSM, VehicleState
 from can_ids.processing.build_features import calculate_entropy, process_window
+from backend.ring_buffer import SequencedRing
+from backend.process_manager import ProcessManager
+from backend.can_listener import CANListener
+from backend.timeseries import SignalRing, downsample_minmax, downsample_lttb
+from backend.alert_store import AlertStore
+from backend.log_store import LogStore
+from backend.broadcaster import DashboardBroadcaster, CLIENT_QUEUE_SIZE
+import json
+import can
+from can_ids.detection.detector import diagnose_attack, Verdict, IDSDetector
+from can_ids.detection.features import FEATURE_COLS
+from can_ids.detection.model_server import ModelServer, RemoteIDSDetector
+from can_ids.detection.verdict_ipc import (encode_verdict, decode_verdict, VerdictPublisher,
+                                           VerdictSubscriber, VERDICT_SIZE)
+from can_ids.attacks.replay import iter_log_frames
+from can_ids.metrics import MetricsRegistry
+from can_ids.profiling import HdrHistogram, StageProfiler
+from can_ids.bus_mux import CANMux, MuxConsumer, MuxBus, mux_available
+from can_ids.attacks.stress import encode_frame, decode_frame, build_frame_pool, CAN_FRAME_SIZE
 
 class TestVehiclePhysics(unittest.TestCase):
     def setUp(self):
@@ -80,6 +106,937 @@ class TestFeatureEngineering(unittest.TestCase):
         self.assertAlmostEqual(features['iat_mean'], 0.02)
         self.assertEqual(features['label'], 0)
 
+class TestDetectorVerdicts(unittest.TestCase):
+    def test_diagnosis_rules(self):
+        self.assertEqual(diagnose_attack({'msg_count': 1200, 'iat_mean': 0.0001}), "FLOODING / DOS")
+        self.assertEqual(diagnose_attack({'msg_count': 35, 'iat_mean': 0.003}), "SPOOFING / REPLAY")
+        self.assertEqual(diagnose_attack({'msg_count': 12, 'iat_mean': 0.008}), "ANOMALY")
+
+    def test_low_volume_anomaly_is_not_an_alert(self):
+        """Test if an ANOMALY diagnosis never raises a full alert."""
+        verdict = Verdict(window_end=1.0, msg_count=12, features={}, ocsvm_anomaly=True, ocsvm_score=-0.1,
+                          ae_mse=0.5, ae_anomaly=False, streak=3, attack="ANOMALY")
+        self.assertFalse(verdict.alert)
+        self.assertEqual(verdict.debug_str, "[SVM]")
+
+    def test_verdict_ipc_roundtrip(self):
+        """Test if verdicts survive the binary framing and the Unix socket."""
+        features = {'msg_count': 1200, 'iat_mean': 0.0001, 'iat_std': 0.0, 'id_entropy': 0.0,
+                    'unique_ids': 1, 'payload_entropy': 0.0}
+        verdict = Verdict(window_end=1763994029.75, msg_count=1200, features=features, ocsvm_anomaly=True,
+                          ocsvm_score=-2.5, ae_mse=9.0, ae_anomaly=True, streak=4, attack="FLOODING / DOS", latency=0.25)
+        data = encode_verdict(verdict)
+        self.assertEqual(len(data), VERDICT_SIZE)
+        decoded = decode_verdict(data)
+        self.assertEqual((decoded.attack, decoded.streak, decoded.msg_count), ("FLOODING / DOS", 4, 1200))
+        self.assertTrue(decoded.ocsvm_anomaly and decoded.ae_anomaly)
+        for col, value in features.items():
+            self.assertAlmostEqual(decoded.features[col], value, places=6)
+        # Every check's flag survives on its own, and the decoded verdict still renders
+        for flag, extra in (("rule_anomaly", {"stage": "rule"}), ("timing_anomaly", {}), ("sequence_anomaly", {}),
+                            ("payload_anomaly", {}), ("physics_anomaly", {})):
+            flagged = Verdict(**{**verdict.__dict__, flag: True, **extra})
+            decoded = decode_verdict(encode_verdict(flagged))
+            self.assertTrue(getattr(decoded, flag), flag)
+            self.assertEqual(decoded.stage, flagged.stage)
+            self.assertEqual(decoded.is_anomaly, flagged.is_anomaly)
+            self.assertIsInstance(decoded.debug_str, str)
+        payload = {'byte_entropy': 2.5, 'bit_flip_rate': 0.125, 'out_of_range': 0.5, 'flip_excess': 40.0}
+        scored = Verdict(**{**verdict.__dict__, "timing_anomaly": True, "early_frames": 3, "unknown_ids": 2,
+                            "sequence_anomaly": True, "sequence_score": 4.5, "payload_anomaly": True,
+                            "payload": payload, "physics_anomaly": True, "physics_score": 7})
+        decoded = decode_verdict(encode_verdict(scored))
+        self.assertEqual(decoded.debug_str, scored.debug_str)
+        self.assertEqual(decoded.payload, payload)
+        self.assertIsNone(decode_verdict(encode_verdict(verdict)).payload)
+        with self.assertRaises(ValueError): # Records of another version are refused, not misread
+            decode_verdict(bytes([1]) + data[1:])
+
+        path = os.path.join(tempfile.mkdtemp(), "verdicts.sock")
+        publisher = VerdictPublisher(path)
+        subscriber = VerdictSubscriber(path, connect_timeout=1.0)
+        try:
+            publisher.publish(verdict)
+            received = subscriber.recv(timeout=1.0)
+            self.assertTrue(received.alert)
+            self.assertEqual(received.window_end, verdict.window_end)
+        finally:
+            subscriber.close()
+            publisher.close()
+
+    def test_batched_windows_match_sequential(self):
+        """Test if catch-up batch scoring gives the same verdicts and streak as one window at a time."""
+        class Identity:
+            def transform(self, X): return np.asarray(X, dtype=np.float64)
+        class VolumeSVM: # Anomalous above 20 frames per window
+            def decision_function(self, X): return 1.0 - np.asarray(X)[:, 0] / 20.0
+        def make():
+            return IDSDetector(Identity(), VolumeSVM(), lambda x, training=False: x, ae_threshold=1.0)
+
+        def window(n, end):
+            return [can.Message(timestamp=end - 0.1 + i * 0.1 / n, arbitration_id=0x123, data=bytes([i % 256]),
+                                is_extended_id=False)
+                    for i in range(n)]
+        windows = [(window(n, 1.0 + 0.1 * k), 1.0 + 0.1 * k) for k, n in enumerate([10, 50, 50, 50, 10])]
+        windows.insert(2, ([], 1.15))
+        sequential = make()
+        expected = [sequential.process_window(msgs, end) for msgs, end in windows]
+        batched = make().process_windows(windows)
+        self.assertIsNone(batched[2])
+        self.assertEqual([(v.streak, v.attack, v.ocsvm_anomaly) for v in batched if v],
+                         [(v.streak, v.attack, v.ocsvm_anomaly) for v in expected if v])
+        self.assertEqual(batched[4].attack, "SPOOFING / REPLAY")
+
+class TestCascade(unittest.TestCase):
+    def test_calibrated_cascade_matches_models(self):
+        """Test if the cheap stages skip the models without changing any verdict."""
+        from can_ids.detection.cascade import Cascade, calibrate, evaluate
+        class Identity:
+            def transform(self, X): return np.asarray(X, dtype=np.float64)
+        class VolumeSVM: # Anomalous above 20 frames per window
+            def decision_function(self, X): return 1.0 - np.asarray(X)[:, 0] / 20.0
+        detector = IDSDetector(Identity(), VolumeSVM(), lambda x, training=False: x * 0.9, ae_threshold=1.0)
+
+        rng = np.random.default_rng(3)
+        X = np.column_stack([rng.integers(5, 40, 2000), np.full(2000, 3), rng.uniform(1.2, 1.4, 2000),
+                             rng.uniform(1.5, 2.0, 2000), rng.uniform(0.008, 0.014, 2000), rng.uniform(0.005, 0.01, 2000)])
+        detector.cascade = Cascade(calibrate(detector, X[:1000], drift_every=10))
+        result = evaluate(detector, X[1000:])
+        self.assertEqual(result["missed_vs_full"], 0)
+        self.assertGreater(result["stages"]["bounds"], 200)
+        self.assertGreater(result["stages"]["drift"], 0)
+
+        flood = [can.Message(timestamp=i * 0.0001, arbitration_id=0x000, data=b'\x00',
+                             is_extended_id=False) for i in range(500)]
+        verdict = detector.process_window(flood, 1.0)
+        self.assertEqual((verdict.stage, verdict.rule_anomaly, verdict.debug_str), ("rule", True, "[RULE]"))
+        decoded = decode_verdict(encode_verdict(verdict))
+        self.assertEqual((decoded.stage, decoded.rule_anomaly, decoded.ocsvm_anomaly), ("rule", True, False))
+
+class TestPeriodicity(unittest.TestCase):
+    def setUp(self):
+        from can_ids.detection.periodicity import PeriodicityDetector
+        # 0x123 at 50 Hz, 0x310 at 10 Hz, with a little jitter
+        rng = np.random.default_rng(5)
+        ids = np.r_[np.full(1000, 0x123), np.full(200, 0x310)]
+        timestamps = np.r_[np.arange(1000) * 0.02, np.arange(200) * 0.1] + rng.normal(0, 0.0003, 1200)
+        self.profile = PeriodicityDetector().fit(ids, timestamps)
+
+    def test_fit_learns_periods(self):
+        self.assertAlmostEqual(self.profile.period[0x123], 0.02, places=3)
+        self.assertAlmostEqual(self.profile.period[0x310], 0.1, places=3)
+        self.assertEqual(int(self.profile.known.sum()), 2)
+
+    def test_spoof_and_unknown_id_flagged(self):
+        """Test if a 200 Hz spoof between genuine 10 Hz frames and an unseen ID are flagged, and nothing else."""
+        path = os.path.join(tempfile.mkdtemp(), "ids_periodicity.npz")
+        self.profile.save(path)
+        class Identity:
+            def transform(self, X): return np.asarray(X, dtype=np.float64)
+        class PassSVM: # The models pass everything; only timing can flag
+            def decision_function(self, X): return np.ones(len(X))
+        detector = IDSDetector(Identity(), PassSVM(), lambda x, training=False: x, ae_threshold=1e9)
+        self.assertTrue(detector.attach_periodicity(path))
+
+        def window(start, spoof=False, unknown=False):
+            frames = [(start + i * 0.02, 0x123) for i in range(5)] + [(start + 0.05, 0x310)]
+            if spoof:
+                frames += [(start + 0.001 + i * 0.005, 0x310) for i in range(20)]
+            if unknown:
+                frames.append((start + 0.03, 0x7DF))
+            return [can.Message(timestamp=t, arbitration_id=i, data=b'\x00',
+                                is_extended_id=False) for t, i in sorted(frames)]
+
+        verdicts = [detector.process_window(window(k * 0.1), k * 0.1 + 0.1) for k in range(10)]
+        self.assertFalse(any(v.timing_anomaly for v in verdicts))
+        verdicts = [detector.process_window(window(k * 0.1, spoof=True), k * 0.1 + 0.1) for k in range(10, 13)]
+        self.assertTrue(all(v.timing_anomaly and v.early_frames >= 19 for v in verdicts))
+        self.assertEqual(verdicts[-1].attack, "SPOOFING / REPLAY")
+        # The genuine frames after the spoof are measured from the last accepted frame and pass
+        verdict = detector.process_window(window(1.3), 1.4)
+        self.assertEqual((verdict.early_frames, verdict.timing_anomaly), (0, False))
+        self.assertAlmostEqual(detector.periodicity.period[0x310], 0.1, places=3)
+
+        verdicts = [detector.process_window(window(k * 0.1, unknown=True), k * 0.1 + 0.1) for k in range(14, 17)]
+        self.assertEqual([v.unknown_ids for v in verdicts], [1, 1, 1])
+        self.assertEqual(verdicts[-1].attack, "UNKNOWN ID")
+        decoded = decode_verdict(encode_verdict(verdicts[-1]))
+        self.assertEqual((decoded.attack, decoded.timing_anomaly), ("UNKNOWN ID", True))
+
+    def test_flood_rechained_without_blaming_genuine_frames(self):
+        """Test if a dense flood of a known ID is early frame by frame while its genuine 10 Hz frames pass."""
+        from can_ids.detection.periodicity import PeriodicityDetector
+        # 400 injected frames within 50 ms after each genuine one (the early limit is 60 ms)
+        frames = sorted([(k * 0.1 + 0.05, True) for k in range(5)] +
+                        [(k * 0.1 + 0.05 + t, False) for k in range(5) for t in np.linspace(0.001, 0.05, 400)])
+        for step_back in (False, True): # True: a clock restart, walked frame by frame
+            detector = PeriodicityDetector()
+            detector.period[0x310], detector.dev[0x310], detector.count[0x310] = 0.1, 0.001, 100
+            detector.last_ts[0x310] = -0.05
+            window = frames + [(-1.0, True)] * step_back
+            ts = np.array([t for t, _ in window])
+            is_genuine = np.array([g for _, g in window])
+            early, _ = detector.scan(np.full(len(ts), 0x310), ts)
+            self.assertFalse(early[is_genuine].any())
+            self.assertTrue(early[~is_genuine].all())
+            self.assertAlmostEqual(detector.period[0x310], 0.1, places=3)
+
+    def test_extended_id_not_aliased(self):
+        """Test if a 29-bit ID whose low 11 bits are a known ID is unknown and leaves that ID's state alone."""
+        from can_ids.detection.periodicity import PeriodicityDetector, frame_ids
+        from can_ids.detection.physics import PhysicsChecker
+        path = os.path.join(tempfile.mkdtemp(), "ids_periodicity.npz")
+        self.profile.save(path)
+        detector = PeriodicityDetector.load(path)
+        before = detector.period[0x310]
+        frames = [can.Message(timestamp=i * 0.001, arbitration_id=0x10000310, data=b'\x02\x00',
+                              is_extended_id=True) for i in range(20)]
+        early, unknown = detector.scan(frame_ids(frames), [m.timestamp for m in frames])
+        self.assertTrue(unknown.all())
+        self.assertFalse(early.any())
+        self.assertEqual((detector.period[0x310], np.isnan(detector.last_ts[0x310])), (before, True))
+        rpm = can.Message(timestamp=0.0, arbitration_id=0x123, data=int(2200 / 0.25).to_bytes(2, 'big'),
+                          is_extended_id=False)
+        gear = can.Message(timestamp=0.0, arbitration_id=0x310, data=b'\x05\x00', is_extended_id=False)
+        self.assertEqual(PhysicsChecker().window_score([rpm, gear] + frames), 0) # Not decoded as gear 2
+
+class TestTransitions(unittest.TestCase):
+    def test_reordered_ids_flagged(self):
+        """Test if the transition model passes the usual ID order and flags a replayed burst of one ID."""
+        from can_ids.detection.transitions import TransitionModel
+        rng = np.random.default_rng(7)
+        cycle = [0x123, 0x240, 0x123, 0x310]
+        benign = np.array(cycle * 2000)
+        swap = rng.random(len(benign)) < 0.02 # Occasional jitter in the order
+        benign[1:][swap[1:]], benign[:-1][swap[1:]] = benign[:-1][swap[1:]], benign[1:][swap[1:]]
+        model = TransitionModel.fit([benign], rolling=16)
+        # P(0x240 | 0x123) is about 1/2 in the cycle
+        self.assertAlmostEqual(float(model.nll[model.index[0x123], model.index[0x240]]), np.log(2), delta=0.1)
+
+        def window(ids):
+            return [can.Message(timestamp=i * 0.005, arbitration_id=can_id, data=b'\x00',
+                                is_extended_id=False) for i, can_id in enumerate(ids)]
+        scores = [model.window_score(window(cycle * 8)) for _ in range(20)]
+        self.assertTrue(all(score <= model.threshold for score in scores))
+        replay = cycle * 2 + [0x310] * 12 # Low volume: only the ID order gives it away
+        self.assertGreater(model.window_score(window(replay)), model.threshold)
+
+        path = os.path.join(tempfile.mkdtemp(), "ids_transitions.npz")
+        model.save(path)
+        class Identity:
+            def transform(self, X): return np.asarray(X, dtype=np.float64)
+        class PassSVM:
+            def decision_function(self, X): return np.ones(len(X))
+        detector = IDSDetector(Identity(), PassSVM(), lambda x, training=False: x, ae_threshold=1e9)
+        self.assertTrue(detector.attach_transitions(path))
+        verdicts = [detector.process_window(window(cycle * 8), 1.0) for _ in range(3)]
+        verdicts += [detector.process_window(window(replay), 1.0 + k) for k in range(3)]
+        self.assertEqual([v.sequence_anomaly for v in verdicts], [False] * 3 + [True] * 3)
+        self.assertEqual(verdicts[-1].attack, "SPOOFING / REPLAY")
+        self.assertTrue(decode_verdict(encode_verdict(verdicts[-1])).sequence_anomaly)
+
+class TestSketchFeatures(unittest.TestCase):
+    def test_sketch_matches_exact_and_stays_bounded(self):
+        """Test if the sketch backend reproduces the exact features and keeps a fixed footprint under a flood."""
+        from can_ids.detection.sketch import SketchWindow
+        from can_ids.detection.features import window_feature_vector
+        rng = np.random.default_rng(11)
+        sketch = SketchWindow(chunk=16, top_k=64) # Small chunks: every window crosses several folds
+        size = sketch.nbytes()
+        for _ in range(20):
+            n = int(rng.integers(2, 60))
+            window = [can.Message(timestamp=float(t), arbitration_id=int(rng.choice([0x123, 0x240, 0x310])),
+                                  data=bytes([int(rng.integers(0, 4)), 0x80]), is_extended_id=False)
+                      for t in np.cumsum(rng.uniform(0.001, 0.01, n))]
+            for msg in window:
+                sketch.add(msg)
+            summary = sketch.close(1.0)
+            np.testing.assert_allclose(summary.vector, window_feature_vector(window), rtol=1e-9, atol=1e-12)
+        self.assertIsNone(sketch.close(2.0))
+
+        flood = [can.Message(timestamp=i * 0.0001, arbitration_id=0x000, data=rng.bytes(8),
+                             is_extended_id=False) for i in range(3000)]
+        for msg in flood:
+            sketch.add(msg)
+        approx, exact = sketch.vector(), window_feature_vector(flood)
+        self.assertEqual(sketch.nbytes(), size)
+        np.testing.assert_allclose(approx[:3], exact[:3])
+        self.assertAlmostEqual(approx[FEATURE_COLS.index("payload_entropy")],
+                               exact[FEATURE_COLS.index("payload_entropy")], delta=0.2)
+
+class TestPayloadMonitor(unittest.TestCase):
+    def test_spoofed_and_unseen_bytes_flagged(self):
+        """Test if the payload check passes a steady gear signal and flags an interleaved spoof and an unseen value."""
+        from can_ids.detection.payload import PayloadMonitor, payload_matrix
+        from can_ids.detection.sketch import SketchWindow
+        rng = np.random.default_rng(5)
+        gears = np.repeat(rng.integers(0, 6, 40), 50) # A gear change every 50 frames
+        rpm = rng.integers(0, 256, len(gears))
+        benign = [(0x310, bytes([g, 0, 0, 0])) if i % 2 else (0x123, bytes([r, 0x20]))
+                  for i, (g, r) in enumerate(zip(gears, rpm))]
+        ids = np.array([can_id for can_id, _ in benign])
+        matrix, lengths = payload_matrix([data for _, data in benign])
+        monitor = PayloadMonitor.fit(ids, matrix, lengths, np.arange(len(ids)) * 0.005)
+        self.assertEqual(int(monitor.seen[monitor.index[0x310], 0].sum()), len(set(gears.tolist())))
+
+        def window(frames):
+            return [can.Message(timestamp=i * 0.005, arbitration_id=can_id, data=data, is_extended_id=False)
+                    for i, (can_id, data) in enumerate(frames)]
+        monitor.reset()
+        clean = [monitor.message_features(window(benign[k:k + 20])) for k in range(0, 400, 20)]
+        self.assertFalse(any(monitor.is_anomalous(f[2], f[3]) for f in clean))
+        spoof = [(0x310, bytes([2, 0, 0, 0])), (0x310, bytes([5, 0, 0, 0]))] * 10 # Genuine gear 2, spoofed 5
+        _, flip_rate, out_of_range, excess = monitor.message_features(window(spoof))
+        self.assertEqual(out_of_range, 0.0) # Every value is a real gear...
+        self.assertTrue(monitor.is_anomalous(out_of_range, excess)) # ...but it changes every frame
+        self.assertGreater(monitor.message_features(window([(0x310, bytes([9, 0, 0, 0]))]))[2], 0)
+
+        # The sketch backend accumulates the same values chunk by chunk
+        monitor.reset()
+        exact = monitor.message_features(window(benign[:300]))
+        monitor.reset()
+        sketch = SketchWindow(payload=monitor, chunk=16)
+        for msg in window(benign[:300]):
+            sketch.add(msg)
+        np.testing.assert_allclose(sketch.close(1.0).payload, exact)
+
+class TestPhysicsChecker(unittest.TestCase):
+    def test_context_spoof_breaks_physics(self):
+        """Test if the physics rules pass normal driving and flag a spoofed gear and the redline it causes."""
+        from can_ids.detection.physics import PhysicsChecker
+
+        def frames(t0, seconds, gear, rpm, spoof=None):
+            out = []
+            for k in range(int(seconds * 200)):
+                t = t0 + k * 0.005
+                if k % 4 == 0:
+                    out.append(can.Message(timestamp=t, arbitration_id=0x123, data=int(rpm / 0.25).to_bytes(2, 'big'),
+                                           is_extended_id=False))
+                if k % 20 == 1:
+                    out.append(can.Message(timestamp=t, arbitration_id=0x310, data=bytes([gear, 0, 0, 0]),
+                                           is_extended_id=False))
+                if spoof is not None and k % 20 != 1:
+                    out.append(can.Message(timestamp=t, arbitration_id=0x310, data=bytes([spoof, 0, 0, 0]),
+                                           is_extended_id=False))
+            return out
+        checker = PhysicsChecker()
+        cruise = frames(0.0, 1.0, 5, 2200) + frames(1.0, 1.0, 4, 2600) # One downshift
+        self.assertEqual(checker.window_score(cruise), 0)
+        self.assertFalse(checker.is_anomalous(checker.window_score(frames(2.0, 0.1, 4, 2600))))
+        checker.reset()
+        self.assertTrue(checker.is_anomalous(checker.window_score(frames(0.0, 0.1, 5, 2200, spoof=2)))) # 5 <-> 2
+        checker.reset()
+        self.assertTrue(checker.is_anomalous(checker.window_score(frames(0.0, 0.1, 2, 7200)))) # Redline in gear 2
+
+        class Identity:
+            def transform(self, X): return np.asarray(X, dtype=np.float64)
+        class PassSVM:
+            def decision_function(self, X): return np.ones(len(X))
+        detector = IDSDetector(Identity(), PassSVM(), lambda x, training=False: x, ae_threshold=1e9)
+        detector.attach_physics()
+        verdicts = [detector.process_window(frames(k * 0.1, 0.1, 5, 2200), k * 0.1 + 0.1) for k in range(3)]
+        verdicts += [detector.process_window(frames(0.3 + k * 0.1, 0.1, 5, 2200, spoof=2), 0.4 + k * 0.1)
+                     for k in range(3)]
+        self.assertEqual([v.physics_anomaly for v in verdicts], [False] * 3 + [True] * 3)
+        self.assertTrue(decode_verdict(encode_verdict(verdicts[-1])).physics_anomaly)
+
+class TestAdaptiveBaseline(unittest.TestCase):
+    def test_threshold_follows_benign_drift(self):
+        """Test if the adaptive baseline follows drifted benign traffic, drops the cascade and ignores a flood."""
+        from can_ids.detection.adaptive import P2Quantile
+        from can_ids.detection.cascade import Cascade, CascadeConfig
+        from can_ids.detection.detector import WindowSummary
+        from can_ids.detection.lite_model import LiteScaler
+        rng = np.random.default_rng(0)
+        values = rng.exponential(size=20000)
+        estimate = P2Quantile(0.99)
+        for v in values:
+            estimate.add(v)
+        self.assertAlmostEqual(estimate.value(), np.quantile(values, 0.99), delta=0.1)
+
+        class PassSVM:
+            def decision_function(self, X): return np.ones(len(X))
+        dim = len(FEATURE_COLS)
+        detector = IDSDetector(LiteScaler(np.zeros(dim), np.ones(dim)), PassSVM(), lambda x, training=False: x * 0,
+                               ae_threshold=3.0, version="v1")
+        # Empty box and no flood rule: the cascade only matters for which version it belongs to
+        detector.cascade = Cascade(CascadeConfig(lower=[0.0] * dim, upper=[0.0] * dim, flood_count=10 ** 9,
+                                                 flood_iat=-np.inf, model_version="v1"))
+        detector.attach_adaptive(refresh_windows=500)
+        run = lambda rows: [detector.process_summary(WindowSummary(row, 0.0)) for row in rows]
+        run(rng.normal(size=(1000, dim))) # Trained traffic: MSE ~ chi2(6)/6, 99.9% ~ 3.7
+        drifted = rng.normal(size=(4000, dim)) * 1.3
+        drifted[:, 0] += 1.0
+        before = np.mean([v.is_anomaly for v in run(drifted[:1000])])
+        after = np.mean([v.is_anomaly for v in run(drifted[1000:])[-1000:]])
+        self.assertLess(after, before)
+        self.assertGreater(detector.ae_threshold, 3.0)
+        self.assertGreater(detector.models.scaler.mean[0], 0.3)
+        self.assertEqual(detector.models.version, f"v1+a{detector.adaptive.refreshes}")
+        self.assertIsNone(detector.cascade) # Its box was calibrated against the trained scaler and threshold
+
+        threshold, refreshes = detector.ae_threshold, detector.adaptive.refreshes
+        verdicts = run(rng.normal(size=(1500, dim)) * 10) # Attack streak all the way
+        self.assertIsNotNone(verdicts[-1].attack)
+        self.assertEqual(detector.ae_threshold, threshold)
+        self.assertEqual(detector.adaptive.refreshes, refreshes)
+
+class TestModelServer(unittest.TestCase):
+    def test_remote_scores_match_local(self):
+        """Test if a RemoteIDSDetector gets the same scores as the served models."""
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.svm import OneClassSVM
+        train = pd.DataFrame(np.random.default_rng(1).normal(size=(200, len(FEATURE_COLS))), columns=FEATURE_COLS)
+        scaler = StandardScaler().fit(train)
+        ocsvm = OneClassSVM(nu=0.05, gamma=0.2).fit(scaler.transform(train))
+        local = IDSDetector(scaler, ocsvm, lambda x, training=False: x * 0.5, ae_threshold=1.5)
+
+        path = os.path.join(tempfile.mkdtemp(), "models.sock")
+        server = ModelServer(path, batch_wait=0)
+        server.detector, server.generation = local, 1
+        thread = threading.Thread(target=server.serve, daemon=True)
+        thread.start()
+        try:
+            for _ in range(50):
+                if os.path.exists(path): break
+                time.sleep(0.01)
+            remote = RemoteIDSDetector.connect(path)
+            self.assertEqual(remote.ae_threshold, 1.5)
+            rows = train.values[:5] * 3
+            expected_scores, expected_mses = local.score_batch(rows)
+            scores, mses = remote.score_batch(rows)
+            np.testing.assert_allclose(scores, expected_scores)
+            np.testing.assert_allclose(mses, expected_mses)
+            # Malformed requests fail on their own; the server keeps serving every client
+            from can_ids.detection.model_server import MSG_SCORE, MSG_RELOAD
+            with self.assertRaises(RuntimeError):
+                remote.client._request(MSG_SCORE, rows=5, payload=rows[:2].tobytes())
+            with self.assertRaises(RuntimeError):
+                remote.client._request(MSG_RELOAD, payload=b"{not json")
+            np.testing.assert_allclose(remote.score_batch(rows)[0], expected_scores)
+            remote.client.close()
+        finally:
+            server.stop()
+            thread.join(timeout=2)
+
+class _Dense:
+    """Stand-in for a Keras Dense layer: what model_arrays() reads from one."""
+    def __init__(self, w, b, activation):
+        self.name, self.w, self.b, self.activation = "dense", w, b, activation
+    def get_weights(self):
+        return [self.w, self.b]
+    def get_config(self):
+        return {"activation": self.activation}
+_Dense.__name__ = "Dense"
+
+class TestModelBundle(unittest.TestCase):
+    def setUp(self):
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.svm import OneClassSVM
+        self.train = np.random.default_rng(2).normal(size=(200, len(FEATURE_COLS)))
+        self.scaler = StandardScaler().fit(self.train)
+        self.ocsvm = OneClassSVM(nu=0.05, gamma=0.2).fit(self.scaler.transform(self.train))
+        n = len(FEATURE_COLS)
+        self.ae = type("AE", (), {"layers": [_Dense(np.eye(n, 3, dtype=np.float32), np.zeros(3, np.float32), "relu"),
+                                             _Dense(np.eye(3, n, dtype=np.float32), np.zeros(n, np.float32), "linear")]})()
+        self.path = os.path.join(tempfile.mkdtemp(), "ids_model.bundle")
+
+    def test_bundle_matches_sklearn_and_checks_schema(self):
+        """Test if a bundle scores like the sklearn models and rejects corrupt or foreign files."""
+        from can_ids.detection.model_bundle import write_bundle, load_bundle, BundleError
+        write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 1.5)
+        detector = IDSDetector.load_bundle(self.path)
+        rows = self.train[:20] * 2
+        scores, mses = detector.score_batch(rows)
+        scaled = self.scaler.transform(rows)
+        np.testing.assert_allclose(scores, self.ocsvm.decision_function(scaled), atol=1e-9)
+        expected = np.mean((scaled - np.pad(np.maximum(scaled[:, :3], 0), ((0, 0), (0, len(FEATURE_COLS) - 3)))) ** 2, axis=1)
+        np.testing.assert_allclose(mses, expected, rtol=1e-5)
+        self.assertEqual(detector.ae_threshold, 1.5)
+
+        write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 1.5, window_size=0.5)
+        with self.assertRaises(BundleError):
+            load_bundle(self.path)
+        write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 1.5)
+        data = bytearray(Path(self.path).read_bytes())
+        data[-1] ^= 0xFF
+        Path(self.path).write_bytes(bytes(data))
+        with self.assertRaises(BundleError):
+            load_bundle(self.path)
+
+    def test_hot_swap_keeps_streak(self):
+        """Test if reload() swaps in a rebuilt bundle between windows."""
+        from can_ids.detection.model_bundle import write_bundle
+        first = write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 1.5)
+        detector = IDSDetector.load_bundle(self.path)
+        detector.anomaly_streak = 2
+        second = write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 9.0)
+        self.assertNotEqual(first, second)
+        self.assertEqual(detector.reload(), second[:12])
+        self.assertEqual(detector.ae_threshold, 9.0)
+        self.assertEqual(detector.anomaly_streak, 2)
+
+    def test_retrained_models_outrank_the_bundle(self):
+        """Test if load() stops preferring a bundle once the training manifest moved on."""
+        from can_ids.detection.model_bundle import (write_bundle, write_manifest, manifest_digest, bundle_is_stale,
+                                                    remove_bundle)
+        model_dir = os.path.dirname(self.path)
+        manifest = {"dataset_sha256": "a", "ocsvm": {"scaler_sha256": "s"}}
+        write_manifest(model_dir, manifest)
+        write_bundle(self.path, self.scaler, self.ocsvm, self.ae, 1.5, manifest_sha256=manifest_digest(manifest))
+        self.assertFalse(bundle_is_stale(self.path, model_dir))
+        self.assertEqual(IDSDetector.load(model_dir).ae_threshold, 1.5)
+
+        write_manifest(model_dir, {**manifest, "ocsvm": {"scaler_sha256": "t"}}) # OCSVM retrained
+        self.assertTrue(bundle_is_stale(self.path, model_dir))
+        with self.assertWarns(UserWarning), self.assertRaises(FileNotFoundError): # Falls back to the artifacts
+            IDSDetector.load(model_dir)
+        self.assertTrue(remove_bundle(model_dir))
+        self.assertFalse(os.path.exists(self.path))
+
+class TestStressGenerator(unittest.TestCase):
+    def test_frame_encoding(self):
+        """Test if frames round-trip through the raw SocketCAN format."""
+        raw = encode_frame(0x310, b'\x02\x00\x00\x00')
+        self.assertEqual(len(raw), CAN_FRAME_SIZE)
+        self.assertEqual(decode_frame(raw), (0x310, b'\x02\x00\x00\x00'))
+
+    def test_sequential_fuzz_pool(self):
+        """Test if sequential mode sweeps IDs and wraps at 0x7FF."""
+        pool = build_frame_pool("sequential", "sequential", can_id=0x7FE, pool_size=4)
+        ids = [decode_frame(f)[0] for f in pool]
+        self.assertEqual(ids, [0x7FE, 0x7FF, 0x000, 0x001])
+        self.assertEqual(decode_frame(pool[3])[1], (3).to_bytes(8, 'big'))
+
+    def test_fixed_pool_is_single_frame(self):
+        pool = build_frame_pool("fixed", "fixed", can_id=0x000)
+        self.assertEqual(len(pool), 1)
+        # --dlc applies to a fixed payload too: truncated or zero-padded
+        self.assertEqual(decode_frame(build_frame_pool(data=b'\x01\x02\x03', dlc=2)[0])[1], b'\x01\x02')
+        self.assertEqual(decode_frame(build_frame_pool(data=b'\x01', dlc=4)[0])[1], b'\x01\x00\x00\x00')
+        self.assertEqual(len(decode_frame(build_frame_pool(data=b'\x01\x02\x03')[0])[1]), 3)
+
+    def test_batch_sender_keeps_frame_order(self):
+        """Test if a batch (one sendmmsg call, or the per-frame fallback) sends each frame in order."""
+        from can_ids.attacks.stress import BatchSender
+        pool = build_frame_pool("sequential", "sequential", can_id=0x100, pool_size=4)
+        for use_sendmmsg in (True, False):
+            tx, rx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sender = BatchSender(tx, pool * 2, use_sendmmsg=use_sendmmsg)
+                self.assertEqual(sender.send(2, 4), (4, 0))
+                received = [decode_frame(rx.recv(CAN_FRAME_SIZE))[0] for _ in range(4)]
+                self.assertEqual(received, [0x102, 0x103, 0x100, 0x101])
+            finally:
+                tx.close()
+                rx.close()
+
+class TestReplayLog(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".log")
+        with os.fdopen(fd, "w") as f:
+            f.write("(100.000000) vcan0 123#0C80\n")
+            f.write("(100.020000) vcan0 310#05000000\n")
+            f.write("(100.500000) vcan0 123#0C84\n")
+            f.write("(101.500000) vcan0 310#02000000\n")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_candump_streaming(self):
+        """Test if candump lines are decoded into (ts, id, data)."""
+        frames = list(iter_log_frames(self.path))
+        self.assertEqual(len(frames), 4)
+        self.assertEqual(frames[1], (100.02, 0x310, b'\x05\x00\x00\x00'))
+
+    def test_id_filter_and_time_range(self):
+        """Test if ID filters and relative time ranges select the right frames."""
+        frames = list(iter_log_frames(self.path, ids={0x123}, start=0.1, end=1.0))
+        self.assertEqual(frames, [(100.5, 0x123, b'\x0c\x84')])
+
+class TestLogIngest(unittest.TestCase):
+    def setUp(self):
+        self.pm = ProcessManager()
+        self.pm.clear_logs()
+
+    def tearDown(self):
+        self.pm.clear_logs()
+
+    def test_sequenced_ring(self):
+        """Test if the ring evicts old items but keeps sequence numbers."""
+        ring = SequencedRing(3)
+        for i in range(5):
+            ring.append(i)
+        self.assertEqual(ring.latest(), [2, 3, 4])
+        self.assertEqual(ring.since(3), ([3, 4], True))
+        self.assertEqual(ring.since(0), ([2, 3, 4], False))
+
+    def test_alerts_parsed_at_ingest(self):
+        """Test if alert and state lines become typed records once."""
+        self.pm._ingest("[Simulator] STATE:CRUISING|RPM:2200|GEAR:5|RATE:80")
+        self.pm._ingest("[IDS] 🚨 ALERT: FLOODING / DOS | Vol: 1200 | [SVM][AE:9.1]")
+        alerts = self.pm.get_alerts()
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]["type"], "FLOODING / DOS")
+        self.assertEqual(alerts[0]["volume"], "1200")
+        self.assertEqual(alerts[0]["source"], "IDS")
+        self.assertEqual(self.pm.get_vehicle_state(), "CRUISING")
+
+    def test_dos_status_expires(self):
+        """Test if a FLOODING report stops counting after 20 newer lines."""
+        self.pm._ingest("[IDS] 🚨 ALERT: FLOODING / DOS | Vol: 1200 | [SVM]")
+        self.assertTrue(self.pm.is_dos_active())
+        for _ in range(20):
+            self.pm._ingest("[Simulator] STATE:CRUISING|RPM:2200|GEAR:5|RATE:80")
+        self.assertFalse(self.pm.is_dos_active())
+
+class TestCANListener(unittest.TestCase):
+    def test_batched_decode_keeps_newest(self):
+        """Test if a drained batch decodes only the newest frame per ID."""
+        listener = CANListener()
+        for rpm in (1000, 2000, 3000):
+            listener._on_frame(can.Message(arbitration_id=0x123, data=int(rpm / 0.25).to_bytes(2, 'big'),
+                                           is_extended_id=False))
+        listener._on_frame(can.Message(arbitration_id=0x310, data=b'\x05\x00\x00\x00', is_extended_id=False))
+        listener._on_frame(can.Message(arbitration_id=0x000, data=b'\x00' * 8, is_extended_id=False))
+
+        batch = listener._drain()
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(listener.latest_data["RPM"], 3000)
+        self.assertEqual(listener.latest_data["Gear"], 5)
+        self.assertEqual(listener.latest_data["Speed"], 75)
+        self.assertEqual(listener.frames_dropped, 0)
+        with self.assertRaises(TypeError):
+            listener.latest_data["RPM"] = 0
+
+    def test_history_recorded_at_full_rate(self):
+        """Test if every RPM frame lands in the history, not just the newest."""
+        listener = CANListener()
+        before = listener.history.rings["RPM"].written
+        for i, rpm in enumerate((1000, 2000)):
+            listener._on_frame(can.Message(timestamp=10.0 + i, arbitration_id=0x123,
+                                           data=int(rpm / 0.25).to_bytes(2, 'big'), is_extended_id=False))
+        listener._drain()
+        ts, values = listener.history.rings["RPM"].query(10.0, 11.0)
+        self.assertEqual(listener.history.rings["RPM"].written - before, 2)
+        self.assertEqual(values.tolist(), [1000, 2000])
+
+class TestCANMux(unittest.TestCase):
+    def setUp(self):
+        self.interface = f"mux{os.getpid()}"
+        self.mux = CANMux(self.interface, capacity=8)
+
+    def tearDown(self):
+        self.mux.close()
+
+    @staticmethod
+    def _frames(n, start=0):
+        return [can.Message(timestamp=float(i), arbitration_id=0x123 if i % 2 else 0x310, data=bytes([i % 256]),
+                            is_extended_id=False)
+                for i in range(start, start + n)]
+
+    def test_consumers_read_independently(self):
+        """Test if each consumer gets every frame (after its ID filter) at its own pace."""
+        self.assertTrue(mux_available(self.interface))
+        everything = MuxConsumer(self.interface, "all")
+        bus = MuxBus(self.interface, name="rpm", ids={0x123})
+        try:
+            self.mux.publish(self._frames(6))
+            self.assertEqual(everything.read()["ts"].tolist(), [0, 1, 2, 3, 4, 5])
+            msg = bus.recv(timeout=0.1)
+            self.assertEqual((msg.arbitration_id, msg.data), (0x123, b'\x01'))
+            self.assertEqual([bus.recv(0.1).timestamp for _ in range(2)], [3.0, 5.0])
+            self.assertIsNone(bus.recv(timeout=0.01))
+        finally:
+            everything.close()
+            bus.shutdown()
+
+    def test_bus_does_not_receive_its_own_frames(self):
+        """Test if a frame sent through a MuxBus is not delivered back to it, but still reaches other consumers."""
+        class FakeSocket:
+            def __init__(self): self.sent = []
+            def send(self, data): self.sent.append(data)
+            def close(self): pass
+        bus = MuxBus(self.interface, name="spoofer", ids={0x123, 0x310})
+        other = MuxConsumer(self.interface, "observer")
+        try:
+            bus._tx = FakeSocket()
+            spoofed = can.Message(arbitration_id=0x310, data=bytes([7, 0, 0]), is_extended_id=False)
+            bus.send(spoofed)
+            self.assertEqual(len(bus._tx.sent), 1)
+            # The mux reads the frame back off the interface, between two genuine ones
+            genuine = can.Message(timestamp=1.0, arbitration_id=0x310, data=bytes([3, 0, 0]), is_extended_id=False)
+            echo = can.Message(timestamp=2.0, arbitration_id=0x310, data=bytes([7, 0, 0]), is_extended_id=False)
+            self.mux.publish([genuine, echo, genuine])
+            self.assertEqual([bus.recv(0.1).timestamp for _ in range(2)], [1.0, 1.0])
+            self.assertIsNone(bus.recv(timeout=0.01))
+            self.assertEqual(other.read()["ts"].tolist(), [1.0, 2.0, 1.0])
+        finally:
+            other.close()
+            bus.shutdown()
+
+    def test_slow_consumer_skips_ahead_and_resumes_by_name(self):
+        """Test if a lapped consumer counts lost frames, and a re-attach resumes its cursor."""
+        slow = MuxConsumer(self.interface, "slow")
+        self.mux.publish(self._frames(12))
+        batch = slow.read()
+        self.assertEqual(slow.lost, 4)
+        self.assertEqual(batch["ts"].tolist(), list(range(4, 12)))
+
+        self.mux.publish(self._frames(3, start=12))
+        slow.close(keep_slot=True)
+        again = MuxConsumer(self.interface, "slow")
+        try:
+            self.assertEqual(again.read()["ts"].tolist(), [12, 13, 14])
+        finally:
+            again.close()
+
+    def test_idle_consumer_sleeps_until_woken(self):
+        """Test if a consumer on an idle ring sleeps instead of polling, and wakes as soon as a batch lands."""
+        consumer = MuxConsumer(self.interface, "sleeper")
+        reads = []
+        read = consumer.read
+        consumer.read = lambda *args: reads.append(1) or read(*args)
+        try:
+            self.assertIsNone(consumer.recv(timeout=0.3))
+            self.assertLess(len(reads), 20) # Polling every 0.5 ms would be ~600
+            timer = threading.Timer(0.1, self.mux.publish, (self._frames(1),))
+            timer.start()
+            t0 = time.perf_counter()
+            consumer._wait(2.0) # One wait, not capped by MAX_WAIT: only the mux's wake-up ends it early
+            self.assertLess(time.perf_counter() - t0, 1.0)
+            self.assertEqual(consumer.recv(timeout=0).timestamp, 0.0)
+            timer.join()
+        finally:
+            consumer.close()
+
+    def test_records_overwritten_mid_copy_are_dropped(self):
+        """Test if a read racing a batch the writer has reserved but not committed drops the overwritten records."""
+        reader = MuxConsumer(self.interface, "racer")
+        try:
+            self.mux.publish(self._frames(8))
+            ring = self.mux.ring
+            # Writer is halfway through the next batch of 3: reserved and written, write_seq not bumped yet
+            ring.header["write_reserve"] = 11
+            ring.records[:3]["ts"] = [8, 9, 10]
+            batch = reader.read()
+            self.assertEqual(batch["ts"].tolist(), [3, 4, 5, 6, 7])
+            self.assertEqual(reader.lost, 3)
+        finally:
+            reader.close()
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_exposition(self):
+        """Test if counters, computed gauges and histograms render in Prometheus text format."""
+        reg = MetricsRegistry()
+        alerts = reg.counter("alerts_total", "Alerts", ("type",))
+        alerts.labels("FLOODING / DOS").inc()
+        alerts.labels("FLOODING / DOS").inc(2)
+        reg.gauge("queue_depth", "Depth", fn=lambda: 7)
+        latency = reg.histogram("stage_seconds", "Latency", buckets=(0.001, 0.01))
+        for v in (0.0005, 0.005, 0.005, 1.0):
+            latency.observe(v)
+
+        text = reg.render()
+        self.assertIn('alerts_total{type="FLOODING / DOS"} 3', text)
+        self.assertIn("queue_depth 7", text)
+        self.assertIn('stage_seconds_bucket{le="0.001"} 1', text)
+        self.assertIn('stage_seconds_bucket{le="0.01"} 3', text)
+        self.assertIn('stage_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("stage_seconds_count 4", text)
+        # Registration is idempotent by name
+        self.assertIs(reg.counter("alerts_total", "Alerts", ("type",)), alerts)
+
+class TestProfiler(unittest.TestCase):
+    def test_hdr_percentiles_within_relative_error(self):
+        """Test if HDR percentiles stay within ~1.6% of the exact value across magnitudes."""
+        hist = HdrHistogram()
+        values = np.random.default_rng(0).lognormal(mean=11, sigma=2, size=5000).astype(np.int64)
+        for v in values:
+            hist.record(int(v))
+        for p in (50, 99):
+            exact = np.percentile(values, p, method="inverted_cdf")
+            self.assertLessEqual(abs(hist.percentile(p) - exact) / exact, 1 / 64)
+        self.assertEqual(hist.max, values.max())
+
+    def test_report_counts_late_windows(self):
+        """Test if the profile report aggregates stages and late windows."""
+        prof = StageProfiler(alloc_sample_every=0, late_threshold=0.01)
+        for latency in (0.001, 0.002, 0.05):
+            prof.on_stage("features", 2000)
+            prof.end_window(frames=10, latency=latency)
+        report = prof.report()
+        self.assertEqual((report["windows"], report["windows_late"], report["frames"]), (3, 1, 30))
+        self.assertEqual(report["stages"]["features"]["p99_us"], 2.0)
+
+    def test_sampled_window_spans_summary_and_scoring(self):
+        """Test if a sampled window stays traced from its summary to its verdict, without what ran in between."""
+        prof = StageProfiler(alloc_sample_every=1)
+        prof.begin_window() # Summary of the first pending window
+        prof.on_stage("features", 1000)
+        between = bytearray(1 << 20) # e.g. frames received before the batch is scored
+        prof.begin_window() # Summary of the second: the sampled window is still open
+        prof.mark()
+        prof.on_stage("ae", 1000)
+        prof.end_window(frames=10, latency=0.0)
+        prof.end_window(frames=10, latency=0.0)
+        report = prof.report()
+        self.assertEqual(report["alloc_sampled_windows"], 1)
+        self.assertLess(report["stages"]["ae"]["alloc_peak_kib_max"], 64)
+        self.assertFalse(tracemalloc.is_tracing())
+        del between
+
+class TestSignalHistory(unittest.TestCase):
+    def test_ring_wraps_in_time_order(self):
+        ring = SignalRing(8)
+        ring.append_many(np.arange(12.0), np.arange(12.0))
+        ts, values = ring.query(5.0, 9.0)
+        self.assertEqual(ts.tolist(), [5.0, 6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(ring.time_range(), (4.0, 11.0))
+
+    def test_downsampling_keeps_spikes(self):
+        """Test if min/max buckets and LTTB both keep an isolated spike."""
+        ts = np.linspace(0, 100, 10001)
+        values = np.zeros(len(ts), dtype=np.float32)
+        values[5000] = 7000
+        minmax = downsample_minmax(ts, values, 50)
+        self.assertEqual(len(minmax["t"]), 50)
+        self.assertEqual(max(minmax["max"]), 7000)
+        lttb = downsample_lttb(ts, values, 100)
+        self.assertEqual(len(lttb["t"]), 100)
+        self.assertEqual(max(lttb["v"]), 7000)
+
+class TestAlertStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = AlertStore(os.path.join(self.dir, "events.db"), flush_interval=0.01)
+
+    def test_batched_insert_and_pagination(self):
+        """Test if queued alerts are persisted and paged newest-first."""
+        for i in range(25):
+            self.store.add({"ts": 1000.0 + i, "type": "FLOODING / DOS" if i % 2 else "SPOOFING / REPLAY",
+                            "source": "IDS", "volume": str(100 + i), "details": "[SVM]"})
+        self.store.start()
+        self.store.stop()
+        self.assertEqual(self.store.written, 25)
+
+        page = self.store.query(limit=10)
+        self.assertEqual(len(page["events"]), 10)
+        self.assertEqual(page["events"][0]["ts"], 1024.0)
+        page2 = self.store.query(limit=10, before_id=page["next_before_id"])
+        self.assertEqual(page2["events"][0]["ts"], 1014.0)
+
+        floods = self.store.query(type="FLOODING / DOS", start=1010.0, limit=100)["events"]
+        self.assertEqual(len(floods), 7)
+        self.assertEqual(floods[0]["volume"], 123)
+
+    def test_bucket_counts(self):
+        for i in range(6):
+            self.store.add({"ts": 600.0 + i * 30, "type": "FLOODING / DOS", "source": "IDS"})
+        self.store.start()
+        self.store.stop()
+        counts = self.store.counts(bucket=60)
+        self.assertEqual([(c["bucket"], c["count"]) for c in counts], [(600, 2), (660, 2), (720, 2)])
+
+    def test_database_created_lazily(self):
+        """Test if constructing the store (as importing the backend does) leaves the disk alone."""
+        self.assertFalse(os.path.exists(self.store.path))
+        self.assertEqual(self.store.query()["events"], [])
+        self.assertTrue(os.path.exists(self.store.path))
+
+class TestLogStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def _store(self, **kwargs):
+        return LogStore(self.dir, tail_size=5, block_lines=4, flush_interval=0.01, **kwargs)
+
+    def test_range_reads_span_disk_and_tail(self):
+        """Test if lines N..M come back in order after leaving the live tail."""
+        store = self._store()
+        store.start()
+        for i in range(1, 21):
+            store.append(f"[IDS] line {i}", ts=100.0 + i)
+        store.stop()
+        self.assertEqual(store.latest(2), ["[IDS] line 19", "[IDS] line 20"])
+        records = store.read_range(3, 9)
+        self.assertEqual([r["seq"] for r in records], list(range(3, 10)))
+        self.assertEqual(records[0]["line"], "[IDS] line 3")
+
+    def test_search_and_restart(self):
+        """Test substring/time search and that numbering resumes after a restart."""
+        store = self._store()
+        store.start()
+        for i in range(1, 11):
+            store.append(f"[{'IDS' if i % 2 else 'Simulator'}] line {i}", ts=100.0 + i)
+        store.stop()
+        hits = store.search("line", since=104.0, until=108.0, source="IDS")
+        self.assertEqual([h["seq"] for h in hits], [7, 5])
+
+        reopened = self._store()
+        reopened.start()
+        self.assertEqual(reopened.last_seq, 10)
+        self.assertEqual(reopened.append("[IDS] after restart"), 11)
+        reopened.stop()
+
+    def test_directory_created_lazily(self):
+        """Test if constructing the store (as importing the backend does) leaves the disk alone."""
+        store = LogStore(os.path.join(self.dir, "logs"))
+        self.assertFalse(os.path.exists(store.directory))
+        store.start()
+        store.stop()
+        self.assertTrue(os.path.isdir(store.directory))
+
+    def test_rotation_drops_oldest_segments(self):
+        store = self._store(segment_bytes=1, max_segments=2)
+        for i in range(1, 17):
+            store.append(f"[IDS] line {i}", ts=100.0 + i)
+        # Queued before the writer starts, so every block is exactly 4 lines
+        store.start()
+        store.stop()
+        self.assertEqual(len(list(Path(self.dir).glob("segment_*.log.gz"))), 2)
+        self.assertEqual(store.read_range(1, 16)[0]["seq"], 9)
+
+class TestBroadcaster(unittest.TestCase):
+    def test_delta_and_resume(self):
+        """Test if only new lines are sent and a lagging cursor is caught up."""
+        pm, hub = ProcessManager(), DashboardBroadcaster()
+        pm.clear_logs()
+        hub.tick()
+        start = hub.seq
+
+        pm._ingest("[IDS] line 1")
+        hub.tick()
+        hub.tick() # Nothing changed: no frame
+        self.assertEqual(hub.seq, start + 1)
+        pm._ingest("[IDS] line 2")
+        hub.tick()
+
+        frames, cursor = hub.catch_up(start)
+        self.assertEqual(cursor, start + 2)
+        self.assertEqual([json.loads(f)["logs"] for f in frames], [["[IDS] line 1"], ["[IDS] line 2"]])
+
+        frames, _ = hub.catch_up(None)
+        snapshot = json.loads(frames[0])
+        self.assertEqual(snapshot["type"], "snapshot")
+        self.assertEqual(snapshot["logs"][-2:], ["[IDS] line 1", "[IDS] line 2"])
+        pm.clear_logs()
+
+    def test_slow_client_drops_oldest(self):
+        """Test if a full client queue drops old frames instead of blocking."""
+        hub = DashboardBroadcaster()
+        fast, slow = hub.subscribe(), hub.subscribe()
+        try:
+            for i in range(CLIENT_QUEUE_SIZE + 2):
+                hub.publish(str(i))
+                fast.get_nowait()
+            self.assertEqual(slow.qsize(), CLIENT_QUEUE_SIZE)
+            self.assertEqual(slow.get_nowait(), (None, "2"))
+            self.assertTrue(fast.empty())
+        finally:
+            hub.unsubscribe(fast)
+            hub.unsubscribe(slow)
+
 if __name__ == '__main__':
     print("🧪 RUNNING RESEARCH FRAMEWORK TESTS...")
     unittest.main()
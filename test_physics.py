@@ -1,6 +1,7 @@
 import can
 import time
 import sys
+from can_ids.bus_mux import open_bus
 
 def main():
     print("🕵️  PHYSICS DIAGNOSTIC TOOL")
@@ -9,7 +10,7 @@ def main():
     print("-" * 60)
 
     try:
-        bus = can.ThreadSafeBus(channel='vcan0', interface='socketcan')
+        bus = open_bus('vcan0', name="physics", ids={0x123, 0x310})
     except OSError:
         print("❌ Error: vcan0 not found.")
         return